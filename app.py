@@ -2,106 +2,96 @@ import streamlit as st
 import sqlite3
 import json
 import os
+import time
+import uuid
 from datetime import datetime
-import pydeck as pdk
-import geopandas as gpd
-import pandas as pd
+from config import MAP_CONFIG, STARTUP_CONFIG
+from map_data import read_province_boundaries, province_features, territories_hash, build_geojson, province_color_bytes
+from map_component import write_geometry, province_map
+import game_engine as engine
+from event_catalog import refresh_catalog, format_entry
+from event_store import EventStore
+from tree_registry import TreeHandle
+from game_history import GameHistory
+from timeline import Timeline, format_month
+from save_games import SaveStore, snapshot_game, restore_history
+from gazetteer import get_gazetteer, resolve_locations
+import perf_trace
+from perf_panel import render_perf_panel
+
+# 记录本次运行各阶段的耗时
+perf_trace.start_run(
+    "app",
+    st.session_state.setdefault("perf_stats", {}),
+    profile=st.session_state.pop("profile_next_run", False)
+)
 
 # 初始化会话状态
 if 'game_state' not in st.session_state:
-    st.session_state.game_state = {
-        'military_power': 100,
-        'political_power': 100,
-        'economic_power': 100,
-        'controlled_territories': {
-            'central_government': ['江苏', '浙江', '安徽', '江西', '湖北', '湖南', '四川'],
-            'communist': ['江西', '福建'],
-            'japanese': []
-        },
-        'events': {},  # 添加events字段
-        'current_event_id': None  # 添加当前事件ID字段
-    }
-
-# 省份数据
-PROVINCES = {
-    'jiangsu': {'name': '江苏', 'center': [118.8, 32.0]},
-    'zhejiang': {'name': '浙江', 'center': [120.2, 30.3]},
-    'anhui': {'name': '安徽', 'center': [117.3, 31.8]},
-    'jiangxi': {'name': '江西', 'center': [115.9, 28.7]},
-    'hubei': {'name': '湖北', 'center': [114.3, 30.6]},
-    'hunan': {'name': '湖南', 'center': [112.9, 28.2]},
-    'sichuan': {'name': '四川', 'center': [104.1, 30.7]},
-    'fujian': {'name': '福建', 'center': [119.3, 26.1]},
-    'manchuria': {'name': '东北', 'center': [125.4, 43.8]},
-    'shandong': {'name': '山东', 'center': [117.0, 36.7]},
-    'guangdong': {'name': '广东', 'center': [113.3, 23.1]},
-    'guangxi': {'name': '广西', 'center': [108.3, 22.8]},
-    'yunnan': {'name': '云南', 'center': [102.7, 25.0]},
-    'guizhou': {'name': '贵州', 'center': [106.7, 26.6]},
-    'shanxi': {'name': '山西', 'center': [112.6, 37.9]},
-    'shaanxi': {'name': '陕西', 'center': [108.9, 34.3]},
-    'gansu': {'name': '甘肃', 'center': [103.8, 36.0]},
-    'qinghai': {'name': '青海', 'center': [101.8, 36.6]},
-    'xinjiang': {'name': '新疆', 'center': [87.6, 43.8]},
-    'taiwan': {'name': '台湾', 'center': [121.0, 23.5]}
-}
+    st.session_state.game_state = engine.new_game_state()
+    st.session_state.history = GameHistory(st.session_state.game_state)
 
 # 加载中国省份地图数据， 后续还可以加载更多的数据
 @st.cache_data
 def load_province_boundaries():
     # 这里需要加载实际的地理数据文件
     # 使用 GeoJSON 格式的中国省份边界数据
-    gdf = gpd.read_file("china_provinces.geojson") 
-    return gdf
+    return read_province_boundaries()
+
+@st.cache_resource
+def load_province_features():
+    """加载省份名称数组和几何数据，整个进程只序列化一次"""
+    return province_features(load_province_boundaries())
+
+@st.cache_resource(max_entries=128)
+def build_provinces_geojson(territories_key, _controlled_territories):
+    """根据势力范围生成GeoJSON，按territories_key缓存，几何数据在各版本间共享"""
+    names, geometries = load_province_features()
+    return build_geojson(names, geometries, _controlled_territories)
+
+@st.cache_resource
+def load_geometry_url():
+    """把省份几何数据写成静态文件供客户端地图下载，整个进程只写一次"""
+    names, geometries = load_province_features()
+    return write_geometry(names, geometries)
 
-def create_map_data():
-    """创建地图数据"""
+@st.cache_resource(max_entries=128)
+def build_province_colors(territories_key, _controlled_territories):
+    """根据势力范围生成颜色数组（每个省份4个字节），按territories_key缓存"""
+    names, _ = load_province_features()
+    return province_color_bytes(names, _controlled_territories)
+
+def create_map_data(controlled_territories=None, events=None):
+    """创建地图数据，默认使用当前游戏的势力范围和当前事件（时间线回放时传入回放帧的数据）"""
     try:
-        # 加载省份边界数据
-        gdf = load_province_boundaries()
-        
-        # 打印省份名称列表，用于调试
-        st.write("地图中的省份名称：")
-        st.write(gdf['name'].tolist())
-        
-        # 打印控制的地区列表，用于调试
-        st.write("控制的地区：")
-        for faction, territories in st.session_state.game_state['controlled_territories'].items():
-            st.write(f"{faction}: {territories}")
+        if controlled_territories is None:
+            controlled_territories = st.session_state.game_state['controlled_territories']
         
-        # 为每个省份添加颜色信息
-        province_colors = []
-        for _, row in gdf.iterrows():
-            province_name = row['name']  # 假设GeoJSON中的属性名为'name'
-            color = [100, 100, 100, 140]  # 默认灰色（半透明）
-            
-            # 根据控制势力设置颜色
-            for faction, territories in st.session_state.game_state['controlled_territories'].items():
-                if province_name in territories:
-                    if faction == 'central_government':
-                        color = [0, 0, 255, 140]  # 蓝色（半透明）
-                    elif faction == 'communist':
-                        color = [255, 0, 0, 140]  # 红色（半透明）
-                    elif faction == 'japanese':
-                        color = [255, 255, 0, 140]  # 黄色（半透明）
-                    break
-            province_colors.append(color)
-        
-        gdf['color'] = province_colors
-        
-        # 转换为pydeck可用的格式
-        provinces_data = json.loads(gdf.to_json())
+        # 势力范围未变化时直接命中缓存，变化时只重新计算颜色
+        territories_key = territories_hash(controlled_territories)
+        if MAP_CONFIG["client_map"]:
+            # 客户端地图只需要颜色数组，几何数据由浏览器缓存
+            provinces_data = {
+                'colors': build_province_colors(territories_key, controlled_territories),
+                'colors_key': territories_key
+            }
+        else:
+            provinces_data = build_provinces_geojson(territories_key, controlled_territories)
         
         # 创建事件地点标记
         event_locations = []
-        current_events = get_current_events()
+        current_events = get_current_events() if events is None else events
         if current_events:
+            gazetteer = get_gazetteer()
             for event in current_events:
-                for location in event.get('location', []):
-                    if location in PROVINCES:
+                # 导入时已地理编码的事件直接使用 provinces，否则现场解析地点
+                provinces = event.get('provinces') or resolve_locations(event.get('location') or [])
+                for province in provinces:
+                    center = gazetteer.center(province)
+                    if center:
                         event_locations.append({
-                            'name': PROVINCES[location]['name'],
-                            'coordinates': PROVINCES[location]['center']
+                            'name': province,
+                            'coordinates': list(center)
                         })
         
         return provinces_data, event_locations
@@ -115,101 +105,182 @@ HISTORICAL_EVENTS = {}
 
 def get_current_time():
     """获取当前时间"""
-    if not st.session_state.game_state['current_event_id']:
-        return None, None
-        
-    current_event = st.session_state.game_state['events']['events'].get(st.session_state.game_state['current_event_id'])
-    if not current_event:
-        return None, None
-        
-    return current_event['year'], current_event['month']
+    return engine.get_current_time(st.session_state.game_state)
+
+def hold_event_tree(tree_id, source):
+    """本会话持有共享事件树的引用，替换旧引用时自动释放旧的事件树
+
+    source 是事件树的来源（{'file': 路径} 或 {'store': 事件树ID}），记入存档，恢复时重新加载。
+    """
+    st.session_state.tree_handle = TreeHandle(tree_id)
+    st.session_state.tree_source = source
+    # 保留当前的属性和领土，换一棵事件树后重新开始记录历史
+    game_state = engine.start_event_tree(dict(st.session_state.game_state), tree_id)
+    st.session_state.game_state = game_state
+    st.session_state.history = GameHistory(game_state, "加载事件树")
+    autosave()
 
 def load_event_tree(file_path):
-    """加载事件树文件"""
+    """加载事件树文件，所有会话共享同一份只读数据，返回事件树ID"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            event_data = json.load(f)
-            
-        # 根据initial_event设置当前事件
-        if 'initial_event' in event_data and 'events' in event_data:
-            st.session_state.game_state['current_event_id'] = event_data['initial_event']
-            
-        # 将事件数据保存到game_state中
-        st.session_state.game_state['events'] = event_data
-            
-        return event_data
+        with perf_trace.span("tree_load"):
+            tree_id = engine.acquire_event_tree(file_path)
+        if tree_id:
+            hold_event_tree(tree_id, {'file': file_path})
+        return tree_id
     except Exception as e:
         st.error(f"加载事件树文件时出错: {str(e)}")
         return None
 
 def get_current_events():
     """获取当前时间点的事件"""
-    # 如果没有当前事件ID，返回空列表
-    if not st.session_state.game_state['current_event_id']:
-        return []
-        
-    # 从事件树中获取当前事件
-    current_event = st.session_state.game_state['events']['events'].get(st.session_state.game_state['current_event_id'])
-    if not current_event:
-        return []
-        
-    return [{
-        'title': current_event['title'],
-        'description': current_event['description'],
-        'location': current_event.get('location', []),
-        'choices': current_event['choices']
-    }]
-
-def process_choice(choice):
-    """处理玩家的选择"""
-    consequences = choice['consequences']
-    
-    # 更新游戏状态
-    for key, value in consequences.items():
-        if key == 'territories':
-            # 处理领土变化
-            for faction, territories in value.items():
-                st.session_state.game_state['controlled_territories'][faction].extend(territories)
-        elif key in st.session_state.game_state:
-            st.session_state.game_state[key] += value
-    
-    # 如果选项中有next_event，直接跳转到该事件
-    if 'next_event' in choice and choice['next_event']:
-        st.session_state.game_state['current_event_id'] = choice['next_event']
-    else:
-        # 如果没有下一个事件，查找下一个最近的事件
-        next_event = None
-        min_time_diff = float('inf')
-        current_year, current_month = get_current_time()
-        
-        for event_id, event in st.session_state.game_state['events']['events'].items():
-            event_time = event['year'] * 12 + event['month']
-            current_time = current_year * 12 + current_month
-            time_diff = event_time - current_time
-            
-            if time_diff > 0 and time_diff < min_time_diff:
-                min_time_diff = time_diff
-                next_event = event_id
-        
-        if next_event:
-            st.session_state.game_state['current_event_id'] = next_event
-        else:
-            st.session_state.game_state['current_event_id'] = None
+    return engine.get_current_events(st.session_state.game_state)
+
+def process_choice(choice, index):
+    """处理玩家的选择（当前事件的第 index 个选项），新状态记入历史记录"""
+    game_state = st.session_state.game_state
+    current_event = engine.get_current_event(game_state)
+    label = f"{current_event['title']}：{choice['text']}" if current_event else choice['text']
+    st.session_state.game_state = engine.process_choice(game_state, choice)
+    st.session_state.history.push(
+        st.session_state.game_state, label, choice=(game_state['current_event_id'], index)
+    )
+    autosave()
+
+def undo_game():
+    """回到上一步"""
+    st.session_state.game_state = st.session_state.history.undo()
+    autosave()
+
+def rewind_game(index):
+    """回到历史记录中的任意一步"""
+    st.session_state.game_state = st.session_state.history.rewind(index)
+    autosave()
 
 def reset_game():
     """重置游戏状态"""
-    st.session_state.game_state = {
-        'military_power': 100,
-        'political_power': 100,
-        'economic_power': 100,
-        'controlled_territories': {
-            'central_government': ['jiangsu', 'zhejiang', 'anhui', 'jiangxi', 'hubei', 'hunan', 'sichuan'],
-            'communist': ['jiangxi', 'fujian'],
-            'japanese': []
-        },
-        'events': {},  # 添加events字段
-        'current_event_id': None  # 添加当前事件ID字段
-    }
+    st.session_state.game_state = engine.new_game_state()
+    st.session_state.history = GameHistory(st.session_state.game_state)
+    st.session_state.tree_handle = None
+    st.session_state.tree_source = None
+    autosave()
+
+@st.cache_resource
+def get_save_store():
+    """整个进程共用一个存档存储（app.db），后台线程批量写入"""
+    return SaveStore()
+
+def autosave():
+    """把当前这局游戏放进存档的写入队列，不等待写入完成"""
+    save_id = st.session_state.get('save_id')
+    if save_id:
+        with perf_trace.span("autosave"):
+            snapshot = snapshot_game(st.session_state.history, st.session_state.get('tree_source'))
+            get_save_store().save(save_id, snapshot)
+
+def acquire_tree_source(source):
+    """按存档中记录的来源重新加载事件树，返回事件树ID"""
+    if not source:
+        return None
+    if 'file' in source:
+        return engine.acquire_event_tree(source['file'])
+    return engine.acquire_event_tree_from_store(get_event_store(), source['store'])
+
+def resume_game():
+    """按网址中的存档ID恢复游戏；没有存档ID时为本会话分配一个，之后每一步都自动保存到这个ID"""
+    save_id = st.query_params.get("save")
+    snapshot = None
+    if save_id:
+        with perf_trace.span("save_load"):
+            snapshot = get_save_store().load(save_id)
+    if snapshot is not None:
+        try:
+            tree_id = acquire_tree_source(snapshot['source'])
+            if snapshot['source'] and not tree_id:
+                raise LookupError(f"事件树不存在: {snapshot['source']}")
+        except Exception as e:
+            st.warning(f"无法加载存档中的事件树，已开始新游戏: {str(e)}")
+            # 换一个新的存档ID，不覆盖原来的存档
+            snapshot, save_id = None, None
+    if snapshot is None:
+        save_id = save_id or uuid.uuid4().hex
+        st.query_params["save"] = save_id
+        st.session_state.save_id = save_id
+        return
+    st.session_state.tree_handle = TreeHandle(tree_id) if tree_id else None
+    st.session_state.tree_source = snapshot['source']
+    st.session_state.history = restore_history(snapshot, tree_id)
+    st.session_state.game_state = st.session_state.history.state
+    st.session_state.save_id = save_id
+
+def get_timeline():
+    """本会话的时间线，每次运行与历史记录当前的路径同步，只记录新增的步骤"""
+    if st.session_state.get('timeline') is None:
+        st.session_state.timeline = Timeline()
+    return st.session_state.timeline.sync(st.session_state.history)
+
+def render_timeline_controls():
+    """时间线回放的月份滑块和播放按钮，返回选中月份的回放帧"""
+    timeline = get_timeline()
+    month_range = timeline.month_range()
+    if month_range is None:
+        st.info("当前路径上还没有带时间的事件")
+        return None
+    first, last = month_range
+    # 播放时上一次运行安排的下一个月份，必须在创建滑块之前写入
+    if 'timeline_next_month' in st.session_state:
+        st.session_state.timeline_month = st.session_state.pop('timeline_next_month')
+    st.session_state.timeline_month = min(max(st.session_state.get('timeline_month', last), first), last)
+    month = st.select_slider(
+        "月份",
+        options=list(range(first, last + 1)),
+        format_func=format_month,
+        key="timeline_month"
+    )
+    playing = st.session_state.get('timeline_playing', False)
+    if st.button("暂停" if playing else "播放", key="timeline_play"):
+        st.session_state.timeline_playing = not playing
+        if not playing and month == last:
+            # 已经在最后一个月时从头开始播放
+            st.session_state.timeline_next_month = first
+        st.rerun()
+
+    frame = timeline.frame_at(month)
+    stats = frame['stats']
+    st.caption(
+        f"{format_month(month)}　第 {frame['step']} 步：{frame['label']}　"
+        f"军事力量 {stats['military_power']}　政治影响 {stats['political_power']}　经济实力 {stats['economic_power']}"
+    )
+    return frame
+
+def timeline_events(frame):
+    """回放帧对应的事件，用于在地图上标记地点"""
+    event_data = engine.get_event_tree(st.session_state.game_state)
+    if event_data is None or not frame['event_id']:
+        return []
+    event = event_data['events'].get(frame['event_id'])
+    return [event] if event else []
+
+def advance_timeline():
+    """播放时停留一会儿后进入下一个月，到最后一个月时停止"""
+    if not st.session_state.get('timeline_playing'):
+        return
+    _, last = st.session_state.timeline.month_range()
+    if st.session_state.timeline_month >= last:
+        st.session_state.timeline_playing = False
+        return
+    time.sleep(MAP_CONFIG["timeline_frame_seconds"])
+    st.session_state.timeline_next_month = st.session_state.timeline_month + 1
+    st.rerun()
+
+@st.cache_resource
+def get_event_store():
+    """整个进程共用一个事件存储（app.db）"""
+    return EventStore()
+
+# 新会话（包括服务器重启、断线重连后）按网址中的存档ID恢复游戏
+if 'save_id' not in st.session_state:
+    resume_game()
 
 # 设置页面标题
 st.title("民国史诗 - 历史策略游戏")
@@ -217,89 +288,59 @@ st.title("民国史诗 - 历史策略游戏")
 # 创建事件树选择区域
 st.sidebar.title("事件树选择")
 
-# 获取events文件夹中的所有json文件
-event_files = [f for f in os.listdir("events") if f.endswith(".json")]
+# 从目录索引获取events文件夹中的所有事件树，只有变化过的文件才会重新解析
+event_catalog = refresh_catalog("events")
+event_files = list(event_catalog.keys())
 
 if event_files:
     selected_file = st.sidebar.selectbox(
         "选择事件树",
         options=event_files,
-        format_func=lambda x: x.replace(".json", "")
+        format_func=lambda x: format_entry(x, event_catalog[x])
     )
     
     if st.sidebar.button("加载事件树"):
         file_path = os.path.join("events", selected_file)
-        loaded_events = load_event_tree(file_path)
-        if loaded_events:
-            st.session_state.game_state['events'] = loaded_events
+        if load_event_tree(file_path):
             st.sidebar.success(f"已加载事件树：{selected_file}")
             st.rerun()
 else:
     st.sidebar.info("events文件夹下暂无事件树文件")
 
-# 创建两列布局
-col1, col2 = st.columns([2, 1])
-
-# 左侧列显示地图
-with col1:
-    st.subheader("中国地图")
-    
-    # 创建地图数据
-    map_data, event_locations = create_map_data()
+# 编辑器保存在数据库中的事件树
+stored_trees = get_event_store().list_trees()
+if stored_trees:
+    stored_tree_info = {tree['tree_id']: tree for tree in stored_trees}
+    selected_tree = st.sidebar.selectbox(
+        "选择编辑器中的事件树",
+        options=list(stored_tree_info.keys()),
+        format_func=lambda x: f"{x}（{stored_tree_info[x]['event_count']}个事件）"
+    )
     
-    if map_data:
-        # 创建地图层
-        layer = pdk.Layer(
-            'GeoJsonLayer',
-            data=map_data,
-            get_fill_color='color',
-            get_line_color=[0, 0, 0, 255],
-            get_line_width=1000,
-            pickable=True,
-            filled=True,
-            extruded=False,
-            wireframe=False,
-            opacity=0.8
-        )
-        
-        # 创建事件地点标记层
-        if event_locations:
-            marker_layer = pdk.Layer(
-                'ScatterplotLayer',
-                data=event_locations,
-                get_position='coordinates',
-                get_fill_color=[255, 0, 0],  # 红色标记
-                get_radius=100000,  # 标记大小
-                pickable=True,
-                opacity=0.8
-            )
-            layers = [layer, marker_layer]
-        else:
-            layers = [layer]
-        
-        # 设置地图视图
-        view_state = pdk.ViewState(
-            latitude=35.0,
-            longitude=105.0,
-            zoom=3,
-            pitch=0,
-            bearing=0
-        )
-        
-        # 渲染地图
-        st.pydeck_chart(pdk.Deck(
-            layers=layers,
-            initial_view_state=view_state,
-            tooltip={
-                'html': '<b>省份:</b> {name}',
-                'style': {
-                    'color': 'white'
-                }
-            }
-        ))
+    if st.sidebar.button("从数据库加载事件树"):
+        with perf_trace.span("tree_load"):
+            tree_id = engine.acquire_event_tree_from_store(get_event_store(), selected_tree)
+        if tree_id:
+            hold_event_tree(tree_id, {'store': selected_tree})
+            st.sidebar.success(f"已加载事件树：{selected_tree}")
+            st.rerun()
+
+# 存档：每一步都会自动保存，收藏或重新打开当前网址即可继续
+st.sidebar.title("存档")
+st.sidebar.caption(f"存档ID：{st.session_state.save_id}")
+other_save_id = st.sidebar.text_input("读取其他存档", placeholder="输入存档ID")
+if st.sidebar.button("读取存档", disabled=not other_save_id.strip()):
+    if get_save_store().load(other_save_id.strip()) is None:
+        st.sidebar.error("存档不存在")
     else:
-        st.error("无法加载地图数据，请确保地图数据文件存在且格式正确。")
+        st.query_params["save"] = other_save_id.strip()
+        resume_game()
+        st.rerun()
+
+# 创建两列布局
+col1, col2 = st.columns([2, 1])
 
+# 先绘制右侧的游戏状态和事件，地图依赖的库较重，放在最后加载
 # 右侧列显示游戏状态和事件
 with col2:
     # 显示游戏状态
@@ -329,6 +370,27 @@ with col2:
         reset_game()
         st.rerun()
     
+    # 历史记录：回到任意一步后再做其他选择会形成新的分支，原来的分支仍然保留
+    history = st.session_state.history
+    if len(history.nodes) > 1:
+        with st.expander("历史记录"):
+            history_labels = [
+                f"{index}. {'　' * node['depth']}{node['label']}" for index, node in enumerate(history.nodes)
+            ]
+            target_step = st.selectbox(
+                "选择要回到的步骤",
+                options=list(range(len(history_labels))),
+                index=history.current,
+                format_func=lambda x: history_labels[x]
+            )
+            undo_col, rewind_col = st.columns(2)
+            if undo_col.button("上一步", disabled=history.nodes[history.current]['parent'] is None):
+                undo_game()
+                st.rerun()
+            if rewind_col.button("回到这一步", disabled=target_step == history.current):
+                rewind_game(target_step)
+                st.rerun()
+    
     # 显示当前事件
     st.subheader("当前事件")
     current_events = get_current_events()
@@ -339,10 +401,103 @@ with col2:
             st.write(event['description'])
             
             # 显示选项按钮
-            for choice in event['choices']:
+            for index, choice in enumerate(event['choices']):
                 if st.button(choice['text']):
-                    process_choice(choice)
+                    process_choice(choice, index)
                     st.rerun()
     else:
         st.write("当前没有事件")
         st.write("请继续推进时间，等待新的事件发生。") 
+
+# 左侧列显示地图
+with col1:
+    st.subheader("中国地图")
+    show_map = st.toggle("显示地图", value=not STARTUP_CONFIG["defer_map"])
+    
+    # 时间线回放：按月份显示这一局从开始到当前一步的势力范围变化
+    timeline_frame = None
+    if show_map and len(st.session_state.history.nodes) > 1 and st.toggle("时间线回放", key="timeline_mode"):
+        with perf_trace.span("timeline"):
+            timeline_frame = render_timeline_controls()
+    
+    # 创建地图数据
+    with perf_trace.span("map_data"):
+        if timeline_frame is not None:
+            map_data, event_locations = create_map_data(
+                timeline_frame['controlled_territories'], timeline_events(timeline_frame)
+            )
+        else:
+            map_data, event_locations = create_map_data() if show_map else (None, None)
+    
+    if map_data and MAP_CONFIG["client_map"]:
+        with perf_trace.span("map_render"):
+            province_map(
+                load_geometry_url(),
+                map_data['colors'],
+                map_data['colors_key'],
+                event_locations,
+                view={'latitude': 35.0, 'longitude': 105.0, 'zoom': MAP_CONFIG["zoom"]}
+            )
+    elif map_data:
+        with perf_trace.span("map_render"):
+            # pydeck 只在需要绘制地图时导入
+            import pydeck as pdk
+        
+            # 创建地图层
+            layer = pdk.Layer(
+                'GeoJsonLayer',
+                data=map_data,
+                get_fill_color='color',
+                get_line_color=[0, 0, 0, 255],
+                get_line_width=1000,
+                pickable=True,
+                filled=True,
+                extruded=False,
+                wireframe=False,
+                opacity=0.8
+            )
+        
+            # 创建事件地点标记层
+            if event_locations:
+                marker_layer = pdk.Layer(
+                    'ScatterplotLayer',
+                    data=event_locations,
+                    get_position='coordinates',
+                    get_fill_color=[255, 0, 0],  # 红色标记
+                    get_radius=100000,  # 标记大小
+                    pickable=True,
+                    opacity=0.8
+                )
+                layers = [layer, marker_layer]
+            else:
+                layers = [layer]
+        
+            # 设置地图视图
+            view_state = pdk.ViewState(
+                latitude=35.0,
+                longitude=105.0,
+                zoom=MAP_CONFIG["zoom"],
+                pitch=0,
+                bearing=0
+            )
+        
+            # 渲染地图
+            st.pydeck_chart(pdk.Deck(
+                layers=layers,
+                initial_view_state=view_state,
+                tooltip={
+                    'html': '<b>省份:</b> {name}',
+                    'style': {
+                        'color': 'white'
+                    }
+                }
+            ))
+    elif show_map:
+        st.error("无法加载地图数据，请确保地图数据文件存在且格式正确。")
+
+# 侧边栏性能面板（最后绘制，包含本次运行的全部阶段）
+render_perf_panel(perf_trace.end_run(), st.session_state.perf_stats)
+
+# 时间线播放放在最后，等待的时间不计入本次运行
+if timeline_frame is not None:
+    advance_timeline()
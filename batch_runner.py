@@ -0,0 +1,174 @@
+"""批量模拟游戏流程
+
+用 game_engine 在多个进程中批量模拟一个事件树的游戏过程，统计结局分布、属性范围和吞吐量，
+用于平衡选项后果以及在不打开浏览器的情况下回归测试事件树。
+
+用法：
+    python batch_runner.py events/events.json --runs 10000 --workers 4
+    python batch_runner.py events/events.json --policy first
+    python batch_runner.py events/events.json --policy script --script 0,1,1,0
+"""
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import game_engine as engine
+
+# 每个工作进程只加载一次事件树，所有模拟对局共享
+_worker_tree_id = None
+
+def _init_worker(file_path):
+    global _worker_tree_id
+    _worker_tree_id = engine.acquire_event_tree(file_path)
+
+def play_once(tree_id, policy='random', script=None, seed=None, max_steps=1000):
+    """模拟一局游戏，返回结局信息；tree_id 是 engine.acquire_event_tree 返回的共享事件树ID"""
+    rng = random.Random(seed)
+    game_state = engine.start_event_tree(engine.new_game_state(), tree_id)
+    path = []
+    last_event_id = None
+
+    while game_state['current_event_id'] and len(path) < max_steps:
+        event = engine.get_current_event(game_state)
+        if not event:
+            break
+        last_event_id = game_state['current_event_id']
+        choices = event.get('choices', [])
+        if not choices:
+            break
+
+        step = len(path)
+        if policy == 'first':
+            index = 0
+        elif policy == 'script':
+            index = script[step % len(script)] if script else 0
+            index = min(index, len(choices) - 1)
+        else:
+            index = rng.randrange(len(choices))
+
+        path.append(index)
+        game_state = engine.process_choice(game_state, choices[index])
+
+    # 只有达到步数上限时游戏还能继续选择才算截断，恰好在最后一步到达结局的不算
+    current_event = engine.get_current_event(game_state)
+    truncated = len(path) >= max_steps and bool(current_event and current_event.get('choices'))
+    return {
+        'ending': last_event_id,
+        'steps': len(path),
+        'truncated': truncated,
+        'stats': {key: game_state[key] for key in engine.STAT_KEYS},
+    }
+
+def _empty_summary():
+    return {
+        'runs': 0,
+        'steps': 0,
+        'truncated': 0,
+        'endings': {},
+        'stats': {key: {'min': None, 'max': None, 'sum': 0} for key in engine.STAT_KEYS},
+    }
+
+def _add_result(summary, result):
+    summary['runs'] += 1
+    summary['steps'] += result['steps']
+    summary['truncated'] += int(result['truncated'])
+    ending = result['ending'] or 'None'
+    summary['endings'][ending] = summary['endings'].get(ending, 0) + 1
+    for key, value in result['stats'].items():
+        stat = summary['stats'][key]
+        stat['min'] = value if stat['min'] is None else min(stat['min'], value)
+        stat['max'] = value if stat['max'] is None else max(stat['max'], value)
+        stat['sum'] += value
+
+def _merge_summary(total, part):
+    total['runs'] += part['runs']
+    total['steps'] += part['steps']
+    total['truncated'] += part['truncated']
+    for ending, count in part['endings'].items():
+        total['endings'][ending] = total['endings'].get(ending, 0) + count
+    for key, stat in part['stats'].items():
+        target = total['stats'][key]
+        if stat['min'] is None:
+            continue
+        target['min'] = stat['min'] if target['min'] is None else min(target['min'], stat['min'])
+        target['max'] = stat['max'] if target['max'] is None else max(target['max'], stat['max'])
+        target['sum'] += stat['sum']
+
+def _run_chunk(start, count, policy, script, seed, max_steps):
+    """在工作进程中模拟一批游戏，只返回汇总结果以减少进程间传输"""
+    summary = _empty_summary()
+    for i in range(start, start + count):
+        result = play_once(_worker_tree_id, policy, script, seed + i, max_steps)
+        _add_result(summary, result)
+    return summary
+
+def run_batch(file_path, runs=1000, workers=None, policy='random', script=None,
+              seed=0, max_steps=1000, chunk_size=500):
+    """并行模拟多局游戏，返回汇总结果和吞吐量"""
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+
+    total = _empty_summary()
+    chunks = [(start, min(chunk_size, runs - start)) for start in range(0, runs, chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(file_path,)) as pool:
+        futures = [
+            pool.submit(_run_chunk, start, count, policy, script, seed, max_steps)
+            for start, count in chunks
+        ]
+        for future in futures:
+            _merge_summary(total, future.result())
+
+    elapsed = time.perf_counter() - started
+    for stat in total['stats'].values():
+        stat['mean'] = stat.pop('sum') / total['runs'] if total['runs'] else None
+    total.update({
+        'file': file_path,
+        'policy': policy,
+        'workers': workers,
+        'elapsed_seconds': elapsed,
+        'runs_per_second': total['runs'] / elapsed if elapsed else None,
+        'choices_per_second': total['steps'] / elapsed if elapsed else None,
+    })
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="批量模拟事件树的游戏流程")
+    parser.add_argument("file", help="事件树文件，例如 events/events.json")
+    parser.add_argument("--runs", type=int, default=1000, help="模拟的局数")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数，默认等于CPU核数")
+    parser.add_argument("--policy", choices=["random", "first", "script"], default="random",
+                        help="选择策略：随机、总选第一个、按脚本")
+    parser.add_argument("--script", default=None, help="脚本模式下每一步的选项序号，用逗号分隔，循环使用")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--max-steps", type=int, default=1000, help="每局最多步数，防止事件成环")
+    parser.add_argument("--output", default=None, help="把结果写入JSON文件")
+    args = parser.parse_args()
+    if args.runs < 1:
+        parser.error("--runs 至少为 1")
+
+    script = [int(x) for x in args.script.split(",")] if args.script else None
+    summary = run_batch(args.file, args.runs, args.workers, args.policy, script,
+                        args.seed, args.max_steps)
+
+    print(f"事件树: {summary['file']}")
+    print(f"模拟 {summary['runs']} 局，共 {summary['steps']} 次选择，"
+          f"用时 {summary['elapsed_seconds']:.2f} 秒（{summary['workers']} 个进程）")
+    print(f"吞吐量: {summary['runs_per_second']:.0f} 局/秒，{summary['choices_per_second']:.0f} 次选择/秒")
+    if summary['truncated']:
+        print(f"警告: {summary['truncated']} 局达到最大步数被截断，事件树中可能存在环")
+    print("结局分布:")
+    for ending, count in sorted(summary['endings'].items(), key=lambda x: -x[1]):
+        print(f"  {ending}: {count} ({count / summary['runs']:.1%})")
+    print("属性范围:")
+    for key, stat in summary['stats'].items():
+        print(f"  {key}: 最小 {stat['min']}，最大 {stat['max']}，平均 {stat['mean']:.1f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=4)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+"""性能测试
+
+用 synthetic_events.py 生成不同规模的事件树，测量主要操作的耗时和峰值内存：
+- load_event_tree：读取事件树文件并放入共享注册表（game_engine.acquire_event_tree）；
+- process_choice_fallback：选项没有 next_event 时按时间查找后续事件（单次耗时）；
+- create_map_data：根据势力范围生成带颜色的省份 GeoJSON（与事件树规模无关，只测一次）；
+- map_update：客户端地图每次更新只生成颜色数组（map_component.py），同时记录每次发送的字节数；
+- create_event_graph：生成事件关系图（没有安装 graphviz 的 dot 程序时只测图的构建）；
+- fix_event_data：补全缺失字段并修复失效引用（event_validator.normalize_event_data）；
+- save_events：整体写入事件存储（EventStore.import_tree，临时数据库）；
+- outcome_analysis：精确计算结局分布（outcome_analysis.analyze_event_tree），峰值内存应只随
+  同时未处理完的事件数和属性范围增长，不随事件总数增长；超过 OUTCOME_MAX_SIZE 的规模跳过。
+结果保存为JSON，可以用 --compare 与之前版本的结果对比。
+
+用法：
+    python benchmark.py --sizes 10,100,1000,10000 --output benchmark_results.json
+    python benchmark.py --sizes 10,1000 --compare benchmark_results.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import game_engine as engine
+from event_store import EventStore
+from event_validator import normalize_event_data
+from graph_cache import build_event_graph, render_event_graph
+from outcome_analysis import analyze_event_tree
+from synthetic_events import generate_event_tree, write_event_tree
+from tree_registry import registry
+
+DEFAULT_SIZES = "10,100,1000,10000,100000"
+FALLBACK_CALLS = 1000  # process_choice_fallback 每次测量调用的次数
+OUTCOME_MAX_SIZE = 20000  # 耗时随事件数和属性范围（随深度增长）的乘积增长，更大的规模不测
+
+def measure(func, setup=None, repeat=5, budget=10.0):
+    """多次运行 func(setup())，只计 func 的时间；返回最短、中位耗时和单独一次运行的峰值内存
+
+    总耗时超过 budget 秒后不再重复，保证大规模测试能在合理时间内结束。
+    """
+    timings = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        argument = setup() if setup else None
+        begin = time.perf_counter()
+        func(argument)
+        timings.append(time.perf_counter() - begin)
+        if time.perf_counter() - started > budget:
+            break
+
+    # tracemalloc 会明显拖慢运行，峰值内存单独测一次
+    argument = setup() if setup else None
+    tracemalloc.start()
+    try:
+        func(argument)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "min_seconds": min(timings),
+        "median_seconds": statistics.median(timings),
+        "repeats": len(timings),
+        "peak_bytes": peak,
+    }
+
+def _safe(name, func, *args, **kwargs):
+    """单项测试失败（例如缺少可选依赖）时记录错误，不影响其他测试"""
+    try:
+        return func(*args, **kwargs)
+    except Exception as e:
+        print(f"  {name}: 失败 {e}")
+        return {"error": str(e)}
+
+def bench_size(size, work_dir, repeat, branching):
+    """对一个规模的事件树运行所有与规模相关的测试"""
+    event_data = generate_event_tree(size, branching=branching)
+    path = os.path.join(work_dir, f"synthetic_{size}.json")
+    write_event_tree(event_data, path)
+    with open(path, "r", encoding="utf-8") as f:
+        raw = f.read()
+    results = {"file_bytes": len(raw.encode("utf-8"))}
+
+    def load(_):
+        tree_id = engine.acquire_event_tree(path)
+        registry.release(tree_id)
+
+    results["load_event_tree"] = _safe("load_event_tree", measure, load, repeat=repeat)
+
+    # 从中间的事件出发，选择一个没有 next_event 的选项
+    tree_id = engine.acquire_event_tree(path)
+    try:
+        middle = f"event_{size // 2 + 1}"
+        state = engine.start_event_tree(engine.new_game_state(), tree_id)
+        state['current_event_id'] = middle
+        choice = {"id": "fallback", "text": "", "consequences": {}, "next_event": None}
+
+        def fallback(_):
+            for _ in range(FALLBACK_CALLS):
+                engine.process_choice(state, choice)
+
+        result = _safe("process_choice_fallback", measure, fallback, repeat=repeat)
+        if "min_seconds" in result:
+            result["per_call_seconds"] = result["min_seconds"] / FALLBACK_CALLS
+        results["process_choice_fallback"] = result
+    finally:
+        registry.release(tree_id)
+
+    # 每次都在一份新的拷贝上规范化，拷贝不计入耗时
+    results["fix_event_data"] = _safe(
+        "fix_event_data", measure, normalize_event_data, setup=lambda: json.loads(raw), repeat=repeat
+    )
+
+    results["create_event_graph_build"] = _safe(
+        "create_event_graph_build", measure, lambda data: build_event_graph(data).source,
+        setup=lambda: event_data, repeat=repeat
+    )
+    if shutil.which("dot"):
+        results["create_event_graph"] = _safe(
+            "create_event_graph", measure, lambda data: render_event_graph(data, use_cache=False),
+            setup=lambda: event_data, repeat=repeat
+        )
+    else:
+        results["create_event_graph"] = {"skipped": "没有找到 graphviz 的 dot 程序"}
+
+    store = EventStore(os.path.join(work_dir, f"benchmark_{size}.db"))
+    results["save_events"] = _safe(
+        "save_events", measure, lambda data: store.import_tree("benchmark", data),
+        setup=lambda: event_data, repeat=repeat
+    )
+
+    if size <= OUTCOME_MAX_SIZE:
+        results["outcome_analysis"] = _safe(
+            "outcome_analysis", measure, analyze_event_tree, setup=lambda: event_data, repeat=repeat
+        )
+    else:
+        results["outcome_analysis"] = {"skipped": f"超过 {OUTCOME_MAX_SIZE} 个事件"}
+    return results
+
+def bench_map(repeat):
+    """地图数据生成，与事件树规模无关"""
+    from map_data import read_province_boundaries, province_features, territories_hash, build_geojson
+
+    names, geometries = province_features(read_province_boundaries())
+    territories = {
+        faction: tuple(provinces) for faction, provinces in engine.INITIAL_TERRITORIES.items()
+    }
+    territories['japanese'] = ('东北', '山东')
+
+    def build(_):
+        territories_hash(territories)
+        build_geojson(names, geometries, territories)
+
+    result = measure(build, repeat=repeat)
+    result["payload_bytes"] = len(json.dumps(build_geojson(names, geometries, territories), ensure_ascii=False))
+    return result
+
+def bench_map_update(repeat):
+    """客户端地图的一次更新：只生成颜色数组，几何数据已由浏览器缓存"""
+    from map_data import read_province_boundaries, province_features, territories_hash, province_color_bytes
+
+    names, _ = province_features(read_province_boundaries())
+    territories = {
+        faction: tuple(provinces) for faction, provinces in engine.INITIAL_TERRITORIES.items()
+    }
+    territories['japanese'] = ('东北', '山东')
+
+    def build(_):
+        territories_hash(territories)
+        province_color_bytes(names, territories)
+
+    result = measure(build, repeat=repeat)
+    result["payload_bytes"] = len(province_color_bytes(names, territories))
+    return result
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def run_benchmarks(sizes, repeat=5, branching=2):
+    """运行全部测试，返回结果字典"""
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "branching": branching,
+        },
+        "global": {},
+        "sizes": {},
+    }
+    print("create_map_data ...")
+    report["global"]["create_map_data"] = _safe("create_map_data", bench_map, repeat)
+    print("map_update ...")
+    report["global"]["map_update"] = _safe("map_update", bench_map_update, repeat)
+    work_dir = tempfile.mkdtemp(prefix="benchmark_")
+    try:
+        for size in sizes:
+            print(f"{size} 个事件 ...")
+            report["sizes"][str(size)] = bench_size(size, work_dir, repeat, branching)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return report
+
+def _rows(report):
+    """展开为 (规模, 测试名, 结果) 列表"""
+    rows = [("-", name, result) for name, result in report["global"].items()]
+    for size, results in report["sizes"].items():
+        rows.extend((size, name, result) for name, result in results.items() if isinstance(result, dict))
+    return rows
+
+def print_report(report, baseline=None):
+    """打印结果；给出 baseline 时同时打印与之前结果的耗时比值"""
+    previous = {(size, name): result for size, name, result in _rows(baseline)} if baseline else {}
+    print(f"{'规模':>8}  {'测试':<26} {'最短耗时':>12} {'中位耗时':>12} {'峰值内存':>12}" + ("  对比" if baseline else ""))
+    for size, name, result in _rows(report):
+        if "min_seconds" not in result:
+            print(f"{size:>8}  {name:<26} {result.get('skipped') or result.get('error')}")
+            continue
+        line = (f"{size:>8}  {name:<26} {result['min_seconds'] * 1000:10.2f}ms "
+                f"{result['median_seconds'] * 1000:10.2f}ms {result['peak_bytes'] / 1024 / 1024:10.2f}MB")
+        if "payload_bytes" in result:
+            line += f"  每次发送 {result['payload_bytes']} B"
+        old = previous.get((size, name), {})
+        if old.get("min_seconds"):
+            line += f"  x{result['min_seconds'] / old['min_seconds']:.2f}"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="事件树相关操作的性能测试")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="事件树规模，用逗号分隔，最大可到1000000")
+    parser.add_argument("--repeat", type=int, default=5, help="每项测试的重复次数")
+    parser.add_argument("--branching", type=int, default=2, help="每个事件的选项数")
+    parser.add_argument("--output", default=None, help="把结果写入JSON文件")
+    parser.add_argument("--compare", default=None, help="与之前保存的结果对比")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    report = run_benchmarks(sizes, args.repeat, args.branching)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+
+if __name__ == "__main__":
+    main()
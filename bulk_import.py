@@ -0,0 +1,329 @@
+"""事件树批量导入
+
+把一批事件树文件（剧本包）导入游戏使用的事件存储（app.db）：
+- 流式解析：JSON 文件按块读取，用 json.JSONDecoder.raw_decode 逐个解析 "events" 中的事件，
+  内存占用只与块大小和单个事件的大小有关，与文件大小无关；编译后的 .evt 文件通过 mmap 逐个读取；
+- 规范化：每个事件用 event_validator.normalize_event 补全缺失字段（与编辑器加载时相同），
+  失效的 next_event 在导入完成时用一条 SQL 统一置空；事件地点批量解析为省份（gazetteer）；
+- 去重：与之前导入过的文件逐字节相同时直接跳过，不再解析；否则边导入边计算规范化后的内容哈希，
+  内容相同（例如只是格式不同）的事件树只保留一份；
+- 写入：多个工作进程并行解析，每 batch_size 个事件在一个事务中写入临时事件树，
+  全部写完后在一个事务中替换同名事件树，导入中途失败不会留下半棵事件树；
+- 最后输出吞吐量报告（文件数、事件数、字节数、每秒事件数、各进程的峰值内存）。
+
+用法：
+    python bulk_import.py pack/ another/*.json
+    python bulk_import.py pack/ --workers 4 --batch-size 1000 --json import_report.json
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import resource
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from compiled_tree import CompiledEventTree, is_compiled
+from event_store import EventStore
+from event_validator import normalize_event
+from gazetteer import geocode_event_tree
+
+STAGING_PREFIX = "__import__/"
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_CHUNK_SIZE = 1 << 20  # 每次从文件读取的字符数
+LOCK_TIMEOUT = 120.0  # 等待其他进程释放写锁的最长时间（秒）
+
+_decoder = json.JSONDecoder()
+_encode = json.JSONEncoder(ensure_ascii=False).encode
+_WHITESPACE = " \t\r\n"
+
+class _JSONReader:
+    """按块读取文件，缓冲区只保留尚未解析的部分"""
+
+    def __init__(self, file, chunk_size):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """跳过空白，返回下一个字符，文件结束时返回None"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return None
+
+    def expect(self, chars):
+        ch = self.peek()
+        if ch is None or ch not in chars:
+            raise ValueError(f"事件树文件格式错误：期望 {chars!r}，实际为 {ch!r}")
+        self.pos += 1
+        return ch
+
+    def value(self):
+        """解析下一个完整的 JSON 值，缓冲区中的内容不完整时继续读取"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof or not self._fill():
+                    raise
+                continue
+            # 值恰好在缓冲区末尾结束时（例如数字 12 后面还有 3），需要读到更多内容才能确定
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+def iter_tree_file(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """流式读取事件树文件，依次产生 ("event", 事件ID, 事件) 和 ("field", 键, 值)（顶层的其他字段）"""
+    if is_compiled(file_path):
+        tree = CompiledEventTree(file_path)
+        try:
+            for key, value in tree.meta.items():
+                yield "field", key, value
+            for event_id, event in tree.decoded_items():
+                yield "event", event_id, event
+        finally:
+            tree.close()
+        return
+
+    with open(file_path, "r", encoding="utf-8-sig") as f:
+        reader = _JSONReader(f, chunk_size)
+        reader.expect("{")
+        while reader.peek() != "}":
+            if reader.peek() == ",":
+                reader.pos += 1
+                continue
+            key = reader.value()
+            reader.expect(":")
+            if key != "events":
+                yield "field", key, reader.value()
+                continue
+            # events 既可能是对象也可能是数组（与 stream_parser 一致）
+            closing = "}" if reader.expect("{[") == "{" else "]"
+            count = 0
+            while reader.peek() != closing:
+                if reader.peek() == ",":
+                    reader.pos += 1
+                    continue
+                if reader.peek() is None:
+                    raise ValueError("事件树文件不完整")
+                event_id = reader.value() if closing == "}" else None
+                if event_id is not None:
+                    reader.expect(":")
+                event = reader.value()
+                count += 1
+                if isinstance(event, dict):
+                    yield "event", event_id or event.get("id") or f"event_{count}", event
+            reader.pos += 1
+
+def file_hash(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """文件原始字节的哈希"""
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _peak_memory_mb():
+    """本进程的峰值常驻内存（MB），Linux 上 ru_maxrss 的单位是 KB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+_store = None
+
+def _init_worker(db_path):
+    global _store
+    _store = EventStore(db_path, timeout=LOCK_TIMEOUT)
+
+def import_file(file_path, tree_id=None, batch_size=DEFAULT_BATCH_SIZE, chunk_size=DEFAULT_CHUNK_SIZE, store=None):
+    """把一个事件树文件流式导入事件存储，返回该文件的导入统计"""
+    store = store or _store
+    tree_id = tree_id or os.path.splitext(os.path.basename(file_path))[0]
+    staging_id = f"{STAGING_PREFIX}{tree_id}/{uuid.uuid4().hex}"
+    start = time.perf_counter()
+    result = {
+        "file": file_path,
+        "tree_id": tree_id,
+        "status": "imported",
+        "events": 0,
+        "choices": 0,
+        "bytes": os.path.getsize(file_path),
+        "batches": 0,
+    }
+
+    digest = hashlib.sha1()
+    meta = {}
+    batch = {}
+    position = 0
+
+    def flush():
+        nonlocal batch, position
+        if not batch:
+            return
+        geocode_event_tree({"events": batch})
+        store.append_events(staging_id, batch, position)
+        position += len(batch)
+        result["batches"] += 1
+        batch = {}
+
+    raw_hash = file_hash(file_path)
+    duplicate_of = store.find_import(raw_hash)
+    if duplicate_of is not None:
+        result.update(status="duplicate", duplicate_of=duplicate_of, events=0)
+        result["seconds"] = time.perf_counter() - start
+        result["peak_memory_mb"] = round(_peak_memory_mb(), 1)
+        return result
+
+    store.begin_import(staging_id)
+    try:
+        for kind, key, value in iter_tree_file(file_path, chunk_size):
+            if kind == "field":
+                meta[key] = value
+                continue
+            event = normalize_event(key, value)
+            digest.update(_encode([key, event]).encode("utf-8"))
+            result["events"] += 1
+            result["choices"] += len(event["choices"])
+            batch[key] = event
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+        meta.pop("events", None)
+        meta.pop("time_index", None)
+        digest.update(json.dumps(meta, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+        content_hash = digest.hexdigest()
+        duplicate_of = store.finish_import(staging_id, tree_id, meta, content_hash, raw_hash, source=file_path)
+    except Exception as e:
+        store.abort_import(staging_id)
+        result.update(status="failed", error=f"{type(e).__name__}: {e}")
+    else:
+        result["content_hash"] = content_hash
+        if duplicate_of is not None:
+            result.update(status="duplicate", duplicate_of=duplicate_of)
+    result["seconds"] = time.perf_counter() - start
+    result["peak_memory_mb"] = round(_peak_memory_mb(), 1)
+    return result
+
+def collect_files(paths):
+    """展开目录和通配符，返回要导入的事件树文件列表（去掉重复路径）"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = sorted(
+                os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+            )
+        else:
+            candidates = sorted(glob.glob(path)) or [path]
+        files.extend(name for name in candidates if name.endswith(".json") or is_compiled(name))
+    return list(dict.fromkeys(files))
+
+def bulk_import(files, db_path=None, workers=None, batch_size=DEFAULT_BATCH_SIZE,
+                chunk_size=DEFAULT_CHUNK_SIZE, on_result=None):
+    """用进程池并行导入多个文件，返回汇总报告；on_result(result) 在每个文件完成时调用"""
+    store = EventStore(db_path, timeout=LOCK_TIMEOUT)
+    try:
+        # 清理之前中断的导入留下的临时事件树
+        stale = store.delete_trees_with_prefix(STAGING_PREFIX)
+        db_path = store.db_path
+    finally:
+        store.close()
+
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(db_path,)) as pool:
+        futures = [pool.submit(import_file, file_path, None, batch_size, chunk_size) for file_path in files]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+    seconds = time.perf_counter() - start
+
+    order = {file_path: index for index, file_path in enumerate(files)}
+    results.sort(key=lambda result: order[result["file"]])
+    imported = [result for result in results if result["status"] == "imported"]
+    events = sum(result["events"] for result in results if result["status"] != "failed")
+    total_bytes = sum(result["bytes"] for result in results)
+    return {
+        "db_path": db_path,
+        "files": len(files),
+        "imported": len(imported),
+        "duplicates": sum(1 for result in results if result["status"] == "duplicate"),
+        "failed": sum(1 for result in results if result["status"] == "failed"),
+        "stale_removed": stale,
+        "events": events,
+        "choices": sum(result["choices"] for result in results if result["status"] != "failed"),
+        "bytes": total_bytes,
+        "seconds": seconds,
+        "events_per_second": events / seconds if seconds else 0.0,
+        "mb_per_second": total_bytes / (1024 * 1024) / seconds if seconds else 0.0,
+        "peak_worker_memory_mb": max((result["peak_memory_mb"] for result in results), default=0.0),
+        "results": results,
+    }
+
+def format_report(report):
+    """吞吐量报告的文本形式"""
+    lines = [
+        f"数据库：{report['db_path']}",
+        f"文件：{report['files']} 个，导入 {report['imported']}，重复 {report['duplicates']}，失败 {report['failed']}",
+        f"事件：{report['events']} 个，选项 {report['choices']} 个，共 {report['bytes'] / (1024 * 1024):.1f} MB",
+        f"耗时：{report['seconds']:.2f} s，{report['events_per_second']:.0f} 事件/s，"
+        f"{report['mb_per_second']:.2f} MB/s",
+        f"工作进程峰值内存：{report['peak_worker_memory_mb']:.1f} MB",
+    ]
+    if report["stale_removed"]:
+        lines.append(f"清理了 {report['stale_removed']} 个中断导入留下的临时事件树")
+    for result in report["results"]:
+        if result["status"] == "failed":
+            lines.append(f"  失败 {result['file']}：{result['error']}")
+        elif result["status"] == "duplicate":
+            lines.append(f"  重复 {result['file']}：与事件树 {result['duplicate_of']} 内容相同，已跳过")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="把事件树文件批量导入事件存储")
+    parser.add_argument("paths", nargs="*", default=["events"], help="事件树文件、目录或通配符，默认导入 events/")
+    parser.add_argument("--db", default=None, help="数据库文件，默认使用 Config 中的 app.db")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数，默认等于CPU核数")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="每个事务写入的事件数")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="每次从文件读取的字符数")
+    parser.add_argument("--json", default=None, help="把完整报告写入JSON文件")
+    args = parser.parse_args()
+
+    files = collect_files(args.paths)
+    if not files:
+        print("没有找到事件树文件")
+        sys.exit(1)
+
+    def on_result(result):
+        print(f"{result['file']}: {result['status']}，{result['events']} 个事件，{result['seconds']:.2f} s")
+
+    report = bulk_import(files, db_path=args.db, workers=args.workers, batch_size=args.batch_size,
+                         chunk_size=args.chunk_size, on_result=on_result)
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+    sys.exit(1 if report["failed"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""编译后的事件树文件格式
+
+把 events/*.json 事件树编译成带索引的二进制文件（.evt），运行时通过 mmap 按需读取单个事件，
+不需要把整个事件树解析进内存。
+
+文件布局（小端）：
+    文件头    magic, 版本, 事件数, 各段偏移
+    元数据    name、initial_event 等顶层字段（JSON）
+    节点表    每个事件一条记录：ID 偏移/长度、事件内容偏移/长度，顺序与原文件一致
+    ID排序表  按 ID 字节序排列的节点序号，用于二分查找
+    时间索引  (year*12+month, 节点序号)，按时间排序，同月保持原文件顺序
+    数据区    事件 ID 和事件内容（JSON，next_event 替换为节点序号）
+
+用法：
+    python compiled_tree.py events/events.json [-o 输出文件]
+    python compiled_tree.py --all
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+from tree_registry import freeze
+
+COMPILED_EXT = ".evt"
+MAGIC = b"HGEVTREE"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sIIQQQQQQ")  # magic, 版本, 事件数, 元数据偏移/长度, 节点表, ID排序表, 时间索引, 数据区
+_NODE = struct.Struct("<QIQI")  # ID偏移, ID长度, 内容偏移, 内容长度
+_SORTED = struct.Struct("<I")
+_TIME = struct.Struct("<iI")
+
+def is_compiled(file_path):
+    """根据扩展名判断是否为编译后的事件树"""
+    return file_path.endswith(COMPILED_EXT)
+
+def compile_event_tree(event_data, output_path):
+    """把事件树字典编译成二进制文件"""
+    events = event_data.get("events", {})
+    event_ids = list(events.keys())
+    id_to_index = {event_id: i for i, event_id in enumerate(event_ids)}
+
+    meta = {key: value for key, value in event_data.items() if key not in ("events", "time_index")}
+    meta_bytes = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+
+    # 数据区：事件ID和内容，next_event 换成节点序号（找不到的保持原值）
+    blob = bytearray()
+    nodes = []
+    for event_id in event_ids:
+        event = dict(events[event_id])
+        choices = []
+        for choice in event.get("choices", []):
+            choice = dict(choice)
+            if choice.get("next_event") in id_to_index:
+                choice["next_event"] = id_to_index[choice["next_event"]]
+            choices.append(choice)
+        if "choices" in event:
+            event["choices"] = choices
+        id_bytes = event_id.encode("utf-8")
+        body_bytes = json.dumps(event, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        nodes.append((len(blob), len(id_bytes), len(blob) + len(id_bytes), len(body_bytes)))
+        blob += id_bytes
+        blob += body_bytes
+
+    sorted_indexes = sorted(range(len(event_ids)), key=lambda i: event_ids[i].encode("utf-8"))
+    time_entries = sorted(
+        (events[event_id]["year"] * 12 + events[event_id]["month"], i)
+        for i, event_id in enumerate(event_ids)
+    )
+
+    meta_offset = _HEADER.size
+    nodes_offset = meta_offset + len(meta_bytes)
+    sorted_offset = nodes_offset + _NODE.size * len(nodes)
+    time_offset = sorted_offset + _SORTED.size * len(nodes)
+    data_offset = time_offset + _TIME.size * len(nodes)
+
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(nodes), meta_offset, len(meta_bytes),
+                             nodes_offset, sorted_offset, time_offset, data_offset))
+        f.write(meta_bytes)
+        for id_offset, id_length, body_offset, body_length in nodes:
+            f.write(_NODE.pack(data_offset + id_offset, id_length, data_offset + body_offset, body_length))
+        for i in sorted_indexes:
+            f.write(_SORTED.pack(i))
+        for key, i in time_entries:
+            f.write(_TIME.pack(key, i))
+        f.write(blob)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+def compile_file(source_path, output_path=None):
+    """编译一个 JSON 事件树文件，默认输出到同目录的 .evt 文件"""
+    if output_path is None:
+        output_path = os.path.splitext(source_path)[0] + COMPILED_EXT
+    with open(source_path, "r", encoding="utf-8") as f:
+        event_data = json.load(f)
+    return compile_event_tree(event_data, output_path)
+
+class _TimeKeys:
+    """时间索引中月份键的只读序列视图，可直接用于 bisect"""
+
+    def __init__(self, tree):
+        self._tree = tree
+
+    def __len__(self):
+        return len(self._tree)
+
+    def __getitem__(self, position):
+        return _TIME.unpack_from(self._tree._buffer, self._tree._time_offset + position * _TIME.size)[0]
+
+class _TimeIds:
+    """时间索引中事件ID的只读序列视图"""
+
+    def __init__(self, tree):
+        self._tree = tree
+
+    def __len__(self):
+        return len(self._tree)
+
+    def __getitem__(self, position):
+        index = _TIME.unpack_from(self._tree._buffer, self._tree._time_offset + position * _TIME.size)[1]
+        return self._tree.event_id(index)
+
+class CompiledEventTree:
+    """通过 mmap 按需读取的事件树，接口与 events 字典一致（只读）
+
+    放在共享注册表中时所有会话共用一个实例：读取到的事件冻结为只读结构后放入带锁的 LRU 缓存；
+    需要修改的场合（编辑器、批量导入）用 decoded_items() 得到新的普通字典。
+    """
+
+    def __init__(self, file_path, cache_size=256):
+        self.file_path = file_path
+        self._file = open(file_path, "rb")
+        self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self._count, meta_offset, meta_length, self._nodes_offset,
+         self._sorted_offset, self._time_offset, _) = _HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"不是有效的事件树编译文件: {file_path}")
+        self.meta = json.loads(self._buffer[meta_offset:meta_offset + meta_length].decode("utf-8"))
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock()
+
+    def close(self):
+        self._buffer.close()
+        self._file.close()
+
+    def _node(self, index):
+        return _NODE.unpack_from(self._buffer, self._nodes_offset + index * _NODE.size)
+
+    def event_id(self, index):
+        """根据节点序号读取事件ID"""
+        id_offset, id_length, _, _ = self._node(index)
+        return self._buffer[id_offset:id_offset + id_length].decode("utf-8")
+
+    def index_of(self, event_id):
+        """二分查找事件ID对应的节点序号，找不到返回None"""
+        target = event_id.encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            index = _SORTED.unpack_from(self._buffer, self._sorted_offset + middle * _SORTED.size)[0]
+            id_offset, id_length, _, _ = self._node(index)
+            current = self._buffer[id_offset:id_offset + id_length]
+            if current == target:
+                return index
+            if current < target:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def _decode(self, index):
+        """解码一个事件为新的普通字典，并把 next_event 序号还原为事件ID"""
+        _, _, body_offset, body_length = self._node(index)
+        event = json.loads(self._buffer[body_offset:body_offset + body_length].decode("utf-8"))
+        for choice in event.get("choices", []):
+            if isinstance(choice.get("next_event"), int):
+                choice["next_event"] = self.event_id(choice["next_event"])
+        return event
+
+    def _load(self, index):
+        """读取一个只读事件，多个线程同时读取时共用缓存"""
+        with self._cache_lock:
+            event = self._cache.get(index)
+            if event is not None:
+                self._cache.move_to_end(index)
+                return event
+        # 解码不在锁内进行，两个线程同时解码同一事件时结果相同，保留先放入缓存的一份
+        event = freeze(self._decode(index))
+        with self._cache_lock:
+            event = self._cache.setdefault(index, event)
+            self._cache.move_to_end(index)
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return event
+
+    def get(self, event_id, default=None):
+        if not isinstance(event_id, str):
+            return default
+        index = self.index_of(event_id)
+        if index is None:
+            return default
+        return self._load(index)
+
+    def __getitem__(self, event_id):
+        event = self.get(event_id)
+        if event is None:
+            raise KeyError(event_id)
+        return event
+
+    def __contains__(self, event_id):
+        return isinstance(event_id, str) and self.index_of(event_id) is not None
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self.event_id(index)
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        for index in range(self._count):
+            yield self._load(index)
+
+    def items(self):
+        for index in range(self._count):
+            yield self.event_id(index), self._load(index)
+
+    def time_index(self):
+        """返回与 game_engine.build_time_index 相同形式的惰性时间索引"""
+        return _TimeKeys(self), _TimeIds(self)
+
+    def decoded_items(self):
+        """逐个返回 (事件ID, 可修改的普通字典)，不经过缓存"""
+        for index in range(self._count):
+            yield self.event_id(index), self._decode(index)
+
+    def to_dict(self):
+        """把整个事件树还原为普通字典（编辑器使用）"""
+        event_data = dict(self.meta)
+        event_data["events"] = dict(self.decoded_items())
+        return event_data
+
+def open_event_tree(file_path):
+    """打开编译后的事件树，返回与 JSON 事件树结构相同的字典，events 为惰性读取的映射"""
+    tree = CompiledEventTree(file_path)
+    event_data = dict(tree.meta)
+    event_data["events"] = tree
+    event_data["time_index"] = tree.time_index()
+    return event_data
+
+def load_event_data(file_path):
+    """读取任意格式的事件树，返回完整的普通字典"""
+    if is_compiled(file_path):
+        tree = CompiledEventTree(file_path)
+        try:
+            return tree.to_dict()
+        finally:
+            tree.close()
+    with open(file_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description="把事件树 JSON 编译成可 mmap 读取的二进制文件")
+    parser.add_argument("files", nargs="*", help="要编译的事件树文件")
+    parser.add_argument("-o", "--output", default=None, help="输出文件（只编译一个文件时有效）")
+    parser.add_argument("--all", action="store_true", help="编译 events 文件夹下的所有 JSON 文件")
+    args = parser.parse_args()
+
+    files = list(args.files)
+    if args.all:
+        files += [os.path.join("events", f) for f in sorted(os.listdir("events")) if f.endswith(".json")]
+    for source_path in files:
+        output_path = args.output if args.output and len(files) == 1 else None
+        output_path = compile_file(source_path, output_path)
+        print(f"{source_path} -> {output_path} ({os.path.getsize(output_path)} 字节)")
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,8 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # HTTP 接口的玩家会话存储（见 session_store.py）：默认保存在上面的数据库中，"memory" 时保存在进程内存中
+    SESSION_STORE_URL = os.environ.get('SESSION_STORE_URL')
 
 # 大模型配置
 LLM_CONFIG = {
@@ -17,4 +19,38 @@ LLM_CONFIG = {
     "model": "deepseek-v3",  # 模型名称
     "temperature": 0.7,  # 温度参数
     "max_tokens": 8000,  # 最大token数
-} 
\ No newline at end of file
+    "chunk_size": 3000,  # 长文本分块生成时每块的最大字数，超过该长度的输入会分块并发生成
+    "chunk_overlap": 300,  # 相邻块重叠的字数
+    "max_concurrency": 4,  # 分块生成时的最大并发请求数
+    "use_cache": True,  # 相同的提示词和参数直接使用缓存的响应（见 llm_cache.py）
+    "cache_max_bytes": 256 * 1024 * 1024,  # 响应缓存占用磁盘的上限
+} 
+
+# 地图配置
+MAP_CONFIG = {
+    "use_lod": True,  # 是否使用预处理生成的简化省份边界（见 map_lod.py）
+    "lod_dir": "map_lod",  # 简化边界数据目录
+    "zoom": 3,  # 地图初始缩放级别，同时决定使用哪一级简化数据
+    # 为 True 时使用客户端地图组件（见 map_component.py）：几何数据只发送一次，之后只发送颜色数组；
+    # 为 False 时每次运行用 st.pydeck_chart 发送完整的 GeoJSON
+    "client_map": os.environ.get('CLIENT_MAP', '1') == '1',
+    "timeline_frame_seconds": 0.5,  # 时间线播放时每个月停留的秒数
+}
+
+# 启动配置
+STARTUP_CONFIG = {
+    # 为 True 时地图默认折叠，geopandas/pydeck 等重量级依赖要等玩家打开地图才加载
+    "defer_map": os.environ.get('DEFER_MAP', '0') == '1',
+    # 为 True 时编辑器的事件树可视化默认折叠，graphviz 要等打开后才加载
+    "defer_graph": os.environ.get('DEFER_GRAPH', '0') == '1',
+}
+
+# 性能监控配置（见 perf_trace.py）
+PERF_CONFIG = {
+    # 为 True 时侧边栏默认显示性能面板
+    "show_panel": os.environ.get('PERF_PANEL', '0') == '1',
+    "log_file": os.path.join(".cache", "perf", "perf.log"),  # 每次运行的耗时记录
+    "log_max_bytes": 5 * 1024 * 1024,  # 单个日志文件的大小上限，超过后轮转
+    "log_backups": 3,  # 保留的旧日志文件数
+    "profile_interval": 0.005,  # 采样分析器的采样间隔（秒）
+}
@@ -0,0 +1,96 @@
+"""内存 + 磁盘两级文本缓存
+
+按键保存文本，内存中按 LRU 淘汰，磁盘上按修改时间淘汰最旧的文件，两者都以占用字节数为上限。
+事件关系图的 SVG（graph_cache.py）和大模型响应（llm_cache.py）都使用它。
+"""
+import os
+import threading
+from collections import OrderedDict
+
+class TextCache:
+    """内存 + 磁盘两级缓存，按占用字节数淘汰"""
+
+    def __init__(self, cache_dir, suffix=".txt", max_memory_bytes=32 * 1024 * 1024, max_disk_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.suffix = suffix
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def _remember(self, key, text):
+        size = len(text.encode('utf-8'))
+        if size > self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key).encode('utf-8'))
+        self._memory[key] = text
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted.encode('utf-8'))
+
+    def get(self, key):
+        """读取缓存，未命中返回None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                text = f.read()
+            # 更新访问时间，供磁盘淘汰使用
+            os.utime(self._path(key))
+        except (FileNotFoundError, OSError):
+            return None
+        with self._lock:
+            self._remember(key, text)
+        return text
+
+    def put(self, key, text):
+        """写入缓存"""
+        with self._lock:
+            self._remember(key, text)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = self._path(key) + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, self._path(key))
+            self._evict_disk()
+        except OSError:
+            # 磁盘不可写时只使用内存缓存
+            pass
+
+    def _evict_disk(self):
+        """磁盘缓存超过上限时，按修改时间删除最旧的文件"""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(self.suffix):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= self.max_disk_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_disk_bytes:
+                break
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        if os.path.isdir(self.cache_dir):
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith(self.suffix):
+                    os.remove(entry.path)
@@ -0,0 +1,134 @@
+"""事件树目录索引
+
+在 events 文件夹下维护一个索引文件（.catalog），记录每个事件树的名称、事件数、年份范围、
+初始事件和内容哈希。刷新时只比较文件的修改时间和大小，只有变化过的文件才会重新解析。
+"""
+import hashlib
+import json
+import os
+import threading
+
+from compiled_tree import CompiledEventTree, is_compiled, COMPILED_EXT
+
+EVENTS_DIR = "events"
+CATALOG_FILE = ".catalog"
+CATALOG_VERSION = 1
+
+def _is_tree_file(file_name):
+    return not file_name.startswith(".") and (file_name.endswith(".json") or file_name.endswith(COMPILED_EXT))
+
+def _describe_json(file_path):
+    """解析 JSON 事件树，提取索引信息"""
+    with open(file_path, "rb") as f:
+        raw = f.read()
+    event_data = json.loads(raw.decode("utf-8"))
+    events = event_data.get("events", {})
+    years = [event["year"] for event in events.values() if "year" in event]
+    return {
+        "name": event_data.get("name"),
+        "event_count": len(events),
+        "year_span": [min(years), max(years)] if years else None,
+        "initial_event": event_data.get("initial_event"),
+        "content_hash": hashlib.sha1(raw).hexdigest(),
+    }
+
+def _describe_compiled(file_path):
+    """读取编译后事件树的元数据和时间索引，提取索引信息"""
+    hasher = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            hasher.update(block)
+    tree = CompiledEventTree(file_path)
+    try:
+        keys, _ = tree.time_index()
+        # 月份键为 year*12+month，month 取值 1~12
+        year_span = [(keys[0] - 1) // 12, (keys[len(keys) - 1] - 1) // 12] if len(tree) else None
+        return {
+            "name": tree.meta.get("name"),
+            "event_count": len(tree),
+            "year_span": year_span,
+            "initial_event": tree.meta.get("initial_event"),
+            "content_hash": hasher.hexdigest(),
+        }
+    finally:
+        tree.close()
+
+def describe_tree(file_path):
+    """提取单个事件树文件的索引信息"""
+    if is_compiled(file_path):
+        return _describe_compiled(file_path)
+    return _describe_json(file_path)
+
+def _read_catalog(catalog_path):
+    try:
+        with open(catalog_path, "r", encoding="utf-8") as f:
+            catalog = json.load(f)
+        if catalog.get("version") == CATALOG_VERSION:
+            return catalog.get("entries", {})
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return {}
+
+def _write_catalog(catalog_path, entries):
+    # 多个进程（以及同一进程的多个线程）可能同时刷新索引，每个写入者使用自己的临时文件
+    tmp_path = f"{catalog_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": CATALOG_VERSION, "entries": entries}, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, catalog_path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def refresh_catalog(directory=EVENTS_DIR):
+    """按修改时间和大小检查目录，更新并返回索引（文件名 -> 索引信息）"""
+    catalog_path = os.path.join(directory, CATALOG_FILE)
+    entries = _read_catalog(catalog_path)
+    updated = {}
+    changed = False
+
+    for entry in os.scandir(directory):
+        if not entry.is_file() or not _is_tree_file(entry.name):
+            continue
+        stat = entry.stat()
+        cached = entries.get(entry.name)
+        if cached and cached["mtime_ns"] == stat.st_mtime_ns and cached["size"] == stat.st_size:
+            updated[entry.name] = cached
+            continue
+        try:
+            info = describe_tree(entry.path)
+            info["error"] = None
+        except Exception as e:
+            # 无法解析的文件也记录下来，避免每次刷新都重复解析
+            info = {"name": None, "event_count": 0, "year_span": None,
+                    "initial_event": None, "content_hash": None, "error": str(e)}
+        info.update({"mtime_ns": stat.st_mtime_ns, "size": stat.st_size})
+        updated[entry.name] = info
+        changed = True
+
+    updated = dict(sorted(updated.items()))
+    if changed or set(updated) != set(entries):
+        try:
+            _write_catalog(catalog_path, updated)
+        except OSError:
+            # 目录只读时仍然返回内存中的索引
+            pass
+    return updated
+
+def format_entry(file_name, info):
+    """生成下拉框中显示的文字"""
+    label = file_name.replace(".json", "")
+    if info.get("error"):
+        return f"{label}（无法解析）"
+    if info.get("year_span"):
+        start, end = info["year_span"]
+        years = f"{start}年" if start == end else f"{start}-{end}年"
+        return f"{label}（{info['event_count']}个事件，{years}）"
+    return f"{label}（{info['event_count']}个事件）"
+
+if __name__ == "__main__":
+    for file_name, info in refresh_catalog().items():
+        print(f"{file_name}: {format_entry(file_name, info)}  {info.get('content_hash')}")
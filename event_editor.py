@@ -1,11 +1,23 @@
+import asyncio
 import datetime
+import time
 import traceback
 import streamlit as st
 import json
 import os
-import graphviz
-from openai import OpenAI
-from config import LLM_CONFIG
+from config import LLM_CONFIG, STARTUP_CONFIG
+from compiled_tree import load_event_data
+from event_catalog import refresh_catalog, format_entry
+from event_store import EventStore
+from graph_cache import render_event_graph
+from stream_parser import EventStreamParser
+from llm_cache import llm_cache, response_cache_key
+from event_generation import SYSTEM_PROMPT, build_generation_prompt, split_text, generate_events_chunked
+from event_validator import normalize_event_data, check_event_data, format_report
+import perf_trace
+from perf_panel import render_perf_panel
+from event_search import EventSearchIndex, paginate
+from gazetteer import geocode_event_tree, resolve_locations
 
 # 省份数据
 PROVINCES = {
@@ -24,24 +36,46 @@ PROVINCES = {
 # 设置页面为宽屏模式
 st.set_page_config(layout="wide")
 
-# 配置OpenAI客户端
-client = OpenAI(
-    base_url=LLM_CONFIG["api_base"],
-    api_key=LLM_CONFIG["api_key"]
+# 记录本次运行各阶段的耗时
+perf_trace.start_run(
+    "event_editor",
+    st.session_state.setdefault("perf_stats", {}),
+    profile=st.session_state.pop("profile_next_run", False)
 )
 
-def load_events():
-    """加载事件数据"""
-    try:
-        with open('events.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {"events": {}, "initial_event": None}
+@st.cache_resource
+def get_llm_client():
+    """配置OpenAI客户端，第一次调用大模型时才导入并创建"""
+    from openai import OpenAI
+    return OpenAI(
+        base_url=LLM_CONFIG["api_base"],
+        api_key=LLM_CONFIG["api_key"]
+    )
+
+# 默认编辑的事件树
+DEFAULT_TREE_ID = "default"
 
-def save_events(events_data):
-    """保存事件数据"""
-    with open('events.json', 'w', encoding='utf-8') as f:
-        json.dump(events_data, f, ensure_ascii=False, indent=4)
+@st.cache_resource
+def get_event_store():
+    """整个进程共用一个事件存储（app.db）"""
+    return EventStore()
+
+def load_events(tree_id=DEFAULT_TREE_ID):
+    """从事件存储加载事件数据，默认事件树第一次使用时导入旧的 events.json"""
+    store = get_event_store()
+    with perf_trace.span("tree_load"):
+        if not store.has_tree(tree_id):
+            try:
+                with open('events.json', 'r', encoding='utf-8') as f:
+                    store.import_tree(tree_id, json.load(f))
+            except FileNotFoundError:
+                store.import_tree(tree_id, {"events": {}, "initial_event": None})
+        return store.export_tree(tree_id)
+
+def save_events(events_data, tree_id=DEFAULT_TREE_ID):
+    """整体保存事件数据（导入或生成新的事件树时使用），单个事件的修改请用 get_event_store() 按行写入"""
+    with perf_trace.span("save"):
+        get_event_store().import_tree(tree_id, events_data)
 
 def create_new_event():
     """创建新事件的默认结构"""
@@ -70,249 +104,234 @@ def create_new_choice():
     }
 
 def create_event_graph(events_data):
-    """创建事件关系图"""
+    """创建事件关系图，图结构和标签不变时直接使用缓存的SVG"""
     try:
-        dot = graphviz.Digraph(comment='事件树')
-        dot.attr(rankdir='TB')  # 从上到下布局
-        dot.attr('node', shape='box', style='rounded')
-        
-        # 添加所有事件节点
-        for event_id, event in events_data['events'].items():
-            # 设置节点样式
-            if event_id == events_data['initial_event']:
-                dot.node(event_id, f"{event['title']}\n({event['year']}年{event['month']}月)", 
-                        style='filled', fillcolor='lightblue')
-            else:
-                dot.node(event_id, f"{event['title']}\n({event['year']}年{event['month']}月)")
-        
-        # 添加事件之间的连接
-        for event_id, event in events_data['events'].items():
-            for option in event['choices']:
-                if option['next_event']:
-                    dot.edge(event_id, option['next_event'], label=option['text'])
-        
-        # 使用二进制模式获取输出
-        svg_data = dot.pipe(format='svg')
-        return svg_data.decode('utf-8', errors='replace')
+        with perf_trace.span("graph_render"):
+            return render_event_graph(events_data)
     except Exception as e:
         st.error(f"生成事件树时出错: {str(e)}")
         return None
 
-import pysnooper 
+# 事件列表每页显示的事件数
+EVENT_PAGE_SIZE = 50
 
-def fix_event_data(events_data):
-    """修复事件数据中缺失的字段"""
-    if not events_data or "events" not in events_data:
-        return events_data
-        
-    for event_id, event in events_data["events"].items():
-        # 确保事件有所有必需的字段
-        if "description" not in event:
-            event["description"] = ""
-        if "choices" not in event:
-            event["choices"] = []
-        if "location" not in event:  # 添加 location 字段检查
-            event["location"] = []
-            
-        # 修复每个选项的字段
-        for choice in event["choices"]:
-            if "consequences" not in choice:
-                choice["consequences"] = {
-                    "military_power": 0,
-                    "political_power": 0,
-                    "economic_power": 0,
-                    "territories": {}
-                }
-            else:
-                # 确保consequences中有所有必需的字段
-                for key in ["military_power", "political_power", "economic_power"]:
-                    if key not in choice["consequences"]:
-                        choice["consequences"][key] = 0
-                if "territories" not in choice["consequences"]:
-                    choice["consequences"]["territories"] = {}
-    
-    return events_data
+def get_search_index():
+    """当前事件树的搜索索引，换了事件树或调用 invalidate_search_index() 后才重新建立"""
+    events = st.session_state.events_data["events"]
+    key = (id(events), st.session_state.get("search_index_version", 0))
+    if st.session_state.get("search_index_key") != key:
+        st.session_state.search_index = EventSearchIndex(events)
+        st.session_state.search_index_key = key
+    return st.session_state.search_index
 
-def generate_events_from_text(text):
+def invalidate_search_index():
+    """事件的ID、标题、描述或年份变化后调用"""
+    st.session_state.search_index_version = st.session_state.get("search_index_version", 0) + 1
+
+def get_validation_report():
+    """当前事件树的检查报告，只在换了事件树或调用 invalidate_validation() 后才重新检查
+
+    重新检查时以事件树ID和事件存储中的修改时间作为缓存键，打开同一版本事件树的会话共享同一份报告。
+    """
+    version = st.session_state.get("validation_version", 0)
+    if st.session_state.get("validation_report_version") != version or "validation_report" not in st.session_state:
+        tree_id = st.session_state.tree_id
+        cache_key = (get_event_store().db_path, tree_id, get_event_store().tree_version(tree_id))
+        st.session_state.validation_report = check_event_data(st.session_state.events_data, cache_key)
+        st.session_state.validation_report_version = version
+    return st.session_state.validation_report
+
+def invalidate_validation():
+    """事件树内容变化（加载、生成、添加、保存、删除）并写入事件存储后调用"""
+    st.session_state.validation_version = st.session_state.get("validation_version", 0) + 1
+
+def with_current(options, current):
+    """保证当前值出现在选项中（放在最前面），避免翻页或搜索时丢掉已选的事件"""
+    if current and current not in options and current in st.session_state.events_data["events"]:
+        return [current] + options
+    return options
+
+# 生成事件树时界面刷新的最小间隔（秒）
+STREAM_RENDER_INTERVAL = 0.5
+
+def render_generation_progress(placeholder, parser):
+    """显示已生成的事件数量和列表"""
+    lines = [f"已生成 {len(parser.events)} 个事件"]
+    for event_id, event in parser.events.items():
+        lines.append(f"- {event.get('year', '')}年{event.get('month', '')}月 {event.get('title') or event_id}")
+    placeholder.markdown("\n".join(lines))
+
+def generate_events_from_text(text, use_cache=True):
     """使用大模型根据文本生成线性事件列表"""
     try:
         # 构建提示词
-        prompt = f"""
-        请根据以下历史事件描述，生成一个线性的事件列表。每个事件应该包含：
-        1. 事件ID（格式：event_X）
-        2. 事件标题
-        3. 发生年份和月份
-        4. 发生地点列表
-        4. 一个选项，包含：
-           - 选项文本
-           - 后续事件ID
+        prompt = build_generation_prompt(text)
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
         
-        请以JSON格式输出，"name"为事件列表的名称，"events"为事件列表，"initial_event"为初始事件，格式如下：
-        {{
-            "name": "民国史诗",
-            "events": {{
-                "event_1": {{
-                    "id": "event_1",
-                    "title": "事件标题",
-                    "year": 1930,
-                    "month": 1,
-                    "location": ["beijing", "shanghai"],
-                    "choices": [
-                        {{
-                            "id": "choice_1",
-                            "text": "选项文本",
-                            "next_event": "event_2"
-                        }}
-                    ]
-                }},
-                "event_2": {{
-                    "id": "event_2",
-                    "title": "后续事件标题",
-                    "year": 1930,
-                    "month": 2,
-                    "choices": [
-                        {{
-                            "id": "choice_2",
-                            "text": "选项文本",
-                            "next_event": "event_3"
-                        }}
-                    ]
-                }},
-                "event_3": {{
-                    "id": "event_3",
-                    "title": "最终事件标题",
-                    "year": 1930,
-                    "month": 3,
-                    "choices": []
-                }}
-            }},
-            "initial_event": "event_1"
-        }}
-
-        注意事项：
-        1. 每个事件都应该有唯一的ID
-        2. 每个事件只有一个选项
-        3. 最后一个事件的choices应该为空数组
-        4. 事件之间应该形成合理的时间顺序
-        5. 事件的时间顺序要合理，后续事件的年月不能早于前导事件
-
-        历史事件描述：
-        {text}
-        """
+        # 增量解析流式输出，每个事件一闭合就显示出来，并限制界面刷新频率
+        parser = EventStreamParser()
+        response_chunks = []
+        output_placeholder = st.empty()  # 创建一个占位符
+        last_render = 0.0
         
-        # 调用大模型API
-        response = client.chat.completions.create(
-            model=LLM_CONFIG["model"],
-            messages=[
-                {"role": "system", "content": "你是一个历史事件分析专家，擅长将历史事件转化为线性的事件序列。你需要确保事件具有合理的时间顺序。"},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=LLM_CONFIG["temperature"],
-            max_tokens=LLM_CONFIG["max_tokens"],
-            stream=True  # 启用流式输出
-        )
+        # 相同的提示词和参数直接使用缓存的响应
+        cache_key = response_cache_key(messages, LLM_CONFIG["api_base"])
+        cached_response = llm_cache.get(cache_key) if use_cache else None
+        if cached_response is not None:
+            response_chunks.append(cached_response)
+            parser.feed(cached_response)
+            st.info("使用了缓存的生成结果")
         
-        # 逐步输出生成的内容
-        full_response = ""
-        output_placeholder = st.empty()  # 创建一个占位符
-        for chunk in response:
-            if chunk.choices[0].delta.content is not None:
-                chunk_message = chunk.choices[0].delta.content
-                full_response += chunk_message
-                output_placeholder.markdown(full_response)  # 更新占位符内容
+        try:
+            # 调用大模型API
+            response = [] if cached_response is not None else get_llm_client().chat.completions.create(
+                model=LLM_CONFIG["model"],
+                messages=messages,
+                temperature=LLM_CONFIG["temperature"],
+                max_tokens=LLM_CONFIG["max_tokens"],
+                stream=True  # 启用流式输出
+            )
+            for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content is not None:
+                    chunk_message = chunk.choices[0].delta.content
+                    response_chunks.append(chunk_message)
+                    completed = parser.feed(chunk_message)
+                    now = time.monotonic()
+                    if completed and now - last_render >= STREAM_RENDER_INTERVAL:
+                        render_generation_progress(output_placeholder, parser)
+                        last_render = now
+        except Exception as e:
+            # 流中断时保留已经解析出的事件
+            if not parser.events:
+                raise
+            st.warning(f"生成过程中断，已保留 {len(parser.events)} 个完整事件: {str(e)}")
+        render_generation_progress(output_placeholder, parser)
+        # 只缓存完整结束的响应
+        if cached_response is None and parser.finished:
+            llm_cache.put(cache_key, "".join(response_chunks))
         
-        full_response = full_response.strip('```json')
-        full_response = full_response.rstrip('```') 
-        # 解析生成的JSON
         print(f"--------------- full response ---------------")
-        print(full_response)
+        print("".join(response_chunks))
         print(f"--------------- full response ---------------")
-        generated_events = json.loads(full_response)
-        # 修复生成的事件数据
-        generated_events = fix_event_data(generated_events)
-        return generated_events
+        if not parser.events:
+            raise ValueError("大模型输出中没有解析到完整的事件")
+        if not parser.finished:
+            st.warning(f"大模型输出不完整，已使用解析出的 {len(parser.events)} 个事件")
+        generated_events = parser.result()
+        # 修复生成的事件数据，截断时去掉指向未生成事件的引用
+        generated_events = normalize_event_data(generated_events)
+        # 一次批量把所有事件地点解析为省份
+        return geocode_event_tree(generated_events)
     except Exception as e:
         traceback.print_exc()
         st.error(f"生成事件树时出错: {str(e)}")
         return None
 
-def fix_invalid_next_events(events_data):
-    """修复所有失效的next_event引用"""
-    if not events_data or "events" not in events_data:
-        return events_data
+def generate_events_from_long_text(text, use_cache=True):
+    """长文本分块后并发调用大模型生成事件，再合并为一棵事件树"""
+    try:
+        chunk_count = len(split_text(text))
+        output_placeholder = st.empty()
+        progress = {"events": 0, "last_render": 0.0}
         
-    valid_event_ids = set(events_data["events"].keys())
-    
-    # 遍历所有事件和选项
-    for event in events_data["events"].values():
-        for choice in event["choices"]:
-            # 如果next_event指向不存在的事件，将其设为None
-            if choice["next_event"] and choice["next_event"] not in valid_event_ids:
-                choice["next_event"] = None
-    
-    return events_data
+        def on_event(chunk_index, event_id, event):
+            progress["events"] += 1
+            now = time.monotonic()
+            if now - progress["last_render"] >= STREAM_RENDER_INTERVAL:
+                output_placeholder.markdown(
+                    f"共 {chunk_count} 个片段，最多 {LLM_CONFIG['max_concurrency']} 个并发请求，"
+                    f"已生成 {progress['events']} 个事件"
+                )
+                progress["last_render"] = now
+        
+        generated_events = asyncio.run(generate_events_chunked(text, on_event=on_event, use_cache=use_cache))
+        output_placeholder.markdown(f"共 {chunk_count} 个片段，合并后得到 {len(generated_events['events'])} 个事件")
+        return geocode_event_tree(normalize_event_data(generated_events))
+    except Exception as e:
+        traceback.print_exc()
+        st.error(f"生成事件树时出错: {str(e)}")
+        return None
 
 # 加载事件数据
 if 'events_data' not in st.session_state:
-    st.session_state.events_data = fix_event_data(load_events())
-    # 修复所有失效的next_event引用
-    st.session_state.events_data = fix_invalid_next_events(st.session_state.events_data)
-
-# 确保所有选项都有完整的consequences结构
-for event in st.session_state.events_data["events"].values():
-    for choice in event["choices"]:
-        if "consequences" not in choice:
-            choice["consequences"] = {
-                "military_power": 0,
-                "political_power": 0,
-                "economic_power": 0,
-                "territories": {}
-            }
-        else:
-            for key in ["military_power", "political_power", "economic_power"]:
-                if key not in choice["consequences"]:
-                    choice["consequences"][key] = 0
-            if "territories" not in choice["consequences"]:
-                choice["consequences"]["territories"] = {}
+    st.session_state.tree_id = DEFAULT_TREE_ID
+    # 补全缺失字段并修复所有失效的next_event引用
+    st.session_state.events_data = normalize_event_data(load_events(st.session_state.tree_id))
+
+# 检查事件树结构，只在内容变化后检查一次；检查前会先补全新选项缺失的consequences等字段
+with perf_trace.span("validate"):
+    validation_report = get_validation_report()
 
 # 页面标题
 st.title("民国史诗 - 事件编辑器")
 
+# 显示事件树检查结果
+with st.expander(
+    f"事件树检查：{validation_report['errors']} 个错误，{validation_report['warnings']} 个警告",
+    expanded=not validation_report["ok"]
+):
+    st.text(format_report(validation_report))
+
 # 添加事件树选择功能
 with st.expander("选择事件树", expanded=True):
-    # 获取events文件夹下的所有json文件
-    event_files = [f for f in os.listdir("events") if f.endswith(".json")]
+    # 从目录索引获取events文件夹下的所有事件树，只有变化过的文件才会重新解析
+    event_catalog = refresh_catalog("events")
+    event_files = list(event_catalog.keys())
     if event_files:
         selected_file = st.selectbox(
             "选择事件树文件",
             options=event_files,
-            format_func=lambda x: x.replace(".json", "")
+            format_func=lambda x: format_entry(x, event_catalog[x])
         )
         if st.button("加载选中的事件树"):
-            with open(os.path.join("events", selected_file), 'r', encoding='utf-8') as f:
-                st.session_state.events_data = fix_event_data(json.load(f))
-                # 修复所有失效的next_event引用
-                st.session_state.events_data = fix_invalid_next_events(st.session_state.events_data)
-            save_events(st.session_state.events_data)
+            # 补全缺失字段并修复所有失效的next_event引用
+            with perf_trace.span("tree_load"):
+                st.session_state.events_data = geocode_event_tree(
+                    normalize_event_data(load_event_data(os.path.join("events", selected_file)))
+                )
+            st.session_state.tree_id = os.path.splitext(selected_file)[0]
+            save_events(st.session_state.events_data, st.session_state.tree_id)
+            invalidate_validation()
             st.success(f"已加载事件树：{selected_file}")
             st.rerun()
     else:
         st.info("events文件夹下暂无事件树文件")
+    
+    # 导出当前编辑的事件树为JSON
+    st.download_button(
+        "导出当前事件树",
+        data=json.dumps(st.session_state.events_data, ensure_ascii=False, indent=4),
+        file_name=f"{st.session_state.tree_id}.json",
+        mime="application/json"
+    )
 
 # 添加自动生成事件树的输入框和按钮
 with st.expander("自动生成事件树", expanded=False):
     input_text = st.text_area("请输入历史事件描述：", height=200)
+    bypass_cache = st.checkbox("忽略缓存，重新生成", value=False)
     if st.button("生成事件树"):
         if input_text:
             with st.spinner("正在生成事件树..."):
-                generated_events = generate_events_from_text(input_text)
+                # 超过分块长度的文本分块并发生成
+                use_cache = LLM_CONFIG["use_cache"] and not bypass_cache
+                with perf_trace.span("llm_call"):
+                    if len(input_text) > LLM_CONFIG["chunk_size"]:
+                        generated_events = generate_events_from_long_text(input_text, use_cache)
+                    else:
+                        generated_events = generate_events_from_text(input_text, use_cache)
                 if generated_events:
                     # 保存到文件中
-                    output_file_path = os.path.join("events", generated_events["name"] + "_" + datetime.datetime.now().strftime("%Y%m%d_%H%M%S") + ".json")
+                    tree_id = generated_events["name"] + "_" + datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+                    output_file_path = os.path.join("events", tree_id + ".json")
                     with open(output_file_path, 'w', encoding='utf-8') as f:
                         json.dump(generated_events, f, ensure_ascii=False, indent=4)
                     st.session_state.events_data = generated_events
-                    save_events(st.session_state.events_data)
+                    st.session_state.tree_id = tree_id
+                    save_events(st.session_state.events_data, tree_id)
+                    invalidate_validation()
                     st.success("事件树生成成功！")
                     st.rerun()
         else:
@@ -330,28 +349,41 @@ with col1:
         new_event = create_new_event()
         new_id = f"new_event_{len(st.session_state.events_data['events'])}"
         st.session_state.events_data["events"][new_id] = new_event
-        save_events(st.session_state.events_data)
+        get_event_store().save_event(st.session_state.tree_id, new_id, new_event)
+        invalidate_search_index()
+        invalidate_validation()
         st.rerun()
     
+    # 搜索并分页显示事件，下拉框只列出当前页，事件很多时也不会变慢
+    search_index = get_search_index()
+    search_query = st.text_input("搜索事件", placeholder="事件ID、标题、描述或年份（例如 1937 或 1937-1945）")
+    matched_events = search_index.search(search_query)
+    page_count = max(1, (len(matched_events) + EVENT_PAGE_SIZE - 1) // EVENT_PAGE_SIZE)
+    page = st.number_input(f"页码（共 {page_count} 页，{len(matched_events)} 个事件）",
+                           min_value=1, max_value=page_count, value=1) if page_count > 1 else 1
+    page_events, _ = paginate(matched_events, page, EVENT_PAGE_SIZE)
+    
     # 选择要编辑的事件
     selected_event = st.selectbox(
         "选择事件",
-        options=list(st.session_state.events_data["events"].keys()),
-        format_func=lambda x: st.session_state.events_data["events"][x]["title"] or x,
+        options=with_current(page_events, st.session_state.get("event_selector")),
+        format_func=search_index.label,
         key="event_selector"
     )
     
-    # 设置初始事件
+    # 设置初始事件，可选项同样来自当前页的搜索结果
     st.subheader("初始事件设置")
+    initial_options = with_current(page_events, st.session_state.events_data["initial_event"])
     initial_event = st.selectbox(
         "选择初始事件",
-        options=list(st.session_state.events_data["events"].keys()),
-        format_func=lambda x: st.session_state.events_data["events"][x]["title"] or x,
-        index=list(st.session_state.events_data["events"].keys()).index(st.session_state.events_data["initial_event"]) if st.session_state.events_data["initial_event"] else 0
+        options=initial_options,
+        format_func=search_index.label,
+        index=initial_options.index(st.session_state.events_data["initial_event"]) if st.session_state.events_data["initial_event"] in initial_options else 0
     )
-    if initial_event != st.session_state.events_data["initial_event"]:
+    if initial_event and initial_event != st.session_state.events_data["initial_event"]:
         st.session_state.events_data["initial_event"] = initial_event
-        save_events(st.session_state.events_data)
+        get_event_store().set_initial_event(st.session_state.tree_id, initial_event)
+        invalidate_validation()
         st.rerun()
 
 # 中间列：事件编辑
@@ -379,12 +411,23 @@ with col2:
             help="例如：北京, 上海, 广州"
         )
         selected_locations = [loc.strip() for loc in location_input.replace("，", ",").split(",") if loc.strip()]
+        selected_provinces = resolve_locations(selected_locations)
+        if selected_locations:
+            st.caption("对应省份：" + ("、".join(selected_provinces) if selected_provinces else "无法识别"))
         
         with save_col:
             if st.button("保存事件", key="save_event_button"):
                 # 如果ID发生变化，需要重新创建事件
                 if new_id != event["id"] and new_id:
                     st.session_state.events_data["events"][new_id] = st.session_state.events_data["events"].pop(selected_event)
+                    get_event_store().rename_event(st.session_state.tree_id, selected_event, new_id)
+                    # 同步更新内存中指向该事件的引用
+                    for other in st.session_state.events_data["events"].values():
+                        for other_choice in other["choices"]:
+                            if other_choice["next_event"] == selected_event:
+                                other_choice["next_event"] = new_id
+                    if st.session_state.events_data["initial_event"] == selected_event:
+                        st.session_state.events_data["initial_event"] = new_id
                     selected_event = new_id
                 
                 event = st.session_state.events_data["events"][selected_event]
@@ -394,10 +437,13 @@ with col2:
                     "description": new_description,
                     "year": new_year,
                     "month": new_month,
-                    "location": selected_locations
+                    "location": selected_locations,
+                    "provinces": selected_provinces
                 })
                 
-                save_events(st.session_state.events_data)
+                get_event_store().save_event(st.session_state.tree_id, selected_event, event)
+                invalidate_search_index()
+                invalidate_validation()
                 st.success("事件已保存！")
                 st.rerun()
         
@@ -430,13 +476,13 @@ with col2:
                     value=choice["consequences"]["economic_power"]
                 )
             
-            # 后续事件
-            available_events = list(st.session_state.events_data["events"].keys())
+            # 后续事件，可选项来自事件列表当前页的搜索结果
+            next_options = ["无"] + with_current(page_events, choice["next_event"])
             choice["next_event"] = st.selectbox(
                 f"后续事件###{i}",
-                options=["无"] + available_events,
-                format_func=lambda x: "无" if x == "无" else st.session_state.events_data["events"][x]["title"] or x,
-                index=0 if not choice["next_event"] else available_events.index(choice["next_event"]) + 1
+                options=next_options,
+                format_func=lambda x: "无" if x == "无" else search_index.label(x),
+                index=next_options.index(choice["next_event"]) if choice["next_event"] in next_options else 0
             )
             if choice["next_event"] == "无":
                 choice["next_event"] = None
@@ -444,13 +490,15 @@ with col2:
             # 删除选项按钮
             if st.button(f"删除选项###{i}"):
                 event["choices"].pop(i)
-                save_events(st.session_state.events_data)
+                get_event_store().save_event(st.session_state.tree_id, selected_event, event)
+                invalidate_validation()
                 st.rerun()
         
         # 添加新选项按钮
         if st.button("添加新选项"):
             event["choices"].append(create_new_choice())
-            save_events(st.session_state.events_data)
+            get_event_store().save_event(st.session_state.tree_id, selected_event, event)
+            invalidate_validation()
             st.rerun()
         
         # 删除事件按钮
@@ -459,14 +507,19 @@ with col2:
             if st.session_state.events_data["initial_event"] == selected_event:
                 st.session_state.events_data["initial_event"] = None
             # 修复所有失效的next_event引用
-            st.session_state.events_data = fix_invalid_next_events(st.session_state.events_data)
-            save_events(st.session_state.events_data)
+            st.session_state.events_data = normalize_event_data(st.session_state.events_data)
+            get_event_store().delete_event(st.session_state.tree_id, selected_event)
+            invalidate_search_index()
+            invalidate_validation()
             st.rerun()
 
 # 右侧列：事件树可视化
 with col3:
     st.subheader("事件树可视化")
-    if st.session_state.events_data["events"]:
+    show_graph = st.toggle("显示事件树", value=not STARTUP_CONFIG["defer_graph"])
+    if not show_graph:
+        st.info("事件树可视化已折叠，打开后再加载。")
+    elif st.session_state.events_data["events"]:
         try:
             graph_svg = create_event_graph(st.session_state.events_data)
             if graph_svg:
@@ -493,3 +546,6 @@ with col3:
             st.error(f"生成事件树时出错: {str(e)}")
     else:
         st.info("暂无事件数据，请添加事件。")
+
+# 侧边栏性能面板（最后绘制，包含本次运行的全部阶段）
+render_perf_panel(perf_trace.end_run(), st.session_state.perf_stats)
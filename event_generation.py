@@ -0,0 +1,277 @@
+"""大模型生成事件树
+
+包含生成事件树的提示词，以及长文本的分块并发生成：把输入文本切成相互重叠的片段，
+用 asyncio 并发请求大模型（数量受 max_concurrency 限制），再把各片段的事件合并成
+一棵按时间排序、ID 和 next_event 连续的事件树。
+
+任何兼容 OpenAI 接口的服务都可以使用，本地调试可以配合 llm_stub_server.py：
+    python llm_stub_server.py --port 8001
+    python event_generation.py input.txt --base-url http://127.0.0.1:8001/v1
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+
+from config import LLM_CONFIG
+from stream_parser import EventStreamParser
+from llm_cache import llm_cache, response_cache_key
+
+SYSTEM_PROMPT = "你是一个历史事件分析专家，擅长将历史事件转化为线性的事件序列。你需要确保事件具有合理的时间顺序。"
+
+def build_generation_prompt(text):
+    """构建生成事件树的提示词"""
+    prompt = f"""
+        请根据以下历史事件描述，生成一个线性的事件列表。每个事件应该包含：
+        1. 事件ID（格式：event_X）
+        2. 事件标题
+        3. 发生年份和月份
+        4. 发生地点列表
+        4. 一个选项，包含：
+           - 选项文本
+           - 后续事件ID
+        
+        请以JSON格式输出，"name"为事件列表的名称，"events"为事件列表，"initial_event"为初始事件，格式如下：
+        {{
+            "name": "民国史诗",
+            "events": {{
+                "event_1": {{
+                    "id": "event_1",
+                    "title": "事件标题",
+                    "year": 1930,
+                    "month": 1,
+                    "location": ["beijing", "shanghai"],
+                    "choices": [
+                        {{
+                            "id": "choice_1",
+                            "text": "选项文本",
+                            "next_event": "event_2"
+                        }}
+                    ]
+                }},
+                "event_2": {{
+                    "id": "event_2",
+                    "title": "后续事件标题",
+                    "year": 1930,
+                    "month": 2,
+                    "choices": [
+                        {{
+                            "id": "choice_2",
+                            "text": "选项文本",
+                            "next_event": "event_3"
+                        }}
+                    ]
+                }},
+                "event_3": {{
+                    "id": "event_3",
+                    "title": "最终事件标题",
+                    "year": 1930,
+                    "month": 3,
+                    "choices": []
+                }}
+            }},
+            "initial_event": "event_1"
+        }}
+
+        注意事项：
+        1. 每个事件都应该有唯一的ID
+        2. 每个事件只有一个选项
+        3. 最后一个事件的choices应该为空数组
+        4. 事件之间应该形成合理的时间顺序
+        5. 事件的时间顺序要合理，后续事件的年月不能早于前导事件
+
+        历史事件描述：
+        {text}
+        """
+    return prompt
+
+# 句子结束符，分块时优先在这些位置断开
+_SENTENCE_END = re.compile(r"(?<=[。！？!?；;\n])")
+
+def split_text(text, chunk_size=None, overlap=None):
+    """按句子把文本切成不超过 chunk_size 字的片段，相邻片段重叠约 overlap 字"""
+    chunk_size = chunk_size or LLM_CONFIG.get("chunk_size", 3000)
+    overlap = LLM_CONFIG.get("chunk_overlap", 300) if overlap is None else overlap
+    text = text.strip()
+    if len(text) <= chunk_size:
+        return [text] if text else []
+
+    sentences = []
+    for sentence in _SENTENCE_END.split(text):
+        # 过长的句子直接按长度硬切
+        while len(sentence) > chunk_size:
+            sentences.append(sentence[:chunk_size])
+            sentence = sentence[chunk_size:]
+        if sentence:
+            sentences.append(sentence)
+
+    chunks = []
+    current = []
+    length = 0
+    for sentence in sentences:
+        if current and length + len(sentence) > chunk_size:
+            chunks.append("".join(current))
+            # 从上一块末尾取若干句作为重叠部分
+            tail, tail_length = [], 0
+            for previous in reversed(current):
+                if tail_length + len(previous) > overlap:
+                    break
+                tail.insert(0, previous)
+                tail_length += len(previous)
+            current, length = tail, tail_length
+        current.append(sentence)
+        length += len(sentence)
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+async def generate_chunk(client, chunk_text, index, semaphore, on_event=None, use_cache=True):
+    """生成一个片段的事件，返回 (片段序号, 事件树)；请求失败或被截断时返回已解析出的部分"""
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": build_generation_prompt(chunk_text)}
+    ]
+    parser = EventStreamParser()
+
+    # 命中缓存时不占用并发名额
+    cache_key = response_cache_key(messages, client.base_url)
+    cached_response = llm_cache.get(cache_key) if use_cache else None
+    if cached_response is not None:
+        for event_id, event in parser.feed(cached_response):
+            if on_event:
+                on_event(index, event_id, event)
+        return index, parser.result()
+
+    async with semaphore:
+        response_chunks = []
+        try:
+            response = await client.chat.completions.create(
+                model=LLM_CONFIG["model"],
+                messages=messages,
+                temperature=LLM_CONFIG["temperature"],
+                max_tokens=LLM_CONFIG["max_tokens"],
+                stream=True
+            )
+            async for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content is not None:
+                    response_chunks.append(chunk.choices[0].delta.content)
+                    for event_id, event in parser.feed(chunk.choices[0].delta.content):
+                        if on_event:
+                            on_event(index, event_id, event)
+        except Exception as e:
+            if not parser.events:
+                raise
+            print(f"片段 {index} 生成中断，保留 {len(parser.events)} 个事件: {e}")
+        # 只缓存完整结束的响应
+        if parser.finished:
+            llm_cache.put(cache_key, "".join(response_chunks))
+        return index, parser.result()
+
+def _dedupe_key(event):
+    title = re.sub(r"\s+", "", str(event.get("title", "")))
+    return event.get("year"), event.get("month"), title
+
+def merge_event_trees(trees):
+    """把按片段顺序排列的事件树合并为一棵线性事件树
+
+    重叠部分产生的重复事件（同年同月同标题）只保留一个；事件按时间排序，
+    同一时间保持片段内的先后顺序，最后重新编号并把 next_event 依次连接起来。
+    """
+    seen = set()
+    ordered = []
+    for chunk_index, tree in enumerate(trees):
+        for order, event in enumerate(tree.get("events", {}).values()):
+            key = _dedupe_key(event)
+            if key in seen:
+                continue
+            seen.add(key)
+            year = event.get("year") if isinstance(event.get("year"), int) else 0
+            month = event.get("month") if isinstance(event.get("month"), int) else 1
+            ordered.append(((year, month, chunk_index, order), event))
+    ordered.sort(key=lambda item: item[0])
+
+    events = {}
+    count = len(ordered)
+    for i, (_, event) in enumerate(ordered):
+        event_id = f"event_{i + 1}"
+        event = dict(event)
+        event["id"] = event_id
+        choices = [dict(choice) for choice in event.get("choices", [])[:1]]
+        if i + 1 < count:
+            if not choices:
+                choices = [{"text": "继续"}]
+            choices[0]["id"] = f"choice_{i + 1}"
+            choices[0]["next_event"] = f"event_{i + 2}"
+        else:
+            # 最后一个事件没有选项
+            choices = []
+        event["choices"] = choices
+        events[event_id] = event
+
+    name = next((tree.get("name") for tree in trees if tree.get("name")), "未命名事件树")
+    return {"name": name, "events": events, "initial_event": "event_1" if events else None}
+
+async def generate_events_chunked(text, api_base=None, api_key=None, max_concurrency=None,
+                                  chunk_size=None, overlap=None, on_event=None, use_cache=True):
+    """分块并发生成事件树"""
+    chunks = split_text(text, chunk_size, overlap)
+    max_concurrency = max_concurrency or LLM_CONFIG.get("max_concurrency", 4)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    from openai import AsyncOpenAI
+    client = AsyncOpenAI(
+        base_url=api_base or LLM_CONFIG["api_base"],
+        api_key=api_key or LLM_CONFIG["api_key"]
+    )
+    try:
+        results = await asyncio.gather(
+            *(generate_chunk(client, chunk, i, semaphore, on_event, use_cache) for i, chunk in enumerate(chunks)),
+            return_exceptions=True
+        )
+    finally:
+        await client.close()
+
+    trees = [None] * len(chunks)
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"片段生成失败: {result}")
+            continue
+        index, tree = result
+        trees[index] = tree
+    if not any(trees):
+        raise ValueError("所有片段都生成失败")
+    return merge_event_trees([tree for tree in trees if tree])
+
+def main():
+    parser = argparse.ArgumentParser(description="分块并发地根据长文本生成事件树")
+    parser.add_argument("input", help="历史事件描述文本文件")
+    parser.add_argument("-o", "--output", default=None, help="输出的事件树 JSON 文件")
+    parser.add_argument("--base-url", default=None, help="OpenAI 兼容接口地址，默认使用 LLM_CONFIG")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--concurrency", type=int, default=None, help="最大并发请求数")
+    parser.add_argument("--chunk-size", type=int, default=None, help="每个片段的最大字数")
+    parser.add_argument("--overlap", type=int, default=None, help="相邻片段重叠的字数")
+    parser.add_argument("--no-cache", action="store_true", help="忽略响应缓存，全部重新请求")
+    args = parser.parse_args()
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    started = time.perf_counter()
+    event_data = asyncio.run(generate_events_chunked(
+        text, args.base_url, args.api_key, args.concurrency, args.chunk_size, args.overlap,
+        use_cache=LLM_CONFIG["use_cache"] and not args.no_cache
+    ))
+    elapsed = time.perf_counter() - started
+    print(f"共 {len(split_text(text, args.chunk_size, args.overlap))} 个片段，"
+          f"生成 {len(event_data['events'])} 个事件，用时 {elapsed:.2f} 秒")
+
+    output = json.dumps(event_data, ensure_ascii=False, indent=4)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
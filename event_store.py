@@ -0,0 +1,453 @@
+"""基于 SQLite 的事件树存储
+
+事件树按 事件 / 选项 / 后果 三张表保存在 app.db 中，编辑器每次操作只写入受影响的行，
+不再整体重写 JSON 文件；游戏也可以直接从这里读取事件树。
+支持与 events/*.json 相同结构的导入和导出。
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from config import Config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS event_trees (
+    tree_id TEXT PRIMARY KEY,
+    name TEXT,
+    initial_event TEXT,
+    extra TEXT NOT NULL DEFAULT '{}',
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS events (
+    tree_id TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL DEFAULT '',
+    description TEXT NOT NULL DEFAULT '',
+    year INTEGER,
+    month INTEGER,
+    location TEXT NOT NULL DEFAULT '[]',
+    extra TEXT NOT NULL DEFAULT '{}',
+    PRIMARY KEY (tree_id, event_id)
+);
+CREATE INDEX IF NOT EXISTS idx_events_position ON events (tree_id, position);
+CREATE INDEX IF NOT EXISTS idx_events_time ON events (tree_id, year, month, position);
+CREATE TABLE IF NOT EXISTS choices (
+    tree_id TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    choice_id TEXT NOT NULL DEFAULT '',
+    text TEXT NOT NULL DEFAULT '',
+    next_event TEXT,
+    extra TEXT NOT NULL DEFAULT '{}',
+    PRIMARY KEY (tree_id, event_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_choices_next_event ON choices (tree_id, next_event);
+CREATE TABLE IF NOT EXISTS import_hashes (
+    content_hash TEXT PRIMARY KEY,
+    file_hash TEXT,
+    tree_id TEXT NOT NULL,
+    source TEXT,
+    imported_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_import_hashes_file ON import_hashes (file_hash);
+CREATE INDEX IF NOT EXISTS idx_import_hashes_tree ON import_hashes (tree_id);
+CREATE TABLE IF NOT EXISTS consequences (
+    tree_id TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    choice_position INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (tree_id, event_id, choice_position, key)
+);
+"""
+
+EVENT_FIELDS = ("title", "description", "year", "month", "location", "choices")
+CHOICE_FIELDS = ("id", "text", "consequences", "next_event")
+# 批量写入时复用同一个编码器，省去每次 json.dumps 创建编码器的开销
+_encode = json.JSONEncoder(ensure_ascii=False).encode
+
+def _timestamp():
+    """事件树的修改时间，精确到微秒，同一秒内的多次修改也能通过 tree_version 区分"""
+    return datetime.now().isoformat(timespec="microseconds")
+
+def default_db_path():
+    """从 Config 的数据库地址中取出 SQLite 文件路径"""
+    uri = Config.SQLALCHEMY_DATABASE_URI
+    if uri.startswith("sqlite:///"):
+        return uri[len("sqlite:///"):]
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.db")
+
+class EventStore:
+    """事件树存储，一个进程共用一个连接，写操作串行执行"""
+
+    def __init__(self, db_path=None, timeout=5.0):
+        self.db_path = db_path or default_db_path()
+        # timeout：其他进程持有写锁时的最长等待时间（批量导入时多个进程同时写入）
+        self._conn = sqlite3.connect(self.db_path, timeout=timeout, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    # ---- 写入 ----
+
+    def _touch(self, tree_id):
+        self._conn.execute(
+            "UPDATE event_trees SET updated_at = ? WHERE tree_id = ?",
+            (_timestamp(), tree_id)
+        )
+
+    def _write_event(self, tree_id, event_id, event, position):
+        extra = {key: value for key, value in event.items() if key not in EVENT_FIELDS}
+        self._conn.execute(
+            "INSERT OR REPLACE INTO events "
+            "(tree_id, event_id, position, title, description, year, month, location, extra) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (tree_id, event_id, position, event.get("title") or "", event.get("description") or "",
+             event.get("year"), event.get("month"),
+             json.dumps(event.get("location", []), ensure_ascii=False),
+             json.dumps(extra, ensure_ascii=False))
+        )
+        self._conn.execute("DELETE FROM choices WHERE tree_id = ? AND event_id = ?", (tree_id, event_id))
+        self._conn.execute("DELETE FROM consequences WHERE tree_id = ? AND event_id = ?", (tree_id, event_id))
+        for i, choice in enumerate(event.get("choices", [])):
+            choice_extra = {key: value for key, value in choice.items() if key not in CHOICE_FIELDS}
+            self._conn.execute(
+                "INSERT INTO choices (tree_id, event_id, position, choice_id, text, next_event, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (tree_id, event_id, i, choice.get("id") or "", choice.get("text") or "",
+                 choice.get("next_event"), json.dumps(choice_extra, ensure_ascii=False))
+            )
+            self._conn.executemany(
+                "INSERT INTO consequences (tree_id, event_id, choice_position, key, value) VALUES (?, ?, ?, ?, ?)",
+                [(tree_id, event_id, i, key, json.dumps(value, ensure_ascii=False))
+                 for key, value in choice.get("consequences", {}).items()]
+            )
+
+    def import_tree(self, tree_id, event_data):
+        """把 JSON 结构的事件树整体导入（覆盖同名事件树），在一个事务中完成"""
+        extra = {key: value for key, value in event_data.items()
+                 if key not in ("name", "initial_event", "events", "time_index")}
+        with self._lock, self._conn:
+            self._delete_tree_rows(tree_id)
+            self._conn.execute(
+                "INSERT INTO event_trees (tree_id, name, initial_event, extra, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (tree_id, event_data.get("name"), event_data.get("initial_event"),
+                 json.dumps(extra, ensure_ascii=False), _timestamp())
+            )
+            for position, (event_id, event) in enumerate(event_data.get("events", {}).items()):
+                self._write_event(tree_id, event_id, event, position)
+
+    # ---- 批量导入（见 bulk_import.py） ----
+
+    def begin_import(self, staging_id):
+        """为分批导入创建一个临时事件树，导入完成前游戏和编辑器看不到它"""
+        with self._lock, self._conn:
+            self._delete_tree_rows(staging_id)
+            self._conn.execute(
+                "INSERT INTO event_trees (tree_id, name, initial_event, updated_at) VALUES (?, NULL, NULL, ?)",
+                (staging_id, _timestamp())
+            )
+
+    def append_events(self, tree_id, events, start_position):
+        """在一个事务中批量写入一批事件 {事件ID: 事件}，位置从 start_position 开始；
+        同一事件ID再次出现时覆盖内容、保留原来的位置（与 json.load 得到的字典一致）"""
+        event_rows, choice_rows, consequence_rows = [], [], []
+        for position, (event_id, event) in enumerate(events.items(), start_position):
+            extra = {key: value for key, value in event.items() if key not in EVENT_FIELDS}
+            event_rows.append((
+                tree_id, event_id, position, event.get("title") or "", event.get("description") or "",
+                event.get("year"), event.get("month"),
+                _encode(event.get("location", [])),
+                _encode(extra)
+            ))
+            for i, choice in enumerate(event.get("choices", [])):
+                choice_extra = {key: value for key, value in choice.items() if key not in CHOICE_FIELDS}
+                choice_rows.append((
+                    tree_id, event_id, i, choice.get("id") or "", choice.get("text") or "",
+                    choice.get("next_event"), _encode(choice_extra)
+                ))
+                consequence_rows.extend(
+                    (tree_id, event_id, i, key, _encode(value))
+                    for key, value in choice.get("consequences", {}).items()
+                )
+        event_ids = list(events)
+        with self._lock, self._conn:
+            for table in ("choices", "consequences"):
+                self._conn.execute(
+                    f"DELETE FROM {table} WHERE tree_id = ? AND event_id IN ({','.join('?' * len(event_ids))})",
+                    [tree_id] + event_ids
+                )
+            self._conn.executemany(
+                "INSERT INTO events "
+                "(tree_id, event_id, position, title, description, year, month, location, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (tree_id, event_id) DO UPDATE SET title = excluded.title, "
+                "description = excluded.description, year = excluded.year, month = excluded.month, "
+                "location = excluded.location, extra = excluded.extra",
+                event_rows
+            )
+            self._conn.executemany(
+                "INSERT INTO choices (tree_id, event_id, position, choice_id, text, next_event, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                choice_rows
+            )
+            self._conn.executemany(
+                "INSERT INTO consequences (tree_id, event_id, choice_position, key, value) VALUES (?, ?, ?, ?, ?)",
+                consequence_rows
+            )
+
+    def find_import(self, file_hash):
+        """按文件内容的哈希查找已经导入过的事件树ID，没有时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT tree_id FROM import_hashes WHERE file_hash = ?", (file_hash,)
+            ).fetchone()
+        return row["tree_id"] if row else None
+
+    def finish_import(self, staging_id, tree_id, meta, content_hash, file_hash=None, source=None):
+        """完成分批导入：内容已导入过时丢弃临时事件树并返回已有的事件树ID；
+        否则去掉失效的next_event，用临时事件树替换 tree_id（覆盖同名事件树），返回None"""
+        extra = {key: value for key, value in meta.items()
+                 if key not in ("name", "initial_event", "events", "time_index")}
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT tree_id FROM import_hashes WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+            if row is not None:
+                self._delete_tree_rows(staging_id)
+                return row["tree_id"]
+            self._conn.execute(
+                "UPDATE choices SET next_event = NULL WHERE tree_id = ? AND next_event IS NOT NULL "
+                "AND next_event NOT IN (SELECT event_id FROM events WHERE tree_id = ?)",
+                (staging_id, staging_id)
+            )
+            self._conn.execute(
+                "UPDATE event_trees SET name = ?, initial_event = ?, extra = ? WHERE tree_id = ?",
+                (meta.get("name"), meta.get("initial_event"), json.dumps(extra, ensure_ascii=False), staging_id)
+            )
+            self._delete_tree_rows(tree_id)
+            for table in ("event_trees", "events", "choices", "consequences"):
+                self._conn.execute(f"UPDATE {table} SET tree_id = ? WHERE tree_id = ?", (tree_id, staging_id))
+            self._conn.execute(
+                "INSERT INTO import_hashes (content_hash, file_hash, tree_id, source, imported_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (content_hash, file_hash, tree_id, source, datetime.now().isoformat(timespec="seconds"))
+            )
+            self._touch(tree_id)
+        return None
+
+    def abort_import(self, staging_id):
+        """导入失败时删除临时事件树"""
+        with self._lock, self._conn:
+            self._delete_tree_rows(staging_id)
+
+    def delete_trees_with_prefix(self, prefix):
+        """删除ID以 prefix 开头的事件树（清理中断的导入留下的临时事件树），返回删除的数量"""
+        with self._lock, self._conn:
+            tree_ids = [row["tree_id"] for row in self._conn.execute(
+                "SELECT tree_id FROM event_trees WHERE substr(tree_id, 1, ?) = ?", (len(prefix), prefix)
+            )]
+            for tree_id in tree_ids:
+                self._delete_tree_rows(tree_id)
+        return len(tree_ids)
+
+    def ensure_tree(self, tree_id, name=None):
+        """事件树不存在时创建一个空的事件树"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO event_trees (tree_id, name, initial_event, updated_at) VALUES (?, ?, NULL, ?)",
+                (tree_id, name, _timestamp())
+            )
+
+    def save_event(self, tree_id, event_id, event):
+        """写入单个事件及其选项，已有事件保持原来的位置，新事件追加到最后"""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT position FROM events WHERE tree_id = ? AND event_id = ?", (tree_id, event_id)
+            ).fetchone()
+            if row:
+                position = row["position"]
+            else:
+                position = self._conn.execute(
+                    "SELECT COALESCE(MAX(position) + 1, 0) FROM events WHERE tree_id = ?", (tree_id,)
+                ).fetchone()[0]
+            self._write_event(tree_id, event_id, event, position)
+            self._touch(tree_id)
+
+    def rename_event(self, tree_id, old_id, new_id):
+        """修改事件ID，同时更新指向该事件的 next_event 和初始事件"""
+        with self._lock, self._conn:
+            # 与编辑器行为一致：新ID已存在时直接覆盖
+            for table in ("events", "choices", "consequences"):
+                self._conn.execute(f"DELETE FROM {table} WHERE tree_id = ? AND event_id = ?", (tree_id, new_id))
+            for table in ("events", "choices", "consequences"):
+                self._conn.execute(
+                    f"UPDATE {table} SET event_id = ? WHERE tree_id = ? AND event_id = ?", (new_id, tree_id, old_id)
+                )
+            self._conn.execute(
+                "UPDATE choices SET next_event = ? WHERE tree_id = ? AND next_event = ?", (new_id, tree_id, old_id)
+            )
+            self._conn.execute(
+                "UPDATE event_trees SET initial_event = ? WHERE tree_id = ? AND initial_event = ?",
+                (new_id, tree_id, old_id)
+            )
+            self._touch(tree_id)
+
+    def delete_event(self, tree_id, event_id):
+        """删除事件，并把指向它的 next_event 置空"""
+        with self._lock, self._conn:
+            for table in ("events", "choices", "consequences"):
+                self._conn.execute(f"DELETE FROM {table} WHERE tree_id = ? AND event_id = ?", (tree_id, event_id))
+            self._conn.execute(
+                "UPDATE choices SET next_event = NULL WHERE tree_id = ? AND next_event = ?", (tree_id, event_id)
+            )
+            self._conn.execute(
+                "UPDATE event_trees SET initial_event = NULL WHERE tree_id = ? AND initial_event = ?",
+                (tree_id, event_id)
+            )
+            self._touch(tree_id)
+
+    def set_initial_event(self, tree_id, event_id):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE event_trees SET initial_event = ? WHERE tree_id = ?", (event_id, tree_id))
+            self._touch(tree_id)
+
+    def _delete_tree_rows(self, tree_id):
+        for table in ("event_trees", "events", "choices", "consequences", "import_hashes"):
+            self._conn.execute(f"DELETE FROM {table} WHERE tree_id = ?", (tree_id,))
+
+    def delete_tree(self, tree_id):
+        with self._lock, self._conn:
+            self._delete_tree_rows(tree_id)
+
+    # ---- 读取 ----
+
+    def list_trees(self):
+        """列出所有事件树及其事件数"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT t.tree_id, t.name, t.initial_event, t.updated_at, "
+                "(SELECT COUNT(*) FROM events e WHERE e.tree_id = t.tree_id) AS event_count "
+                "FROM event_trees t ORDER BY t.tree_id"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def tree_version(self, tree_id):
+        """事件树的修改时间，每次修改都会变化，用于判断缓存的事件树是否过期；不存在时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT updated_at FROM event_trees WHERE tree_id = ?", (tree_id,)
+            ).fetchone()
+        return None if row is None else (row["updated_at"] or "")
+
+    def has_tree(self, tree_id):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM event_trees WHERE tree_id = ?", (tree_id,)
+            ).fetchone() is not None
+
+    def _choices_for(self, tree_id, event_ids=None):
+        """读取选项和后果，返回 event_id -> 选项列表"""
+        condition, params = "tree_id = ?", [tree_id]
+        if event_ids is not None:
+            condition += f" AND event_id IN ({','.join('?' * len(event_ids))})"
+            params += list(event_ids)
+        consequences = {}
+        for row in self._conn.execute(
+            f"SELECT event_id, choice_position, key, value FROM consequences WHERE {condition} "
+            "ORDER BY rowid", params
+        ):
+            consequences.setdefault((row["event_id"], row["choice_position"]), {})[row["key"]] = json.loads(row["value"])
+        choices = {}
+        for row in self._conn.execute(
+            f"SELECT event_id, position, choice_id, text, next_event, extra FROM choices WHERE {condition} "
+            "ORDER BY event_id, position", params
+        ):
+            choice = {
+                "id": row["choice_id"],
+                "text": row["text"],
+                "consequences": consequences.get((row["event_id"], row["position"]), {}),
+                "next_event": row["next_event"],
+            }
+            choice.update(json.loads(row["extra"]))
+            choices.setdefault(row["event_id"], []).append(choice)
+        return choices
+
+    def _event_from_row(self, row, choices):
+        extra = json.loads(row["extra"])
+        event = {
+            "id": extra.pop("id", row["event_id"]),
+            "title": row["title"],
+            "description": row["description"],
+            "year": row["year"],
+            "month": row["month"],
+            "location": json.loads(row["location"]),
+            "choices": choices,
+        }
+        event.update(extra)
+        return event
+
+    def get_event(self, tree_id, event_id):
+        """读取单个事件，不存在时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM events WHERE tree_id = ? AND event_id = ?", (tree_id, event_id)
+            ).fetchone()
+            if row is None:
+                return None
+            choices = self._choices_for(tree_id, [event_id]).get(event_id, [])
+        return self._event_from_row(row, choices)
+
+    def find_next_event_by_time(self, tree_id, year, month):
+        """利用时间索引查找晚于 (year, month) 的最近事件"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT event_id FROM events WHERE tree_id = ? AND (year * 12 + month) > ? "
+                "ORDER BY year, month, position LIMIT 1",
+                (tree_id, year * 12 + month)
+            ).fetchone()
+        return row["event_id"] if row else None
+
+    def export_tree(self, tree_id):
+        """导出为与 events/*.json 相同结构的字典，事件树不存在时返回None"""
+        with self._lock:
+            tree = self._conn.execute("SELECT * FROM event_trees WHERE tree_id = ?", (tree_id,)).fetchone()
+            if tree is None:
+                return None
+            choices = self._choices_for(tree_id)
+            rows = self._conn.execute(
+                "SELECT * FROM events WHERE tree_id = ? ORDER BY position", (tree_id,)
+            ).fetchall()
+        event_data = {}
+        if tree["name"] is not None:
+            event_data["name"] = tree["name"]
+        event_data["events"] = {
+            row["event_id"]: self._event_from_row(row, choices.get(row["event_id"], [])) for row in rows
+        }
+        event_data["initial_event"] = tree["initial_event"]
+        event_data.update(json.loads(tree["extra"]))
+        return event_data
+
+    def export_tree_to_file(self, tree_id, file_path):
+        """导出为 JSON 文件"""
+        event_data = self.export_tree(tree_id)
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(event_data, f, ensure_ascii=False, indent=4)
+        return event_data
+
+    def import_tree_from_file(self, file_path, tree_id=None):
+        """从 JSON 文件导入，默认以文件名作为事件树ID"""
+        tree_id = tree_id or os.path.splitext(os.path.basename(file_path))[0]
+        with open(file_path, "r", encoding="utf-8") as f:
+            event_data = json.load(f)
+        self.import_tree(tree_id, event_data)
+        return tree_id
@@ -0,0 +1,368 @@
+"""事件树检查与规范化
+
+normalize_event_data 一次遍历补全缺失字段（description、choices、location、consequences），
+并把指向不存在事件的 next_event 设为 None，取代原来编辑器里的 fix_event_data 和
+fix_invalid_next_events。
+
+validate_event_data 在线性时间内检查整棵事件树，返回结构化报告：
+- 错误：缺少或无效的初始事件、缺少必需字段、失效的 next_event、重复的ID；
+- 警告：从初始事件无法到达的事件、环、无法到达任何结局的事件（死路）、沿选项时间倒退。
+没有 next_event 的选项按游戏规则（game_engine.find_next_event_by_time）连到时间上最近的后续事件。
+
+用法：
+    python event_validator.py                 # 并行检查 events/ 下的所有事件树
+    python event_validator.py events/a.json --json report.json
+"""
+import argparse
+import bisect
+import gc
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+from compiled_tree import is_compiled, load_event_data
+
+STAT_KEYS = ["military_power", "political_power", "economic_power"]
+REQUIRED_FIELDS = ["title", "year", "month"]
+ERROR_KEYS = ["missing_initial_event", "missing_fields", "dangling_next_events", "duplicate_ids"]
+WARNING_KEYS = ["unreachable", "cycles", "dead_ends", "time_reversals"]
+MAX_CACHED_REPORTS = 32
+
+@contextmanager
+def _gc_paused():
+    """大事件树有数百万个容器对象，检查过程中产生的临时对象会频繁触发分代回收，
+    每次都要扫描整棵树；这里不会产生循环引用，暂停垃圾回收即可"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def normalize_event(event_id, event):
+    """补全单个事件缺失的字段（就地修改），不检查next_event；流式导入时逐个事件调用"""
+    event.setdefault("id", event_id)
+    event.setdefault("description", "")
+    event.setdefault("choices", [])
+    event.setdefault("location", [])
+    for choice in event["choices"]:
+        consequences = choice.setdefault("consequences", {})
+        for key in STAT_KEYS:
+            consequences.setdefault(key, 0)
+        consequences.setdefault("territories", {})
+        if not choice.get("next_event"):
+            choice["next_event"] = None
+    return event
+
+def normalize_event_data(events_data):
+    """补全缺失字段并去掉失效的next_event引用（就地修改），返回事件树"""
+    if not events_data or "events" not in events_data:
+        return events_data
+
+    events = events_data["events"]
+    with _gc_paused():
+        for event_id, event in events.items():
+            normalize_event(event_id, event)
+            for choice in event["choices"]:
+                # 如果next_event指向不存在的事件，将其设为None
+                if choice["next_event"] is not None and choice["next_event"] not in events:
+                    choice["next_event"] = None
+
+    return events_data
+
+def _month_key(event):
+    year, month = event.get("year"), event.get("month")
+    if isinstance(year, int) and isinstance(month, int):
+        return year * 12 + month
+    return None
+
+def _strongly_connected(candidates, successors):
+    """迭代版 Tarjan 算法，只在 candidates 中的节点上求强连通分量，节点用序号表示"""
+    count = len(successors)
+    index_of = [-1] * count
+    low = [0] * count
+    on_stack = bytearray(count)
+    stack = []
+    components = []
+    counter = 0
+    for root in candidates:
+        if index_of[root] >= 0:
+            continue
+        index_of[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = 1
+        work = [(root, 0)]
+        while work:
+            node, position = work[-1]
+            children = successors[node]
+            if position < len(children):
+                work[-1] = (node, position + 1)
+                child = children[position]
+                if index_of[child] < 0:
+                    index_of[child] = low[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack[child] = 1
+                    work.append((child, 0))
+                elif on_stack[child] and index_of[child] < low[node]:
+                    low[node] = index_of[child]
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                if low[node] < low[parent]:
+                    low[parent] = low[node]
+            if low[node] == index_of[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = 0
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+    return components
+
+def validate_event_data(events_data, duplicate_keys=None):
+    """检查事件树，返回报告字典；duplicate_keys 为读取JSON时发现的重复键"""
+    with _gc_paused():
+        return _validate(events_data, duplicate_keys)
+
+def _validate(events_data, duplicate_keys):
+    events = events_data.get("events") or {}
+    initial_event = events_data.get("initial_event")
+    report = {key: [] for key in ERROR_KEYS + WARNING_KEYS}
+    # 空事件树不算错误
+    report["missing_initial_event"] = bool(events) and initial_event not in events
+    report["duplicate_ids"] = list(duplicate_keys or [])
+
+    # 图算法在事件序号上进行，避免大量字符串哈希
+    ids = list(events)
+    index_of = {event_id: index for index, event_id in enumerate(ids)}
+    count = len(ids)
+
+    # 时间索引：没有next_event的选项跳到时间上晚于当前事件的最近事件
+    month_keys = [None] * count
+    timed = []
+    for index, event in enumerate(events.values()):
+        key = _month_key(event)
+        month_keys[index] = key
+        if key is None:
+            missing = [field for field in REQUIRED_FIELDS if field not in event] or ["year/month"]
+            report["missing_fields"].append({"event": ids[index], "fields": missing})
+        else:
+            timed.append((key, index))
+            if "title" not in event:
+                report["missing_fields"].append({"event": ids[index], "fields": ["title"]})
+    timed.sort()
+    time_keys = [key for key, _ in timed]
+    time_order = [index for _, index in timed]
+
+    successors = [None] * count
+    terminal = bytearray(count)
+    seen_inner_ids = {}
+    choice_count = 0
+    for index, event in enumerate(events.values()):
+        event_id = ids[index]
+        inner_id = event.get("id", event_id)
+        if inner_id in seen_inner_ids:
+            report["duplicate_ids"].append({"id": inner_id, "events": [seen_inner_ids[inner_id], event_id]})
+        else:
+            seen_inner_ids[inner_id] = event_id
+
+        choices = event.get("choices") or ()
+        choice_count += len(choices)
+        source_key = month_keys[index]
+        targets = []
+        time_next = False
+        choice_ids = set()
+        for choice in choices:
+            choice_id = choice.get("id")
+            if choice_id is not None:
+                if choice_id in choice_ids:
+                    report["duplicate_ids"].append({"id": choice_id, "event": event_id, "kind": "choice"})
+                choice_ids.add(choice_id)
+            next_event = choice.get("next_event")
+            if not next_event:
+                time_next = True
+                continue
+            target = index_of.get(next_event)
+            if target is None:
+                report["dangling_next_events"].append(
+                    {"event": event_id, "choice": choice_id, "next_event": next_event}
+                )
+                # 游戏跳到不存在的事件后结束
+                terminal[index] = 1
+                continue
+            targets.append(target)
+            target_key = month_keys[target]
+            if source_key is not None and target_key is not None and target_key < source_key:
+                report["time_reversals"].append({"event": event_id, "choice": choice_id, "next_event": next_event})
+
+        if time_next:
+            position = bisect.bisect_right(time_keys, source_key) if source_key is not None else count
+            if position < len(time_keys):
+                targets.append(time_order[position])
+            else:
+                # 没有后续事件，游戏在这里结束
+                terminal[index] = 1
+        if not choices:
+            terminal[index] = 1
+        successors[index] = targets
+
+    # 从初始事件出发的可达性
+    reachable = bytearray(count)
+    if initial_event in index_of:
+        queue = [index_of[initial_event]]
+        reachable[queue[0]] = 1
+        for node in queue:
+            for child in successors[node]:
+                if not reachable[child]:
+                    reachable[child] = 1
+                    queue.append(child)
+    report["unreachable"] = [ids[index] for index in range(count) if not reachable[index]]
+
+    # 反向遍历，找出能到达结局的事件；同时统计入度供拓扑排序使用
+    predecessors = [[] for _ in range(count)]
+    in_degree = [0] * count
+    for node, targets in enumerate(successors):
+        for child in targets:
+            predecessors[child].append(node)
+            in_degree[child] += 1
+    can_finish = bytearray(terminal)
+    queue = [index for index in range(count) if terminal[index]]
+    for node in queue:
+        for parent in predecessors[node]:
+            if not can_finish[parent]:
+                can_finish[parent] = 1
+                queue.append(parent)
+    report["dead_ends"] = [ids[index] for index in range(count) if reachable[index] and not can_finish[index]]
+
+    # 先用拓扑排序去掉不在环上的事件，只对剩下的少数事件求强连通分量
+    queue = [index for index in range(count) if not in_degree[index]]
+    for node in queue:
+        for child in successors[node]:
+            in_degree[child] -= 1
+            if not in_degree[child]:
+                queue.append(child)
+    candidates = [index for index in range(count) if in_degree[index]]
+    for component in _strongly_connected(candidates, successors):
+        if len(component) > 1 or component[0] in successors[component[0]]:
+            report["cycles"].append([ids[index] for index in reversed(component)])
+
+    report["event_count"] = count
+    report["choice_count"] = choice_count
+    report["endings"] = sum(terminal)
+    report["errors"] = sum(len(report[key]) if isinstance(report[key], list) else int(report[key]) for key in ERROR_KEYS)
+    report["warnings"] = sum(len(report[key]) for key in WARNING_KEYS)
+    report["ok"] = report["errors"] == 0
+    return report
+
+# 调用方给出的版本键 -> 报告，多个会话共享，Streamlit 的多个脚本线程会同时读写
+_report_cache = OrderedDict()
+_report_cache_lock = threading.Lock()
+
+def check_event_data(events_data, cache_key=None):
+    """规范化并检查事件树
+
+    不会为了查缓存而序列化整棵事件树：cache_key 由调用方提供（例如事件树ID和事件存储中的修改时间），
+    内容变化时调用方换一个键；不提供时每次都重新检查。
+    """
+    if cache_key is not None:
+        with _report_cache_lock:
+            report = _report_cache.get(cache_key)
+            if report is not None:
+                _report_cache.move_to_end(cache_key)
+                return report
+    normalize_event_data(events_data)
+    report = validate_event_data(events_data)
+    if cache_key is not None:
+        with _report_cache_lock:
+            _report_cache[cache_key] = report
+            while len(_report_cache) > MAX_CACHED_REPORTS:
+                _report_cache.popitem(last=False)
+    return report
+
+def load_for_validation(file_path):
+    """读取事件树，JSON 文件同时记录 events 中被覆盖的重复事件ID"""
+    if is_compiled(file_path):
+        return load_event_data(file_path), []
+    duplicates = []
+
+    def collect_pairs(pairs):
+        result = {}
+        for key, value in pairs:
+            if key in result and isinstance(value, dict) and "choices" in value:
+                duplicates.append({"id": key, "kind": "json_key"})
+            result[key] = value
+        return result
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        event_data = json.load(f, object_pairs_hook=collect_pairs)
+    return event_data, duplicates
+
+def validate_file(file_path):
+    """检查一个事件树文件，返回 (文件路径, 报告, 耗时秒数)"""
+    started = time.perf_counter()
+    try:
+        event_data, duplicates = load_for_validation(file_path)
+        report = validate_event_data(event_data, duplicates)
+    except Exception as e:
+        report = {"ok": False, "errors": 1, "warnings": 0, "load_error": str(e)}
+    return file_path, report, time.perf_counter() - started
+
+def format_report(report, limit=10):
+    """把报告转换为便于阅读的多行文本"""
+    if "load_error" in report:
+        return f"  读取失败: {report['load_error']}"
+    lines = [f"  {report['event_count']} 个事件，{report['choice_count']} 个选项，{report['endings']} 个结局；"
+             f"{report['errors']} 个错误，{report['warnings']} 个警告"]
+    labels = {
+        "missing_fields": "缺少字段", "dangling_next_events": "失效的next_event", "duplicate_ids": "重复ID",
+        "unreachable": "无法到达", "cycles": "环", "dead_ends": "死路", "time_reversals": "时间倒退",
+    }
+    if report["missing_initial_event"]:
+        lines.append("  错误: 初始事件不存在")
+    for key, label in labels.items():
+        items = report[key]
+        if items:
+            shown = ", ".join(json.dumps(item, ensure_ascii=False) for item in items[:limit])
+            more = f" ……共 {len(items)} 项" if len(items) > limit else ""
+            lines.append(f"  {label}: {shown}{more}")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="检查事件树的结构问题")
+    parser.add_argument("files", nargs="*", help="事件树文件，默认检查 events/ 下的所有文件")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数，默认等于CPU核数")
+    parser.add_argument("--json", default=None, help="把完整报告写入JSON文件")
+    args = parser.parse_args()
+
+    files = args.files or sorted(
+        os.path.join("events", name) for name in os.listdir("events")
+        if name.endswith(".json") or is_compiled(name)
+    )
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(validate_file, files))
+
+    failed = False
+    for file_path, report, seconds in results:
+        status = "通过" if report["ok"] else "失败"
+        print(f"{file_path}: {status}（{seconds * 1000:.1f} ms）")
+        print(format_report(report))
+        failed = failed or not report["ok"]
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({file_path: report for file_path, report, _ in results}, f, ensure_ascii=False, indent=4)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""游戏的 JSON 接口
+
+基于 game_engine 的无状态 HTTP 接口：玩家会话保存在会话存储（session_store.py，默认是 app.db）中，
+每个请求读取会话、调用规则引擎处理、再按版本号写回，工作进程之间不共享内存，
+同一个玩家的请求可以由任意一个进程处理（见 main.py 的多进程启动方式）。
+
+每个进程把会话引用的事件树加载到自己的注册表（tree_registry.py）中，按文件的修改时间和大小
+（事件存储中的事件树按修改时间）判断是否需要重新加载，之后的请求直接使用内存中的只读事件树。
+
+接口（都在 /api 下）：
+    GET  /api/health                      进程状态
+    GET  /api/trees                       可用的事件树（events 目录中的文件和事件存储中的事件树）
+    GET  /api/map/provinces               省份名称，顺序与地图颜色数组一致，只需要获取一次
+    POST /api/sessions                    创建会话，可以同时加载事件树：{"tree": {"file": "events.json"}}
+    GET  /api/sessions/<id>               会话状态和当前事件
+    POST /api/sessions/<id>/tree          加载事件树并重新开始：{"file": 文件名} 或 {"store": 事件树ID}
+    GET  /api/sessions/<id>/event         当前事件
+    POST /api/sessions/<id>/choice        做出选择：{"index": 序号} 或 {"choice_id": 选项ID}，可带 "version"
+    GET  /api/sessions/<id>/map           各省份颜色，?format=binary 时返回每个省份4个字节（RGBA）的数组
+"""
+import json
+import os
+import threading
+from functools import lru_cache
+
+from flask import Blueprint, Flask, Response, current_app, jsonify, request
+
+import game_engine as engine
+from config import Config
+from event_catalog import EVENTS_DIR, refresh_catalog
+from event_store import EventStore
+from map_data import boundary_file, compute_province_colors, territories_hash
+from session_store import SessionConflict, create_session_store
+from tree_registry import registry
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+api = Blueprint("api", __name__, url_prefix="/api")
+
+class TreeResolver:
+    """把会话中的事件树来源解析为本进程注册表中的事件树ID
+
+    来源是 {'file': events 目录中的文件名} 或 {'store': 事件存储中的事件树ID}。
+    每个来源在本进程中只持有一个引用，来源变化（文件被修改、事件树被编辑）后加载新版本并释放旧版本。
+    """
+
+    def __init__(self, events_dir, db_path=None):
+        self.events_dir = events_dir
+        self.db_path = db_path
+        self._store = None
+        self._trees = {}  # 来源 -> (版本, 注册表中的事件树ID)
+        self._lock = threading.Lock()
+
+    def store(self):
+        # 只有用到事件存储中的事件树时才打开数据库
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = EventStore(self.db_path)
+        return self._store
+
+    def file_path(self, file_name):
+        """events 目录中的事件树文件路径，不允许访问目录以外的文件，不存在时抛出 LookupError"""
+        if not isinstance(file_name, str) or os.path.basename(file_name) != file_name or file_name.startswith("."):
+            raise LookupError(f"无效的事件树文件名: {file_name}")
+        path = os.path.join(self.events_dir, file_name)
+        if not os.path.isfile(path):
+            raise LookupError(f"事件树文件不存在: {file_name}")
+        return path
+
+    def resolve(self, source):
+        """返回事件树ID，来源无效或事件树不存在时抛出 LookupError"""
+        if not isinstance(source, dict):
+            raise LookupError("没有加载事件树")
+        if "file" in source:
+            path = self.file_path(source["file"])
+            stat = os.stat(path)
+            key, version = ("file", source["file"]), (stat.st_mtime_ns, stat.st_size)
+            load = lambda: engine.acquire_event_tree(path)
+        elif "store" in source:
+            tree_id = source["store"]
+            if not isinstance(tree_id, str):
+                raise LookupError(f"无效的事件树ID: {tree_id}")
+            store = self.store()
+            key, version = ("store", tree_id), store.tree_version(tree_id)
+            if version is None:
+                raise LookupError(f"事件树不存在: {tree_id}")
+            load = lambda: engine.acquire_event_tree_from_store(store, tree_id)
+        else:
+            raise LookupError("没有加载事件树")
+
+        cached = self._trees.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        # 加载可能很慢，不在锁内进行；多个线程同时加载时只保留一份引用
+        shared_id = load()
+        if shared_id is None:
+            raise LookupError(f"事件树不存在: {source}")
+        with self._lock:
+            old = self._trees.get(key)
+            if old is not None and old[0] == version:
+                registry.release(shared_id)
+                return old[1]
+            self._trees[key] = (version, shared_id)
+        if old is not None:
+            registry.release(old[1])
+        return shared_id
+
+    def list_trees(self):
+        files = [
+            {"file": file_name, "name": info.get("name"), "event_count": info.get("event_count"),
+             "year_span": info.get("year_span"), "error": info.get("error")}
+            for file_name, info in refresh_catalog(self.events_dir).items()
+        ]
+        return {"files": files, "store": self.store().list_trees()}
+
+@lru_cache(maxsize=None)
+def province_names():
+    """地图中的省份名称，直接读取边界文件的属性，不需要加载 geopandas"""
+    path = boundary_file()
+    if not os.path.isabs(path):
+        path = os.path.join(BASE_DIR, path)
+    with open(path, "r", encoding="utf-8") as f:
+        features = json.load(f)["features"]
+    return tuple(feature["properties"]["name"] for feature in features)
+
+@lru_cache(maxsize=256)
+def _color_bytes(territories):
+    """territories 是 ((势力, (省份, ...)), ...)，同样的势力范围只计算一次"""
+    import numpy as np
+    names = np.array(province_names(), dtype=object)
+    return compute_province_colors(names, dict(territories)).tobytes()
+
+def _error(status, message):
+    response = jsonify({"error": message})
+    response.status_code = status
+    return response
+
+def _sessions():
+    return current_app.extensions["game_api"]["sessions"]
+
+def _trees():
+    return current_app.extensions["game_api"]["trees"]
+
+def _event_view(event_id, event):
+    if event is None:
+        return None
+    return {
+        "id": event_id,
+        "title": event.get("title", ""),
+        "description": event.get("description", ""),
+        "year": event.get("year"),
+        "month": event.get("month"),
+        "location": list(event.get("location") or []),
+        "provinces": list(event.get("provinces") or []),
+        "choices": [
+            {"index": i, "id": choice.get("id"), "text": choice.get("text", "")}
+            for i, choice in enumerate(event.get("choices") or [])
+        ],
+    }
+
+def _restore(data):
+    """由会话内容重建游戏状态，没有加载事件树时 tree_id 为None"""
+    tree_id = _trees().resolve(data["source"]) if data.get("source") else None
+    return engine.restore_state(data["state"], tree_id)
+
+def _session_view(session_id, version, data, game_state):
+    event = engine.get_current_event(game_state)
+    year, month = engine.get_current_time(game_state)
+    return {
+        "session_id": session_id,
+        "version": version,
+        "source": data.get("source"),
+        "steps": len(data.get("history", [])),
+        "time": {"year": year, "month": month} if year is not None else None,
+        "stats": {key: game_state[key] for key in engine.STAT_KEYS},
+        "controlled_territories": {
+            faction: list(territories) for faction, territories in game_state["controlled_territories"].items()
+        },
+        "finished": not event or not event.get("choices"),
+        "event": _event_view(game_state["current_event_id"], event),
+    }
+
+def _load_session(session_id):
+    """返回 (会话内容, 版本号, 游戏状态)；会话不存在或事件树无法加载时抛出 LookupError"""
+    loaded = _sessions().load(session_id)
+    if loaded is None:
+        raise LookupError(f"会话不存在: {session_id}")
+    data, version = loaded
+    return data, version, _restore(data)
+
+def _new_game(source):
+    """在 source 指定的事件树上开始新游戏，返回会话内容"""
+    game_state = engine.new_game_state()
+    if source is not None:
+        engine.start_event_tree(game_state, _trees().resolve(source))
+    return {"source": source, "state": engine.export_state(game_state), "history": []}
+
+def _tree_source(payload):
+    if not isinstance(payload, dict):
+        return None
+    if "file" in payload:
+        return {"file": payload["file"]}
+    if "store" in payload:
+        return {"store": payload["store"]}
+    return None
+
+@api.errorhandler(LookupError)
+def _not_found(error):
+    return _error(404, str(error.args[0]) if error.args else "not found")
+
+@api.errorhandler(SessionConflict)
+def _conflict(error):
+    return _error(409, "会话已被其他请求修改，请重新获取状态")
+
+@api.after_request
+def _add_worker_header(response):
+    # 便于确认请求由哪个工作进程处理（见 load_test.py）
+    response.headers["X-Worker-Pid"] = str(os.getpid())
+    return response
+
+@api.get("/health")
+def health():
+    return jsonify({"status": "ok", "pid": os.getpid(), "trees": len(registry.stats())})
+
+@api.get("/trees")
+def list_trees():
+    return jsonify(_trees().list_trees())
+
+@api.get("/map/provinces")
+def map_provinces():
+    names = province_names()
+    response = jsonify({"provinces": list(names)})
+    response.headers["Cache-Control"] = "public, max-age=3600"
+    return response
+
+@api.post("/sessions")
+def create_session():
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict):
+        return _error(400, '请求体应为 {"tree": {"file": 文件名} 或 {"store": 事件树ID}}')
+    data = _new_game(_tree_source(payload.get("tree")))
+    session_id, version = _sessions().create(data)
+    response = jsonify(_session_view(session_id, version, data, _restore(data)))
+    response.status_code = 201
+    return response
+
+@api.get("/sessions/<session_id>")
+def get_session(session_id):
+    data, version, game_state = _load_session(session_id)
+    return jsonify(_session_view(session_id, version, data, game_state))
+
+@api.post("/sessions/<session_id>/tree")
+def load_tree(session_id):
+    source = _tree_source(request.get_json(silent=True))
+    if source is None:
+        return _error(400, '请求体应为 {"file": 文件名} 或 {"store": 事件树ID}')
+    loaded = _sessions().load(session_id)
+    if loaded is None:
+        raise LookupError(f"会话不存在: {session_id}")
+    data = _new_game(source)
+    version = _sessions().save(session_id, data, loaded[1])
+    return jsonify(_session_view(session_id, version, data, _restore(data)))
+
+@api.get("/sessions/<session_id>/event")
+def get_event(session_id):
+    _, _, game_state = _load_session(session_id)
+    return jsonify(_event_view(game_state["current_event_id"], engine.get_current_event(game_state)))
+
+@api.post("/sessions/<session_id>/choice")
+def make_choice(session_id):
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict):
+        return _error(400, '请求体应为 {"index": 选项序号} 或 {"choice_id": 选项ID}')
+    data, version, game_state = _load_session(session_id)
+    # 客户端带上它看到的版本号时，状态已经变化的选择直接拒绝，不会作用到另一个事件上
+    if payload.get("version") is not None and payload["version"] != version:
+        raise SessionConflict(session_id)
+
+    event = engine.get_current_event(game_state)
+    choices = (event or {}).get("choices") or []
+    if "choice_id" in payload:
+        index = next((i for i, choice in enumerate(choices) if choice.get("id") == payload["choice_id"]), None)
+    else:
+        index = payload.get("index")
+    if not isinstance(index, int) or isinstance(index, bool) or not 0 <= index < len(choices):
+        return _error(400, "无效的选项")
+
+    new_state = engine.process_choice(game_state, choices[index])
+    data["history"].append([game_state["current_event_id"], index])
+    data["state"] = engine.export_state(new_state)
+    version = _sessions().save(session_id, data, version)
+    return jsonify(_session_view(session_id, version, data, new_state))
+
+@api.get("/sessions/<session_id>/map")
+def get_map(session_id):
+    loaded = _sessions().load(session_id)
+    if loaded is None:
+        raise LookupError(f"会话不存在: {session_id}")
+    territories = loaded[0]["state"]["controlled_territories"]
+    # 势力范围的哈希作为 ETag，没有变化时返回 304
+    colors_key = territories_hash(territories)
+    if colors_key in request.if_none_match:
+        return Response(status=304, headers={"ETag": f'"{colors_key}"'})
+
+    colors = _color_bytes(tuple((faction, tuple(provinces)) for faction, provinces in territories.items()))
+    if request.args.get("format") == "binary":
+        response = Response(colors, mimetype="application/octet-stream")
+    else:
+        response = jsonify({
+            "colors_key": colors_key,
+            "colors": [list(colors[i:i + 4]) for i in range(0, len(colors), 4)],
+        })
+    response.set_etag(colors_key)
+    return response
+
+def create_app(config=None, session_store=None):
+    """创建 Flask 应用；config 覆盖 Config 中的配置，session_store 默认按 SESSION_STORE_URL 创建"""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update(config or {})
+    app.json.ensure_ascii = False
+    app.extensions["game_api"] = {
+        "sessions": session_store or create_session_store(app.config.get("SESSION_STORE_URL")),
+        "trees": TreeResolver(app.config.get("EVENTS_DIR") or os.path.join(BASE_DIR, EVENTS_DIR)),
+    }
+    app.register_blueprint(api)
+    return app
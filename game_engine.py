@@ -0,0 +1,203 @@
+"""游戏规则引擎
+
+不依赖 Streamlit 的游戏规则实现，所有函数都作用在普通的 game_state 字典上，
+app.py 把 st.session_state.game_state 传进来使用，批量模拟（batch_runner.py）直接调用。
+事件树放在进程内共享的只读注册表（tree_registry.py）中，game_state 里只保存事件树ID。
+开始游戏后 game_state 视为不可变：process_choice 返回新的状态，未变化的部分（例如势力范围）
+与旧状态共享，旧状态可以直接保存在历史记录（game_history.py）中用于回退。
+"""
+import os
+import json
+import bisect
+import hashlib
+
+from compiled_tree import is_compiled, open_event_tree
+from tree_registry import registry
+
+# 初始势力范围
+INITIAL_TERRITORIES = {
+    'central_government': ['江苏', '浙江', '安徽', '江西', '湖北', '湖南', '四川'],
+    'communist': ['江西', '福建'],
+    'japanese': []
+}
+
+# 可以被选项后果直接累加的属性
+STAT_KEYS = ['military_power', 'political_power', 'economic_power']
+
+def new_game_state():
+    """创建初始游戏状态，各势力的领土用元组保存，可以在多个状态之间共享"""
+    return {
+        'military_power': 100,
+        'political_power': 100,
+        'economic_power': 100,
+        'controlled_territories': {
+            faction: tuple(territories) for faction, territories in INITIAL_TERRITORIES.items()
+        },
+        'tree_id': None,  # 共享事件树的ID
+        'current_event_id': None  # 当前事件ID
+    }
+
+def build_time_index(events):
+    """按时间排序事件，返回 (月份键列表, 事件ID列表)，同月事件保持文件中的先后顺序"""
+    ordered = sorted(
+        ((event['year'] * 12 + event['month'], order, event_id)
+         for order, (event_id, event) in enumerate(events.items())),
+    )
+    return [key for key, _, _ in ordered], [event_id for _, _, event_id in ordered]
+
+def find_next_event_by_time(event_data, year, month):
+    """二分查找时间上晚于 (year, month) 的最近事件"""
+    if 'time_index' not in event_data:
+        event_data['time_index'] = build_time_index(event_data['events'])
+    keys, event_ids = event_data['time_index']
+    position = bisect.bisect_right(keys, year * 12 + month)
+    if position < len(keys):
+        return event_ids[position]
+    return None
+
+def read_event_tree(file_path):
+    """读取事件树文件并建立时间索引，出错时抛出异常"""
+    # 编译后的事件树按需读取节点，自带时间索引
+    if is_compiled(file_path):
+        return open_event_tree(file_path)
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        event_data = json.load(f)
+
+    # 预先建立时间索引，供没有next_event的选项查找后续事件
+    if 'events' in event_data:
+        event_data['time_index'] = build_time_index(event_data['events'])
+
+    return event_data
+
+def acquire_event_tree(file_path):
+    """把事件树文件加载到共享注册表中并增加一个引用，返回事件树ID
+
+    ID 包含文件的修改时间和大小，文件变化后会作为新的事件树加载。
+    """
+    stat = os.stat(file_path)
+    tree_id = f"file:{os.path.abspath(file_path)}:{stat.st_mtime_ns}:{stat.st_size}"
+    return registry.acquire(tree_id, lambda: read_event_tree(file_path))
+
+def acquire_event_tree_from_store(store, tree_id):
+    """把事件存储中的事件树加载到共享注册表中并增加一个引用，不存在时返回None
+
+    数据库中的事件树随时可能被编辑器修改，按内容哈希作为ID，内容相同的会话共享同一份。
+    """
+    event_data = store.export_tree(tree_id)
+    if event_data is None:
+        return None
+    payload = json.dumps(event_data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    shared_id = f"store:{tree_id}:{hashlib.sha1(payload.encode('utf-8')).hexdigest()}"
+
+    def loader():
+        event_data['time_index'] = build_time_index(event_data['events'])
+        return event_data
+
+    return registry.acquire(shared_id, loader)
+
+def get_event_tree(game_state):
+    """获取游戏状态引用的只读事件树，没有时返回None"""
+    if not game_state.get('tree_id'):
+        return None
+    return registry.get(game_state['tree_id'])
+
+def start_event_tree(game_state, tree_id):
+    """让游戏状态引用共享事件树，并根据initial_event设置当前事件"""
+    event_data = registry.get(tree_id)
+    if event_data is not None and 'initial_event' in event_data and 'events' in event_data:
+        game_state['current_event_id'] = event_data['initial_event']
+    game_state['tree_id'] = tree_id
+    return game_state
+
+def get_current_event(game_state):
+    """获取当前事件的原始数据"""
+    event_data = get_event_tree(game_state)
+    if not game_state['current_event_id'] or event_data is None:
+        return None
+    return event_data['events'].get(game_state['current_event_id'])
+
+def get_current_time(game_state):
+    """获取当前时间"""
+    current_event = get_current_event(game_state)
+    if not current_event:
+        return None, None
+
+    return current_event['year'], current_event['month']
+
+def get_current_events(game_state):
+    """获取当前时间点的事件"""
+    current_event = get_current_event(game_state)
+    if not current_event:
+        return []
+
+    return [{
+        'title': current_event['title'],
+        'description': current_event.get('description', ''),
+        'location': current_event.get('location', []),
+        'provinces': current_event.get('provinces', []),
+        'choices': current_event.get('choices', [])
+    }]
+
+def apply_consequences(game_state, consequences):
+    """把选项后果累加到游戏状态上，返回新的状态，不修改原状态
+
+    只复制顶层字典；领土只有发生变化的势力会生成新的元组，其余势力与原状态共享。
+    """
+    new_state = dict(game_state)
+    for key, value in consequences.items():
+        if key == 'territories':
+            # 处理领土变化，没有新增领土的势力不复制
+            changed = {faction: territories for faction, territories in value.items() if territories}
+            if changed:
+                controlled = dict(new_state['controlled_territories'])
+                for faction, territories in changed.items():
+                    controlled[faction] = tuple(controlled.get(faction, ())) + tuple(territories)
+                new_state['controlled_territories'] = controlled
+        elif key in new_state:
+            new_state[key] += value
+    return new_state
+
+def process_choice(game_state, choice):
+    """处理玩家的选择，返回新的游戏状态，原状态保持不变"""
+    # 没有next_event时按选择前的时间查找后续事件
+    current_year, current_month = get_current_time(game_state)
+    new_state = apply_consequences(game_state, choice.get('consequences', {}))
+
+    # 如果选项中有next_event，直接跳转到该事件
+    if choice.get('next_event'):
+        new_state['current_event_id'] = choice['next_event']
+    else:
+        # 如果没有下一个事件，查找下一个最近的事件
+        event_data = get_event_tree(game_state)
+        if current_year is None or event_data is None:
+            new_state['current_event_id'] = None
+        else:
+            new_state['current_event_id'] = find_next_event_by_time(
+                event_data, current_year, current_month
+            )
+
+    return new_state
+
+def export_state(game_state):
+    """把游戏状态转换为可以 JSON 序列化的字典（不含事件树ID），用于保存到会话存储"""
+    return {
+        **{key: game_state[key] for key in STAT_KEYS},
+        'controlled_territories': {
+            faction: list(territories) for faction, territories in game_state['controlled_territories'].items()
+        },
+        'current_event_id': game_state['current_event_id'],
+    }
+
+def restore_state(data, tree_id):
+    """由 export_state 的结果和本进程注册表中的事件树ID重建游戏状态"""
+    game_state = new_game_state()
+    for key in STAT_KEYS:
+        game_state[key] = data.get(key, game_state[key])
+    if data.get('controlled_territories') is not None:
+        game_state['controlled_territories'] = {
+            faction: tuple(territories) for faction, territories in data['controlled_territories'].items()
+        }
+    game_state['tree_id'] = tree_id
+    game_state['current_event_id'] = data.get('current_event_id')
+    return game_state
@@ -0,0 +1,58 @@
+"""游戏状态历史记录
+
+每一步选择都会产生一个新的不可变 game_state（见 game_engine.process_choice），
+这里把它们保存为一棵树：每个节点只记录自己的状态、父节点和做出的选择。
+状态之间共享未变化的部分，所以每一步只占用实际发生变化的内存。
+回退只是移动当前节点的位置（常数时间），回退后再做选择会产生新的分支，原来的分支仍然保留。
+"""
+
+class GameHistory:
+    """游戏状态树，nodes 中的每个节点为 {'state', 'parent', 'label', 'depth', 'choice'}
+
+    choice 是到达该节点的选择 (事件ID, 选项序号)，起点为None，存档时记录（见 save_games.py）。
+    """
+
+    def __init__(self, initial_state, label="开始"):
+        self.nodes = [{'state': initial_state, 'parent': None, 'label': label, 'depth': 0, 'choice': None}]
+        self.current = 0
+
+    @property
+    def state(self):
+        """当前节点的游戏状态"""
+        return self.nodes[self.current]['state']
+
+    def push(self, state, label, choice=None):
+        """在当前节点下添加新状态并移动到该节点，返回节点序号"""
+        parent = self.nodes[self.current]
+        self.nodes.append({
+            'state': state, 'parent': self.current, 'label': label, 'depth': parent['depth'] + 1, 'choice': choice
+        })
+        self.current = len(self.nodes) - 1
+        return self.current
+
+    def rewind(self, index):
+        """回到任意一个已有节点，之后的选择会形成新的分支"""
+        if not 0 <= index < len(self.nodes):
+            raise IndexError(f"历史记录中没有第 {index} 个节点")
+        self.current = index
+        return self.state
+
+    def undo(self):
+        """回到上一步，已经在起点时不做任何事"""
+        parent = self.nodes[self.current]['parent']
+        if parent is not None:
+            self.current = parent
+        return self.state
+
+    def path(self, index=None):
+        """从起点到指定节点（默认当前节点）经过的节点序号"""
+        index = self.current if index is None else index
+        result = []
+        while index is not None:
+            result.append(index)
+            index = self.nodes[index]['parent']
+        return result[::-1]
+
+    def children(self, index):
+        """指定节点下的所有分支"""
+        return [i for i, node in enumerate(self.nodes) if node['parent'] == index]
@@ -0,0 +1,183 @@
+"""地名索引：把事件地点解析为省份
+
+以 china_provinces.geojson 中每个省份的名称和 cp（中心点）为基础，加上别名表（简称、旧称、
+拼音、主要城市），把大模型生成的任意地名解析为省份；坐标（经度, 纬度）通过省份多边形的
+空间索引（shapely STRtree）查找所在省份。
+
+resolve_many 一次解析一批地点：先去重，地名用别名字典和一个预编译的正则（最长别名优先）匹配，
+坐标用空间索引批量查询。解析结果按地名缓存，导入或生成新的事件树时可以很快完成地理编码。
+"""
+import json
+import os
+import re
+from functools import lru_cache
+
+from map_lod import SOURCE_FILE
+
+# 省份别名：简称、旧称（民国时期的省名、城市名）、拼音，以及主要城市
+ALIASES = {
+    '北京': ['京', '北平', '北京城', 'beijing', 'beiping', 'peking', 'peiping'],
+    '天津': ['津', '天津卫', 'tianjin', 'tientsin'],
+    '上海': ['沪', '申', '上海滩', 'shanghai', '淞沪', '吴淞'],
+    '重庆': ['渝', '陪都', 'chongqing', 'chungking'],
+    '河北': ['冀', '直隶', '察哈尔', '热河', '保定', '石家庄', '张家口', '承德', '唐山', '卢沟桥', 'hebei', 'chahar', 'jehol'],
+    '山西': ['晋', '太原', '大同', '平型关', '忻口', 'shanxi', 'taiyuan'],
+    '内蒙古': ['蒙', '绥远', '归绥', '呼和浩特', '包头', '百灵庙', 'inner mongolia', 'suiyuan'],
+    '辽宁': ['辽', '奉天', '沈阳', '盛京', '大连', '旅顺', '锦州', '柳条湖', '北大营', 'liaoning', 'fengtian', 'mukden', 'shenyang', 'dalian'],
+    '吉林': ['吉', '长春', '新京', '东北', '满洲', '伪满', 'jilin', 'changchun', 'manchuria', 'manchukuo'],
+    '黑龙江': ['黑', '哈尔滨', '齐齐哈尔', '江桥', 'heilongjiang', 'harbin'],
+    '江苏': ['苏', '南京', '金陵', '首都', '苏州', '无锡', '徐州', '台儿庄', '镇江', '扬州', 'jiangsu', 'nanjing', 'nanking', 'xuzhou'],
+    '浙江': ['浙', '杭州', '宁波', '温州', '奉化', '溪口', 'zhejiang', 'hangzhou'],
+    '安徽': ['皖', '合肥', '安庆', '芜湖', '蚌埠', 'anhui'],
+    '福建': ['闽', '福州', '厦门', '古田', 'fujian', 'fuzhou', 'xiamen'],
+    '江西': ['赣', '南昌', '瑞金', '井冈山', '庐山', 'jiangxi', 'nanchang', 'ruijin'],
+    '山东': ['鲁', '济南', '青岛', '胶州湾', '威海', '烟台', 'shandong', 'jinan', 'qingdao', 'tsingtao'],
+    '河南': ['豫', '郑州', '开封', '洛阳', '花园口', 'henan', 'zhengzhou'],
+    '湖北': ['鄂', '武汉', '汉口', '武昌', '汉阳', '宜昌', 'hubei', 'wuhan', 'hankou'],
+    '湖南': ['湘', '长沙', '衡阳', '常德', '湘潭', 'hunan', 'changsha'],
+    '广东': ['粤', '广州', '汕头', '黄埔', '韶关', 'guangdong', 'guangzhou', 'canton'],
+    '广西': ['桂', '桂林', '南宁', '柳州', 'guangxi', 'guilin', 'nanning'],
+    '海南': ['琼', '海口', '琼崖', 'hainan'],
+    '四川': ['川', '蜀', '成都', '西康', '泸定', 'sichuan', 'chengdu', 'xikang'],
+    '贵州': ['黔', '贵阳', '遵义', 'guizhou', 'zunyi'],
+    '云南': ['滇', '昆明', '腾冲', '滇缅', 'yunnan', 'kunming'],
+    '西藏': ['藏', '拉萨', 'tibet', 'lhasa', 'xizang'],
+    '陕西': ['陕', '秦', '西安', '长安', '延安', '陕北', '临潼', 'shaanxi', "xi'an", 'xian', 'yanan'],
+    '甘肃': ['甘', '陇', '兰州', 'gansu', 'lanzhou'],
+    '青海': ['青', '西宁', 'qinghai', 'xining'],
+    '宁夏': ['宁', '银川', 'ningxia', 'yinchuan'],
+    '新疆': ['新', '迪化', '乌鲁木齐', 'xinjiang', 'urumqi'],
+    '台湾': ['台', '台北', '台湾岛', 'taiwan', 'taipei', 'formosa'],
+    '香港': ['港', 'hong kong', 'hongkong'],
+    '澳门': ['澳', 'macau', 'macao'],
+}
+
+# 相对于本模块所在目录，从其他目录运行命令行工具时也能找到
+DEFAULT_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), SOURCE_FILE)
+
+# 只有一个字的简称太容易误匹配，只用于完全相等的查询，不参与在长文本中的查找
+_MIN_SEARCH_ALIAS_LENGTH = 2
+_SUFFIXES = re.compile(r"(特别行政区|维吾尔自治区|壮族自治区|回族自治区|自治区|省|市)$")
+_COORDINATE = re.compile(r"^\s*\(?\s*(-?\d+(?:\.\d+)?)\s*[,，\s]\s*(-?\d+(?:\.\d+)?)\s*\)?\s*$")
+
+class Gazetteer:
+    """省份地名索引和多边形空间索引"""
+
+    def __init__(self, geojson_path=DEFAULT_SOURCE):
+        with open(geojson_path, 'r', encoding='utf-8') as f:
+            features = json.load(f)['features']
+        self.provinces = [feature['properties']['name'] for feature in features]
+        self.centers = {
+            feature['properties']['name']: feature['properties'].get('cp') for feature in features
+        }
+
+        # 名称和别名统一转为小写后查找
+        self.names = {}
+        for province in self.provinces:
+            self.names[province.lower()] = province
+            for alias in ALIASES.get(province, []):
+                self.names.setdefault(alias.lower(), province)
+        searchable = sorted(
+            (name for name in self.names if len(name) >= _MIN_SEARCH_ALIAS_LENGTH),
+            key=len, reverse=True
+        )
+        self._pattern = re.compile("|".join(re.escape(name) for name in searchable))
+
+        # shapely 只在解析坐标时用到，建立空间索引时才导入
+        self._features = features
+        self._tree = None
+        self._geometries = None
+
+    def _spatial_index(self):
+        if self._tree is None:
+            from shapely.geometry import shape
+            from shapely.strtree import STRtree
+            self._geometries = [shape(feature['geometry']) for feature in self._features]
+            self._tree = STRtree(self._geometries)
+        return self._tree
+
+    def resolve_name(self, place):
+        """把地名解析为省份名称，无法识别时返回None"""
+        key = _SUFFIXES.sub("", place.strip().lower()) or place.strip().lower()
+        province = self.names.get(key) or self.names.get(place.strip().lower())
+        if province:
+            return province
+        # 在较长的描述中查找已知地名，例如"南京城外"
+        match = self._pattern.search(place.lower())
+        return self.names[match.group(0)] if match else None
+
+    def resolve_points(self, points):
+        """批量查找坐标 [(经度, 纬度)] 所在的省份，不在任何省份内的返回None"""
+        if not points:
+            return []
+        from shapely import points as make_points
+        tree = self._spatial_index()
+        input_index, tree_index = tree.query(make_points(points), predicate='within')
+        result = [None] * len(points)
+        for point_position, province_position in zip(input_index, tree_index):
+            if result[point_position] is None:
+                result[point_position] = self.provinces[province_position]
+        return result
+
+    def resolve_many(self, places):
+        """批量解析地点（地名、"经度,纬度"字符串或 (经度, 纬度)），返回与输入等长的省份列表"""
+        unique = {}
+        for place in places:
+            unique.setdefault(_place_key(place), None)
+
+        points = []
+        for key in unique:
+            if isinstance(key, tuple):
+                points.append(key)
+            else:
+                unique[key] = _resolve_cached(self, key)
+        for point, province in zip(points, self.resolve_points(points)):
+            unique[point] = province
+        return [unique[_place_key(place)] for place in places]
+
+    def center(self, province):
+        """省份中心点 [经度, 纬度]"""
+        return self.centers.get(province)
+
+def _place_key(place):
+    """地名保持为字符串，坐标统一转为 (经度, 纬度) 元组"""
+    if isinstance(place, (list, tuple)) and len(place) == 2:
+        return float(place[0]), float(place[1])
+    text = str(place)
+    match = _COORDINATE.match(text)
+    if match:
+        return float(match.group(1)), float(match.group(2))
+    return text
+
+@lru_cache(maxsize=65536)
+def _resolve_cached(gazetteer, name):
+    return gazetteer.resolve_name(name)
+
+@lru_cache(maxsize=None)
+def get_gazetteer(geojson_path=DEFAULT_SOURCE):
+    """整个进程共用一个地名索引"""
+    return Gazetteer(geojson_path)
+
+def resolve_locations(locations):
+    """把一个事件的地点列表解析为去重后的省份列表，保持原有顺序"""
+    provinces = []
+    for province in get_gazetteer().resolve_many(locations):
+        if province and province not in provinces:
+            provinces.append(province)
+    return provinces
+
+def geocode_event_tree(events_data):
+    """为事件树中每个事件增加 provinces 字段（就地修改），所有地点一次批量解析，返回事件树"""
+    if not events_data or "events" not in events_data:
+        return events_data
+    events = list(events_data["events"].values())
+    all_locations = [location for event in events for location in event.get("location") or []]
+    resolved = iter(get_gazetteer().resolve_many(all_locations))
+    for event in events:
+        provinces = []
+        for _ in event.get("location") or []:
+            province = next(resolved)
+            if province and province not in provinces:
+                provinces.append(province)
+        event["provinces"] = provinces
+    return events_data
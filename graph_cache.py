@@ -0,0 +1,68 @@
+"""事件关系图的生成和 SVG 缓存
+
+dot 布局很慢，而大多数编辑（例如修改事件描述）不会改变图的结构。这里按图结构和节点/边标签
+计算哈希作为缓存键，把生成的 SVG 同时缓存在内存和磁盘上，超过容量时淘汰最久未使用的条目。
+生成函数不依赖 Streamlit，编辑器和性能测试（benchmark.py）共用。
+"""
+import hashlib
+import json
+import os
+
+from disk_cache import TextCache
+
+CACHE_DIR = os.path.join(".cache", "graphs")
+MAX_MEMORY_BYTES = 32 * 1024 * 1024  # 内存缓存上限
+MAX_DISK_BYTES = 256 * 1024 * 1024  # 磁盘缓存上限
+
+def graph_signature(events_data):
+    """只根据会影响布局和显示的内容（节点、标签、初始事件、边）计算哈希"""
+    initial_event = events_data.get('initial_event')
+    nodes = []
+    edges = []
+    for event_id, event in events_data['events'].items():
+        nodes.append([event_id, event['title'], event['year'], event['month'], event_id == initial_event])
+        for option in event['choices']:
+            if option['next_event']:
+                edges.append([event_id, option['next_event'], option['text']])
+    payload = json.dumps([nodes, edges], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+# 整个进程共用的缓存
+svg_cache = TextCache(CACHE_DIR, ".svg", MAX_MEMORY_BYTES, MAX_DISK_BYTES)
+
+def build_event_graph(events_data):
+    """根据事件树创建 graphviz 图（还没有布局）"""
+    # graphviz 只在需要重新布局时导入
+    import graphviz
+    dot = graphviz.Digraph(comment='事件树')
+    dot.attr(rankdir='TB')  # 从上到下布局
+    dot.attr('node', shape='box', style='rounded')
+
+    # 添加所有事件节点
+    for event_id, event in events_data['events'].items():
+        # 设置节点样式
+        if event_id == events_data['initial_event']:
+            dot.node(event_id, f"{event['title']}\n({event['year']}年{event['month']}月)",
+                     style='filled', fillcolor='lightblue')
+        else:
+            dot.node(event_id, f"{event['title']}\n({event['year']}年{event['month']}月)")
+
+    # 添加事件之间的连接
+    for event_id, event in events_data['events'].items():
+        for option in event['choices']:
+            if option['next_event']:
+                dot.edge(event_id, option['next_event'], label=option['text'])
+    return dot
+
+def render_event_graph(events_data, use_cache=True):
+    """生成事件关系图的 SVG，图结构和标签不变时直接使用缓存"""
+    cache_key = graph_signature(events_data)
+    if use_cache:
+        cached_svg = svg_cache.get(cache_key)
+        if cached_svg is not None:
+            return cached_svg
+
+    # 使用二进制模式获取输出
+    svg_data = build_event_graph(events_data).pipe(format='svg').decode('utf-8', errors='replace')
+    svg_cache.put(cache_key, svg_data)
+    return svg_data
@@ -0,0 +1,33 @@
+"""大模型响应缓存
+
+按接口地址、提示词（完整的 messages）、模型、temperature 和 max_tokens 计算哈希作为缓存键，
+不同的后端（例如本地的 llm_stub_server.py）的响应互不混用，
+把完整的响应文本保存在 .cache/llm 下，相同的请求直接返回缓存结果，不再消耗额度。
+只缓存完整结束的响应，被截断或中断的响应不会写入缓存。
+"""
+import hashlib
+import json
+import os
+
+from config import LLM_CONFIG
+from disk_cache import TextCache
+
+CACHE_DIR = os.path.join(".cache", "llm")
+
+def response_cache_key(messages, api_base=None, config=LLM_CONFIG):
+    """计算一次请求的缓存键，api_base 默认为配置中的接口地址"""
+    payload = json.dumps({
+        "api_base": str(api_base or config["api_base"]).rstrip("/"),
+        "messages": messages,
+        "model": config["model"],
+        "temperature": config["temperature"],
+        "max_tokens": config["max_tokens"],
+    }, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# 整个进程共用的缓存
+llm_cache = TextCache(
+    CACHE_DIR, ".txt",
+    max_memory_bytes=16 * 1024 * 1024,
+    max_disk_bytes=LLM_CONFIG.get("cache_max_bytes", 256 * 1024 * 1024)
+)
@@ -0,0 +1,108 @@
+"""本地的 OpenAI 兼容接口桩服务
+
+只实现 /v1/chat/completions（支持 stream），根据提示词中"历史事件描述"里带年份的句子
+生成固定格式的事件树，用于在不消耗额度的情况下调试事件生成流程和并发性能。
+
+用法：
+    python llm_stub_server.py --port 8001 --delay 1.0
+"""
+import argparse
+import json
+import re
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_DATE = re.compile(r"(\d{3,4})年(?:(\d{1,2})月)?")
+_SENTENCE = re.compile(r"[^。！？!?\n]+")
+
+def fake_event_tree(prompt):
+    """把描述中每个带年份的句子变成一个事件"""
+    text = prompt.split("历史事件描述：", 1)[-1]
+    events = {}
+    for sentence in _SENTENCE.findall(text):
+        match = _DATE.search(sentence)
+        if not match:
+            continue
+        index = len(events) + 1
+        events[f"event_{index}"] = {
+            "id": f"event_{index}",
+            "title": sentence.strip()[:20],
+            "year": int(match.group(1)),
+            "month": int(match.group(2) or 1),
+            "location": [],
+            "choices": [{"id": f"choice_{index}", "text": "继续", "next_event": f"event_{index + 1}"}]
+        }
+    if events:
+        events[f"event_{len(events)}"]["choices"] = []
+    tree = {"name": "桩服务事件树", "events": events, "initial_event": "event_1" if events else None}
+    return "```json\n" + json.dumps(tree, ensure_ascii=False, indent=4) + "\n```"
+
+class StubHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    piece_size = 40
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        prompt = request.get("messages", [{}])[-1].get("content", "")
+        content = fake_event_tree(prompt)
+        model = request.get("model", "stub")
+        completion_id = "chatcmpl-" + uuid.uuid4().hex
+        created = int(time.time())
+        time.sleep(self.delay)
+
+        if not request.get("stream"):
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        pieces = [content[i:i + self.piece_size] for i in range(0, len(content), self.piece_size)]
+        for i, piece in enumerate(pieces + [None]):
+            chunk = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": piece} if piece is not None else {},
+                    "finish_reason": None if piece is not None else "stop",
+                }],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容接口桩服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--delay", type=float, default=0.0, help="每个请求的模拟延迟（秒）")
+    args = parser.parse_args()
+
+    StubHandler.delay = args.delay
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f"桩服务已启动: http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""游戏 JSON 接口的本地压力测试
+
+依次用不同的工作进程数启动 main.py，多个客户端进程模拟玩家不停地开始游戏、查看事件、做出选择、
+获取地图颜色，统计每种进程数下的吞吐量（请求/秒）和延迟。客户端每个请求都新建连接，
+同一个玩家的请求会被分散到不同的工作进程上，结果中也会给出平均每个会话由几个进程处理过。
+
+吞吐量随进程数增长的前提是机器有足够的CPU核：客户端和服务器在同一台机器上运行，
+工作进程数超过 CPU 核数后吞吐量不会再增长。
+
+用法：
+    python load_test.py --workers 1,2,4 --clients 8 --duration 10
+    python load_test.py --tree events.json --output load_test.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def request(port, method, path, payload=None, host="127.0.0.1"):
+    """发送一个请求（每次新建连接），返回 (状态码, JSON 内容, 处理请求的进程ID)"""
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    try:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json", "Connection": "close"} if body else {"Connection": "close"}
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        data = response.read()
+        content = json.loads(data) if response.getheader("Content-Type", "").startswith("application/json") else data
+        return response.status, content, response.getheader("X-Worker-Pid")
+    finally:
+        connection.close()
+
+def start_server(workers, port, db_path):
+    """启动 main.py，等待接口可用后返回进程"""
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}")
+    env.pop("SESSION_STORE_URL", None)
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BASE_DIR, "main.py"), "--workers", str(workers), "--port", str(port)],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"服务器启动失败，退出码 {process.returncode}")
+        try:
+            if request(port, "GET", "/api/health")[0] == 200:
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("服务器启动超时")
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+def play(port, tree_file, duration, seed):
+    """一个模拟玩家：在 duration 秒内不停地玩，返回请求数、错误数、延迟和每个会话经过的进程数"""
+    rng = random.Random(seed)
+    latencies = []
+    errors = 0
+    session_workers = []
+
+    def timed(method, path, payload=None):
+        nonlocal errors
+        started = time.perf_counter()
+        status, content, pid = request(port, method, path, payload)
+        latencies.append(time.perf_counter() - started)
+        if status >= 400:
+            errors += 1
+        return status, content, pid
+
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        status, session, pid = timed("POST", "/api/sessions", {"tree": {"file": tree_file}})
+        if status != 201:
+            continue
+        session_id = session["session_id"]
+        workers = {pid}
+        while time.time() < deadline and not session["finished"]:
+            status, event, pid = timed("GET", f"/api/sessions/{session_id}/event")
+            workers.add(pid)
+            if status != 200 or not event or not event.get("choices"):
+                # 状态码 >= 400 时 timed 已经计入错误；其他情况（例如事件为空）在这里计入，重新开始一个会话
+                if status < 400:
+                    errors += 1
+                break
+            choice = rng.randrange(len(event["choices"]))
+            status, content, pid = timed("POST", f"/api/sessions/{session_id}/choice",
+                                         {"index": choice, "version": session["version"]})
+            workers.add(pid)
+            if status != 200:
+                break
+            session = content
+            _, _, pid = timed("GET", f"/api/sessions/{session_id}/map?format=binary")
+            workers.add(pid)
+        session_workers.append(len(workers))
+
+    return {"requests": len(latencies), "errors": errors, "latencies": latencies,
+            "session_workers": session_workers}
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def run_load(workers, clients, duration, tree_file, seed=0):
+    """用 workers 个工作进程启动服务器，clients 个玩家同时运行 duration 秒，返回统计结果"""
+    temp_dir = tempfile.mkdtemp(prefix="load_test_")
+    port = _free_port()
+    process = start_server(workers, port, os.path.join(temp_dir, "app.db"))
+    try:
+        # 先让每个工作进程加载事件树，不把首次加载的时间计入结果
+        for _ in range(workers * 4):
+            request(port, "POST", "/api/sessions", {"tree": {"file": tree_file}})
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=clients) as executor:
+            results = list(executor.map(play, [port] * clients, [tree_file] * clients,
+                                        [duration] * clients, [seed + i for i in range(clients)]))
+        elapsed = time.perf_counter() - started
+    finally:
+        stop_server(process)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    latencies = [latency for result in results for latency in result["latencies"]]
+    session_workers = [count for result in results for count in result["session_workers"]]
+    total = sum(result["requests"] for result in results)
+    return {
+        "workers": workers,
+        "clients": clients,
+        "requests": total,
+        "errors": sum(result["errors"] for result in results),
+        "elapsed_seconds": elapsed,
+        "requests_per_second": total / elapsed if elapsed else None,
+        "p50_ms": _percentile(latencies, 0.5) * 1000 if latencies else None,
+        "p95_ms": _percentile(latencies, 0.95) * 1000 if latencies else None,
+        "sessions": len(session_workers),
+        "workers_per_session": sum(session_workers) / len(session_workers) if session_workers else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="游戏 JSON 接口的本地压力测试")
+    parser.add_argument("--workers", default="1,2,4", help="依次测试的工作进程数，用逗号分隔")
+    parser.add_argument("--clients", type=int, default=8, help="同时运行的模拟玩家（客户端进程）数")
+    parser.add_argument("--duration", type=float, default=10.0, help="每种进程数的测试时长（秒）")
+    parser.add_argument("--tree", default="events.json", help="events 目录中的事件树文件")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--output", default=None, help="把结果写入JSON文件")
+    args = parser.parse_args()
+
+    worker_counts = [int(x) for x in args.workers.split(",")]
+    cpu_count = os.cpu_count() or 1
+    print(f"CPU 核数: {cpu_count}，模拟玩家: {args.clients}，每轮 {args.duration:.0f} 秒")
+    if max(worker_counts) > cpu_count:
+        print(f"警告: 工作进程数超过 CPU 核数（{cpu_count}），多出的进程不会提高吞吐量")
+
+    results = []
+    for workers in worker_counts:
+        result = run_load(workers, args.clients, args.duration, args.tree, args.seed)
+        results.append(result)
+        speedup = result["requests_per_second"] / results[0]["requests_per_second"]
+        print(f"{workers} 个进程: {result['requests_per_second']:.0f} 请求/秒（{speedup:.2f}x），"
+              f"p50 {result['p50_ms']:.1f} ms，p95 {result['p95_ms']:.1f} ms，"
+              f"{result['requests']} 个请求，{result['errors']} 个错误，"
+              f"平均每个会话由 {result['workers_per_session']:.1f} 个进程处理")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"cpu_count": cpu_count, "results": results}, f, ensure_ascii=False, indent=4)
+
+if __name__ == '__main__':
+    main()
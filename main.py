@@ -1,7 +1,84 @@
-from flask import Flask
-from app import create_app
+"""游戏 JSON 接口（game_api.py）的入口
+
+会话保存在 app.db 中，工作进程不保存状态，可以用任意 WSGI 服务器启动多个进程：
+    gunicorn -w 4 main:app
+
+不安装其他服务器时，也可以直接运行：先创建监听套接字，再 fork 出多个工作进程共同接受连接
+（每个进程内部用线程处理并发请求）：
+    python main.py --workers 4 --port 5000
+    python main.py --debug               # 单进程，带自动重载的调试服务器
+"""
+import argparse
+import os
+import signal
+import socket
+
+from game_api import create_app
 
 app = create_app()
 
+def serve(host, port, workers):
+    """预先 fork 的多进程服务器，Ctrl+C 或 SIGTERM 时结束所有工作进程"""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            # 父进程的数据库连接不能跨 fork 使用，每个工作进程创建自己的应用和连接
+            server = make_server(host, port, create_app(), threaded=True,
+                                 request_handler=QuietRequestHandler, fd=sock.fileno())
+            server.serve_forever()
+            os._exit(0)
+        children.append(pid)
+
+    print(f"游戏接口已启动: http://{host}:{port}/api （{workers} 个工作进程）", flush=True)
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+    finally:
+        sock.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="启动游戏 JSON 接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=1, help="工作进程数")
+    parser.add_argument("--debug", action="store_true", help="使用单进程的 Flask 调试服务器")
+    args = parser.parse_args()
+
+    if args.debug:
+        app.run(host=args.host, port=args.port, debug=True)
+    else:
+        serve(args.host, args.port, args.workers)
+
 if __name__ == '__main__':
-    app.run(debug=True) 
\ No newline at end of file
+    main()
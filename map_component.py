@@ -0,0 +1,53 @@
+"""客户端缓存几何数据的省份地图
+
+st.pydeck_chart 每次运行都要把整份带颜色的 GeoJSON 发给浏览器，浏览器再重建全部图层。
+这里用一个静态的 Streamlit 组件（map_frontend/index.html）代替：
+- 省份几何数据写成文件名带内容哈希的静态文件，浏览器第一次打开地图时下载，之后一直使用缓存；
+- 每次运行只发送每个省份4个字节（RGBA）的颜色数组和事件标记，组件保留同一个 deck.gl 实例，
+  通过 updateTriggers 只重新计算填充颜色，不重新处理几何数据。
+"""
+import hashlib
+import json
+import os
+
+import streamlit.components.v1 as components
+
+from map_data import geometry_collection
+
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "map_frontend")
+GEOMETRY_DIR = os.path.join(FRONTEND_DIR, "geometry")
+
+_province_map = components.declare_component("province_map", path=FRONTEND_DIR)
+
+def write_geometry(names, geometries, directory=GEOMETRY_DIR):
+    """把省份几何数据写成静态文件，返回相对于组件目录的地址；内容不变时文件名不变"""
+    payload = json.dumps(geometry_collection(names, geometries), ensure_ascii=False, separators=(',', ':'))
+    payload = payload.encode('utf-8')
+    filename = f"provinces-{hashlib.sha1(payload).hexdigest()[:16]}.json"
+    path = os.path.join(directory, filename)
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(temp_path, path)
+    return f"geometry/{filename}"
+
+def province_map(geometry_url, colors, colors_key, markers, view, height=500, key="province_map"):
+    """绘制省份地图
+
+    geometry_url：write_geometry 返回的地址；colors：province_color_bytes 生成的颜色数组；
+    colors_key：颜色的版本（例如势力范围的哈希），变化时组件才会更新颜色；
+    markers：[{'name', 'coordinates'}] 事件地点标记；view：初始视角 {'longitude', 'latitude', 'zoom'}。
+    key 固定时组件在多次运行之间不会重新加载。
+    """
+    return _province_map(
+        geometry=geometry_url,
+        colors=colors,
+        colors_key=colors_key,
+        markers=markers or [],
+        view=view,
+        height=height,
+        key=key,
+        default=None,
+    )
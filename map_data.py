@@ -0,0 +1,88 @@
+"""地图数据的生成
+
+不依赖 Streamlit 的省份地图处理函数，app.py 在外面加上缓存后使用，性能测试（benchmark.py）直接调用。
+客户端地图（map_component.py）只在第一次发送不带颜色的几何数据（geometry_collection），
+之后每次更新只发送 province_color_bytes 生成的颜色数组。
+"""
+import hashlib
+import json
+
+from config import MAP_CONFIG
+from map_lod import lod_file_for_zoom, SOURCE_FILE
+
+# 势力颜色（半透明）
+FACTION_COLORS = {
+    'central_government': [0, 0, 255, 140],  # 蓝色
+    'communist': [255, 0, 0, 140],  # 红色
+    'japanese': [255, 255, 0, 140],  # 黄色
+}
+DEFAULT_PROVINCE_COLOR = [100, 100, 100, 140]  # 默认灰色
+
+def boundary_file():
+    """省份边界文件，开启 use_lod 时按缩放级别读取简化后的边界，缺失时回退到原始文件"""
+    if MAP_CONFIG["use_lod"]:
+        return lod_file_for_zoom(MAP_CONFIG["zoom"], MAP_CONFIG["lod_dir"])
+    return SOURCE_FILE
+
+def read_province_boundaries(path=None):
+    """读取省份边界 GeoDataFrame"""
+    # geopandas 导入很慢，只在第一次绘制地图时导入
+    import geopandas as gpd
+    return gpd.read_file(path or boundary_file())
+
+def province_features(gdf):
+    """返回省份名称数组和对应的几何数据（GeoJSON 字典）"""
+    names = gdf['name'].to_numpy(dtype=object)
+    features = json.loads(gdf[['name', 'geometry']].to_json())['features']
+    geometries = [feature['geometry'] for feature in features]
+    return names, geometries
+
+def territories_hash(controlled_territories):
+    """计算势力范围的哈希值，作为地图数据的缓存键"""
+    payload = json.dumps(controlled_territories, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def compute_province_colors(names, controlled_territories):
+    """向量化计算每个省份的颜色，返回 (省份数, 4) 的数组"""
+    import numpy as np
+    colors = np.tile(np.array(DEFAULT_PROVINCE_COLOR, dtype=np.uint8), (len(names), 1))
+    # 倒序覆盖，保证与原逻辑一致：排在前面的势力优先
+    for faction, territories in reversed(list(controlled_territories.items())):
+        if not territories:
+            continue
+        mask = np.isin(names, list(territories))
+        colors[mask] = FACTION_COLORS.get(faction, DEFAULT_PROVINCE_COLOR)
+    return colors
+
+def build_geojson(names, geometries, controlled_territories):
+    """根据势力范围生成带颜色的 GeoJSON，几何数据直接引用，不复制"""
+    colors = compute_province_colors(names, controlled_territories).tolist()
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            {
+                'type': 'Feature',
+                'properties': {'name': name, 'color': color},
+                'geometry': geometry
+            }
+            for name, color, geometry in zip(names, colors, geometries)
+        ]
+    }
+
+def province_color_bytes(names, controlled_territories):
+    """每个省份4个字节（RGBA）的颜色数组，顺序与 names 一致"""
+    return compute_province_colors(names, controlled_territories).tobytes()
+
+def geometry_collection(names, geometries):
+    """不带颜色的省份 GeoJSON，properties.index 是该省份在颜色数组中的序号"""
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            {
+                'type': 'Feature',
+                'properties': {'name': name, 'index': index},
+                'geometry': geometry
+            }
+            for index, (name, geometry) in enumerate(zip(names, geometries))
+        ]
+    }
@@ -0,0 +1,217 @@
+"""省份边界多级简化（LOD）预处理
+
+把 china_provinces.geojson 按缩放级别生成多份简化后的边界数据：
+先把坐标量化到网格上，再按相邻省份的公共边界拆分成弧段，每条弧段只简化一次，
+这样相邻省份的边界简化后仍然完全重合，不会出现缝隙或重叠。
+
+用法：
+    python map_lod.py [源文件] [输出目录]
+"""
+import json
+import os
+import sys
+
+SOURCE_FILE = "china_provinces.geojson"
+LOD_DIR = "map_lod"
+MANIFEST_FILE = "index.json"
+
+# 需要生成的缩放级别
+LOD_ZOOMS = [3, 5, 7]
+
+def tolerance_for_zoom(zoom):
+    """某缩放级别下一个像素对应的经纬度跨度"""
+    return 360.0 / (256 * 2 ** zoom)
+
+def _quantize_ring(ring, quantum):
+    """把环上的坐标量化到网格，并去掉量化后重复的相邻点"""
+    result = []
+    for x, y in ring:
+        point = (round(x / quantum), round(y / quantum))
+        if not result or result[-1] != point:
+            result.append(point)
+    # 去掉闭合点，后面统一按开环处理
+    if len(result) > 1 and result[0] == result[-1]:
+        result.pop()
+    return result
+
+def _simplify_line(points, tolerance):
+    """Douglas-Peucker 简化，保留首尾两个端点"""
+    if len(points) < 3:
+        return list(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    tolerance_sq = tolerance * tolerance
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        x1, y1 = points[start]
+        x2, y2 = points[end]
+        dx, dy = x2 - x1, y2 - y1
+        length_sq = dx * dx + dy * dy
+        max_dist, index = -1.0, None
+        for i in range(start + 1, end):
+            px, py = points[i]
+            if length_sq == 0:
+                dist = (px - x1) ** 2 + (py - y1) ** 2
+            else:
+                cross = dx * (py - y1) - dy * (px - x1)
+                dist = cross * cross / length_sq
+            if dist > max_dist:
+                max_dist, index = dist, i
+        if index is not None and max_dist > tolerance_sq:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return [p for p, k in zip(points, keep) if k]
+
+def _iter_rings(geometry):
+    """遍历几何中的所有环，返回 (多边形序号, 环序号, 坐标)"""
+    if geometry['type'] == 'Polygon':
+        polygons = [geometry['coordinates']]
+    elif geometry['type'] == 'MultiPolygon':
+        polygons = geometry['coordinates']
+    else:
+        return
+    for p, polygon in enumerate(polygons):
+        for r, ring in enumerate(polygon):
+            yield p, r, ring
+
+def _find_junctions(rings):
+    """找出所有弧段端点：归属环集合发生变化的点，或被三个以上环共享的点"""
+    owners = {}
+    for ring_id, ring in enumerate(rings):
+        for point in ring:
+            owners.setdefault(point, set()).add(ring_id)
+    junctions = set()
+    for ring in rings:
+        n = len(ring)
+        for i, point in enumerate(ring):
+            owner = owners[point]
+            if len(owner) > 2 or owner != owners[ring[i - 1]] or owner != owners[ring[(i + 1) % n]]:
+                junctions.add(point)
+    return junctions
+
+def _simplify_ring(ring, junctions, tolerance, arc_cache):
+    """按弧段简化一个环，公共弧段通过 arc_cache 共享简化结果"""
+    n = len(ring)
+    cuts = [i for i, point in enumerate(ring) if point in junctions]
+    if not cuts:
+        # 孤立的环（如海岛）：以首点和最远点为端点分两段简化
+        x0, y0 = ring[0]
+        far = max(range(n), key=lambda i: (ring[i][0] - x0) ** 2 + (ring[i][1] - y0) ** 2)
+        cuts = [0, far] if far else [0]
+
+    simplified = []
+    for k, start in enumerate(cuts):
+        end = cuts[(k + 1) % len(cuts)]
+        if end <= start:
+            arc = ring[start:] + ring[:end + 1]
+        else:
+            arc = ring[start:end + 1]
+        # 正反两个方向的同一弧段使用同一个缓存键
+        reverse = tuple(reversed(arc))
+        key = min(tuple(arc), reverse)
+        if key not in arc_cache:
+            arc_cache[key] = _simplify_line(list(key), tolerance)
+        part = arc_cache[key]
+        if key != tuple(arc):
+            part = part[::-1]
+        simplified.extend(part[:-1])
+
+    if len(simplified) < 3:
+        return None
+    return simplified
+
+def build_lod(collection, zoom):
+    """生成某一缩放级别的简化 FeatureCollection"""
+    tolerance = tolerance_for_zoom(zoom)
+    quantum = tolerance / 4
+    digits = max(0, len(str(int(1 / quantum))))
+
+    # 量化所有环，并记录每个环属于哪个要素
+    rings, layout = [], []
+    for f, feature in enumerate(collection['features']):
+        for p, r, ring in _iter_rings(feature['geometry']):
+            rings.append(_quantize_ring(ring, quantum))
+            layout.append((f, p, r))
+
+    junctions = _find_junctions(rings)
+    arc_cache = {}
+    # tolerance 以网格单位计算
+    grid_tolerance = tolerance / quantum
+
+    polygons_by_feature = {}
+    for ring, (f, p, r) in zip(rings, layout):
+        simplified = _simplify_ring(ring, junctions, grid_tolerance, arc_cache) if len(ring) >= 3 else None
+        if simplified is None:
+            # 环太小，简化后退化：外环保留量化后的原始点，内环直接丢弃
+            if r > 0 or len(ring) < 3:
+                continue
+            simplified = ring
+        coords = [[round(x * quantum, digits), round(y * quantum, digits)] for x, y in simplified]
+        coords.append(coords[0])
+        polygons = polygons_by_feature.setdefault(f, {})
+        polygons.setdefault(p, []).append(coords)
+
+    features = []
+    for f, feature in enumerate(collection['features']):
+        polygons = [rings for _, rings in sorted(polygons_by_feature.get(f, {}).items())]
+        if not polygons:
+            continue
+        if len(polygons) == 1:
+            geometry = {'type': 'Polygon', 'coordinates': polygons[0]}
+        else:
+            geometry = {'type': 'MultiPolygon', 'coordinates': polygons}
+        features.append({'type': 'Feature', 'properties': feature['properties'], 'geometry': geometry})
+    return {'type': 'FeatureCollection', 'features': features}
+
+def build_all(source=SOURCE_FILE, output_dir=LOD_DIR, zooms=LOD_ZOOMS):
+    """生成所有级别的简化数据和索引文件"""
+    with open(source, 'r', encoding='utf-8') as f:
+        collection = json.load(f)
+
+    os.makedirs(output_dir, exist_ok=True)
+    levels = []
+    for zoom in sorted(zooms):
+        lod = build_lod(collection, zoom)
+        file_name = f"china_provinces_z{zoom}.geojson"
+        with open(os.path.join(output_dir, file_name), 'w', encoding='utf-8') as f:
+            json.dump(lod, f, ensure_ascii=False, separators=(',', ':'))
+        levels.append({
+            'zoom': zoom,
+            'tolerance': tolerance_for_zoom(zoom),
+            'file': file_name,
+            'size': os.path.getsize(os.path.join(output_dir, file_name))
+        })
+
+    manifest = {
+        'source': os.path.basename(source),
+        'source_size': os.path.getsize(source),
+        'levels': levels
+    }
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+    return manifest
+
+def lod_file_for_zoom(zoom, lod_dir=LOD_DIR, default=SOURCE_FILE):
+    """返回适合该缩放级别的边界文件：精度不低于该级别的最粗一级，没有则返回原始文件"""
+    try:
+        with open(os.path.join(lod_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+    for level in sorted(manifest.get('levels', []), key=lambda x: x['zoom']):
+        path = os.path.join(lod_dir, level['file'])
+        if level['zoom'] >= zoom and os.path.exists(path):
+            return path
+    return default
+
+if __name__ == '__main__':
+    source = sys.argv[1] if len(sys.argv) > 1 else SOURCE_FILE
+    output_dir = sys.argv[2] if len(sys.argv) > 2 else LOD_DIR
+    manifest = build_all(source, output_dir)
+    print(f"原始文件: {manifest['source']} ({manifest['source_size']} 字节)")
+    for level in manifest['levels']:
+        ratio = level['size'] / manifest['source_size']
+        print(f"  zoom {level['zoom']}: {level['file']} ({level['size']} 字节, {ratio:.1%})")
@@ -0,0 +1,261 @@
+"""事件树结局分布的精确分析
+
+把事件树看作有向无环图，按拓扑顺序用动态规划传播选项后果（三项属性累加、领土新增），
+不需要枚举每一条游戏路线，路线数远超可枚举范围时也能算出精确结果：
+- 每个结局：到达的路线数（Python 整数，精确）、随机选择策略下的到达概率、
+  各属性的最小/最大值和分布直方图（按路线数占比和按随机策略概率两种）、各势力新增各省份的概率；
+- 每个事件的同样信息只在 keep_events=True（命令行 --events）时保留。
+与 batch_runner.py 的 random 策略对应，可以用来验证批量模拟的结果。
+
+直方图的长度是属性的取值范围，随事件树的深度增长。传播时节点的直方图在第一条入边到达时才分配，
+所有出边传播完后立即释放，同时占用内存的只有拓扑顺序上还没处理完的节点；
+结果中的直方图只保留有路线到达的取值。
+
+用法：
+    python outcome_analysis.py events/events.json [--json report.json] [--events]
+"""
+import argparse
+import json
+
+import numpy as np
+
+import game_engine as engine
+from compiled_tree import load_event_data
+
+def _build_graph(events_data):
+    """从初始事件出发建立可达事件的图，返回 (拓扑顺序, 出边, 领土列表)
+
+    出边为 [(下一个事件ID或None, 属性变化, 领土序号列表, 选择概率)]，下一个事件为None表示游戏结束。
+    """
+    events = events_data["events"]
+    time_data = {"time_index": engine.build_time_index(events)}
+    territory_index = {}
+    edges = {}
+    order = [events_data["initial_event"]]
+    seen = {order[0]}
+    for event_id in order:
+        event = events[event_id]
+        choices = event.get("choices") or []
+        outgoing = []
+        for choice in choices:
+            consequences = choice.get("consequences") or {}
+            deltas = np.array([consequences.get(key, 0) or 0 for key in engine.STAT_KEYS], dtype=np.int64)
+            gained = []
+            for faction, provinces in (consequences.get("territories") or {}).items():
+                for province in provinces:
+                    gained.append(territory_index.setdefault((faction, province), len(territory_index)))
+            next_event = choice.get("next_event")
+            if not next_event:
+                # 与 game_engine.process_choice 相同：没有next_event时跳到时间上最近的后续事件
+                next_event = engine.find_next_event_by_time(time_data, event["year"], event["month"])
+            if next_event not in events:
+                next_event = None
+            outgoing.append((next_event, deltas, gained, 1.0 / len(choices)))
+            if next_event is not None and next_event not in seen:
+                seen.add(next_event)
+                order.append(next_event)
+        edges[event_id] = outgoing
+
+    # Kahn 拓扑排序
+    in_degree = dict.fromkeys(order, 0)
+    for outgoing in edges.values():
+        for next_event, _, _, _ in outgoing:
+            if next_event is not None:
+                in_degree[next_event] += 1
+    queue = [event_id for event_id in order if in_degree[event_id] == 0]
+    for event_id in queue:
+        for next_event, _, _, _ in edges[event_id]:
+            if next_event is not None:
+                in_degree[next_event] -= 1
+                if in_degree[next_event] == 0:
+                    queue.append(next_event)
+    if len(queue) < len(order):
+        in_cycle = [event_id for event_id in order if in_degree[event_id] > 0]
+        raise ValueError(f"事件树中存在环，无法精确分析：{in_cycle[:10]}")
+
+    territories = sorted(territory_index, key=territory_index.get)
+    return queue, edges, territories
+
+def _new_node(paths, low, high, territory_count):
+    """一个节点的累计量：路线数、概率、每项属性的直方图（第0行路线占比，第1行概率）、领土新增量
+
+    路线数可能远超浮点数范围，直方图只保存占比，路线数用 Python 整数单独精确计算。
+    """
+    return {
+        "paths": paths,
+        "probability": 0.0,
+        "low": low,
+        "high": high,
+        "histograms": [np.zeros((2, hi - lo + 1)) for lo, hi in zip(low, high)],
+        "territories": np.zeros((2, territory_count)),
+    }
+
+def _add_flow(target, source, deltas, gained, weight):
+    """把 source 经过一条出边（属性变化 deltas、新增领土 gained、选择概率 weight）的流量加到 target"""
+    target["probability"] += source["probability"] * weight
+    # 整数相除得到的浮点数是精确舍入的，不会因为路线数过大而溢出
+    scale = np.array([[source["paths"] / target["paths"]], [weight]])
+    for stat, (histogram, delta) in enumerate(zip(source["histograms"], deltas)):
+        start = source["low"][stat] + delta - target["low"][stat]
+        target["histograms"][stat][:, start:start + histogram.shape[1]] += histogram * scale
+    territories = source["territories"] * scale
+    if gained:
+        # 经过这条边的所有路线都获得了这些领土
+        territories[:, gained] = [[scale[0, 0]], [source["probability"] * weight]]
+    target["territories"] += territories
+
+def analyze_event_tree(events_data, initial_stats=None, keep_events=False):
+    """精确计算每个结局（keep_events 时还有每个事件）的属性分布
+
+    返回 {'event_count': 可达事件数, 'events': {...}, 'endings': {...}, 'territories': [...]}，
+    keep_events 为 False 时 events 为空字典。
+    """
+    if initial_stats is None:
+        state = engine.new_game_state()
+        initial_stats = [state[key] for key in engine.STAT_KEYS]
+    if events_data.get("initial_event") not in events_data.get("events", {}):
+        raise ValueError("事件树没有有效的初始事件")
+    order, edges, territories = _build_graph(events_data)
+    start = np.array(initial_stats, dtype=np.int64)
+
+    # 第一遍：精确路线数，以及属性的最小值和最大值，用来确定直方图范围
+    low = {order[0]: start}
+    high = {order[0]: start}
+    paths = {order[0]: 1}
+    end_low, end_high, end_paths = {}, {}, {}
+    for event_id in order:
+        for next_event, deltas, _, _ in edges[event_id]:
+            target_low, target_high, target_paths = (
+                (low, high, paths) if next_event is not None else (end_low, end_high, end_paths)
+            )
+            key = next_event if next_event is not None else event_id
+            target_paths[key] = target_paths.get(key, 0) + paths[event_id]
+            candidate_low, candidate_high = low[event_id] + deltas, high[event_id] + deltas
+            if key in target_low:
+                target_low[key] = np.minimum(target_low[key], candidate_low)
+                target_high[key] = np.maximum(target_high[key], candidate_high)
+            else:
+                target_low[key], target_high[key] = candidate_low, candidate_high
+        if not edges[event_id]:
+            # 没有选项的事件本身就是结局
+            end_paths[event_id] = end_paths.get(event_id, 0) + paths[event_id]
+            end_low[event_id] = np.minimum(end_low.get(event_id, low[event_id]), low[event_id])
+            end_high[event_id] = np.maximum(end_high.get(event_id, high[event_id]), high[event_id])
+
+    # 第二遍：按拓扑顺序传播直方图。处理到一个事件时它的所有入边都已传播完，
+    # 传播完出边后节点不再需要，立即释放；结局只有所属事件一个来源，同样处理完就整理为结果
+    territory_count = len(territories)
+    nodes = {}
+
+    def node_for(event_id):
+        node = nodes.get(event_id)
+        if node is None:
+            node = nodes[event_id] = _new_node(
+                paths[event_id], low[event_id].tolist(), high[event_id].tolist(), territory_count
+            )
+        return node
+
+    root = node_for(order[0])
+    root["probability"] = 1.0
+    for histogram in root["histograms"]:
+        histogram[:, 0] = 1.0
+    no_change = np.zeros(len(engine.STAT_KEYS), dtype=np.int64)
+    events, endings = {}, {}
+    for event_id in order:
+        node = nodes.pop(event_id)
+        ending = None
+        if event_id in end_low:
+            ending = _new_node(end_paths[event_id], end_low[event_id].tolist(), end_high[event_id].tolist(),
+                               territory_count)
+        for next_event, deltas, gained, weight in edges[event_id]:
+            target = node_for(next_event) if next_event is not None else ending
+            _add_flow(target, node, deltas, gained, weight)
+        if not edges[event_id]:
+            _add_flow(ending, node, no_change, [], 1.0)
+        if ending is not None:
+            endings[event_id] = _describe(ending, territories)
+        if keep_events:
+            events[event_id] = _describe(node, territories)
+
+    return {
+        "event_count": len(order),
+        "events": events,
+        "endings": endings,
+        "territories": territories,
+    }
+
+def _describe(node, territories):
+    """把节点的累计量整理为结果字典，直方图为只包含有路线到达的取值的 NumPy 数组"""
+    stats = {}
+    for key, low, high, histogram in zip(engine.STAT_KEYS, node["low"], node["high"], node["histograms"]):
+        values = np.arange(low, high + 1)
+        probability = histogram[1]
+        total = probability.sum()
+        mask = histogram[0] > 0
+        stats[key] = {
+            # 第一遍的最小/最大值就是所有路线上的精确极值
+            "min": low,
+            "max": high,
+            "mean": float((values * probability).sum() / total) if total else None,
+            "values": values[mask],
+            "path_share": histogram[0][mask],
+            "probability": probability[mask],
+        }
+    # 到达该节点的路线中获得各省份的比例，以及随机策略下的条件概率
+    gained = {}
+    for (faction, province), (share, probability) in zip(territories, node["territories"].T):
+        if share > 0:
+            gained.setdefault(faction, {})[province] = {
+                "path_share": float(share),
+                "probability": float(probability / node["probability"]) if node["probability"] else 0.0,
+            }
+    return {"paths": node["paths"], "probability": node["probability"], "stats": stats, "territories": gained}
+
+def to_json(result):
+    """转换为可以写入JSON的结构，直方图只保留有路线到达的取值"""
+    def convert(described):
+        stats = {}
+        for key, stat in described["stats"].items():
+            mask = stat["path_share"] > 0
+            stats[key] = {
+                "min": stat["min"],
+                "max": stat["max"],
+                "mean": stat["mean"],
+                "histogram": {
+                    str(int(value)): {"path_share": float(share), "probability": float(probability)}
+                    for value, share, probability in zip(stat["values"][mask], stat["path_share"][mask], stat["probability"][mask])
+                },
+            }
+        return {"paths": str(described["paths"]), "probability": described["probability"],
+                "stats": stats, "territories": described["territories"]}
+
+    return {
+        "events": {event_id: convert(described) for event_id, described in result["events"].items()},
+        "endings": {event_id: convert(described) for event_id, described in result["endings"].items()},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="精确计算事件树所有结局的属性分布")
+    parser.add_argument("file", help="事件树文件，例如 events/events.json")
+    parser.add_argument("--json", default=None, help="把完整结果（含直方图）写入JSON文件")
+    parser.add_argument("--events", action="store_true", help="同时保留每个事件的属性分布（占用更多内存）")
+    args = parser.parse_args()
+
+    result = analyze_event_tree(load_event_data(args.file), keep_events=args.events)
+    total_paths = sum(ending["paths"] for ending in result["endings"].values())
+    print(f"事件树: {args.file}")
+    print(f"可达事件 {result['event_count']} 个，结局 {len(result['endings'])} 个，游戏路线共 {total_paths} 条")
+    for event_id, ending in sorted(result["endings"].items(), key=lambda x: -x[1]["probability"]):
+        print(f"结局 {event_id}: {ending['paths']} 条路线，随机选择时概率 {ending['probability']:.1%}")
+        for key, stat in ending["stats"].items():
+            print(f"  {key}: 最小 {stat['min']}，最大 {stat['max']}，随机选择时平均 {stat['mean']:.1f}")
+        for faction, provinces in ending["territories"].items():
+            shown = ", ".join(f"{province} {share['probability']:.0%}" for province, share in provinces.items())
+            print(f"  {faction} 新增领土: {shown}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(to_json(result), f, ensure_ascii=False, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""侧边栏性能面板，游戏和编辑器共用"""
+import streamlit as st
+
+from config import PERF_CONFIG
+from perf_trace import format_stats, process_stats
+
+def _markdown_table(rows):
+    """用 Markdown 表格显示，侧边栏里比 dataframe 紧凑，也不需要 pyarrow"""
+    if not rows:
+        return "（暂无数据）"
+    headers = list(rows[0])
+    lines = ["| " + " | ".join(headers) + " |", "|" + "---|" * len(headers)]
+    for row in rows:
+        lines.append("| " + " | ".join(str(row[header]).replace("|", "\\|") for header in headers) + " |")
+    return "\n".join(lines)
+
+def render_perf_panel(record, session_stats):
+    """显示本次运行各阶段的耗时、会话和进程的累计统计，以及可选的采样分析结果"""
+    if not st.sidebar.checkbox("显示性能面板", value=PERF_CONFIG["show_panel"], key="perf_panel"):
+        return
+    with st.sidebar.expander("性能", expanded=True):
+        if record is not None:
+            st.write(f"本次运行：{record['total'] * 1000:.1f} ms")
+            st.markdown(_markdown_table(
+                [{"阶段": name, "耗时(ms)": round(seconds * 1000, 2)} for name, seconds in record["spans"]]
+            ))
+        st.caption("本会话累计")
+        st.markdown(_markdown_table(format_stats(session_stats)))
+        st.caption("本进程累计")
+        st.markdown(_markdown_table(format_stats(process_stats())))
+        st.caption(f"每次运行的记录写入 {PERF_CONFIG['log_file']}")
+
+        # 采样分析会拖慢运行，只对下一次运行开启
+        if st.button("分析下一次运行", key="perf_profile"):
+            st.session_state.profile_next_run = True
+            st.rerun()
+        profile = record.get("profile") if record is not None else None
+        if profile:
+            st.write(f"采样分析：{profile['samples']} 个样本，间隔 {profile['interval'] * 1000:.0f} ms")
+            st.write("自身耗时最多的函数")
+            st.markdown(_markdown_table([{"函数": name, "样本": count} for name, count in profile["own"]]))
+            st.write("累计耗时最多的函数")
+            st.markdown(_markdown_table([{"函数": name, "样本": count} for name, count in profile["cumulative"]]))
+            st.download_button("下载调用栈（火焰图格式）", profile["collapsed"], file_name="profile.collapsed")
@@ -0,0 +1,198 @@
+"""每次运行的阶段耗时统计和采样分析
+
+Streamlit 每次交互都会从头运行整个脚本。start_run/end_run 标记一次运行，span 记录其中的
+各个阶段（事件树加载、地图数据、地图绘制、事件图、保存、大模型调用等）。
+每次运行的结果会累加到会话统计和进程统计中，并以 JSON 行写入轮转日志。
+开启 profile 时，同一线程会被后台线程按固定间隔采样调用栈，得到这次运行的热点函数。
+
+st.rerun() 会通过异常中断脚本，end_run 不会被调用；下一次 start_run 会把上一次运行记为中断。
+"""
+import collections
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+from config import PERF_CONFIG
+
+# 进程统计：阶段名 -> {'count', 'total', 'max'}
+_process_stats = {}
+_process_lock = threading.Lock()
+# 每个脚本线程当前的运行
+_local = threading.local()
+# 正在采样的分析器，脚本线程异常退出、没有调用 end_run 时由下一次 start_run 停止
+_profilers = set()
+_logger = None
+
+def _add_timing(stats, name, seconds):
+    entry = stats.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+    entry["count"] += 1
+    entry["total"] += seconds
+    entry["max"] = max(entry["max"], seconds)
+
+def _get_logger():
+    global _logger
+    if _logger is None:
+        os.makedirs(os.path.dirname(PERF_CONFIG["log_file"]), exist_ok=True)
+        logger = logging.getLogger("perf_trace")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        handler = RotatingFileHandler(
+            PERF_CONFIG["log_file"], maxBytes=PERF_CONFIG["log_max_bytes"],
+            backupCount=PERF_CONFIG["log_backups"], encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        _logger = logger
+    return _logger
+
+class SamplingProfiler:
+    """在后台线程中按固定间隔采样目标线程的调用栈"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="perf-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                # 目标线程已经结束（运行异常退出，没有调用 end_run）
+                break
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.samples += 1
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        with _process_lock:
+            _profilers.discard(self)
+        return self.result()
+
+    def result(self, top=20):
+        """返回采样数、热点函数（自身/累计占比）和折叠格式的调用栈（可直接用于火焰图）"""
+        own = collections.Counter()
+        cumulative = collections.Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for frame in set(frames):
+                cumulative[frame] += count
+        return {
+            "samples": self.samples,
+            "interval": self.interval,
+            "own": own.most_common(top),
+            "cumulative": cumulative.most_common(top),
+            "collapsed": "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()),
+        }
+
+def _stop_orphaned_profilers():
+    """停止目标线程已经结束的分析器；线程ID可能被新线程复用，当前线程ID上遗留的分析器也属于已结束的线程"""
+    alive = {thread.ident for thread in threading.enumerate()}
+    current = threading.get_ident()
+    with _process_lock:
+        orphaned = [p for p in _profilers if p.thread_id not in alive or p.thread_id == current]
+    for profiler in orphaned:
+        profiler.stop()
+
+def start_run(script, session_stats=None, profile=False):
+    """开始一次运行；session_stats 为会话统计字典（例如放在 st.session_state 中），结束时累加进去"""
+    previous = getattr(_local, "run", None)
+    if previous is not None:
+        end_run(status="interrupted")
+    run = {
+        "script": script,
+        "started": time.time(),
+        "start": time.perf_counter(),
+        "spans": [],
+        "session_stats": session_stats,
+        "profiler": None,
+    }
+    _stop_orphaned_profilers()
+    if profile:
+        run["profiler"] = SamplingProfiler(threading.get_ident(), PERF_CONFIG["profile_interval"])
+        with _process_lock:
+            _profilers.add(run["profiler"])
+        run["profiler"].start()
+    _local.run = run
+    return run
+
+@contextmanager
+def span(name):
+    """记录一个阶段的耗时，没有进行中的运行时只计入进程统计"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        run = getattr(_local, "run", None)
+        if run is not None:
+            run["spans"].append((name, seconds))
+        with _process_lock:
+            _add_timing(_process_stats, name, seconds)
+
+def current_run():
+    """当前线程进行中的运行，没有时返回None"""
+    return getattr(_local, "run", None)
+
+def end_run(status="ok"):
+    """结束当前运行：累加统计、写日志，返回运行记录（含采样分析结果）"""
+    run = getattr(_local, "run", None)
+    if run is None:
+        return None
+    _local.run = None
+    total = time.perf_counter() - run["start"]
+    profile = run["profiler"].stop() if run["profiler"] is not None else None
+    with _process_lock:
+        _add_timing(_process_stats, "run:" + run["script"], total)
+    if run["session_stats"] is not None:
+        _add_timing(run["session_stats"], "run:" + run["script"], total)
+        for name, seconds in run["spans"]:
+            _add_timing(run["session_stats"], name, seconds)
+    record = {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(run["started"])),
+        "script": run["script"],
+        "status": status,
+        "total": round(total, 6),
+        "spans": [[name, round(seconds, 6)] for name, seconds in run["spans"]],
+    }
+    try:
+        _get_logger().info(json.dumps(record, ensure_ascii=False))
+    except OSError:
+        pass
+    record["profile"] = profile
+    return record
+
+def process_stats():
+    """进程统计的副本"""
+    with _process_lock:
+        return {name: dict(entry) for name, entry in _process_stats.items()}
+
+def format_stats(stats):
+    """把统计字典转换为表格行，按总耗时排序"""
+    return [
+        {
+            "阶段": name,
+            "次数": entry["count"],
+            "平均(ms)": round(entry["total"] / entry["count"] * 1000, 2),
+            "最大(ms)": round(entry["max"] * 1000, 2),
+            "合计(ms)": round(entry["total"] * 1000, 2),
+        }
+        for name, entry in sorted(stats.items(), key=lambda item: -item[1]["total"])
+    ]
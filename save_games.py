@@ -0,0 +1,214 @@
+"""游戏存档
+
+把一局游戏（事件树来源、起始状态、当前状态、从起点到当前一步的选择）压缩后保存在 app.db 的
+save_games 表中，服务器重启或浏览器断开后可以按存档ID恢复。
+
+- 写入：save() 把存档压缩后放进待写队列就返回，后台线程每隔 flush_interval 秒把队列中的存档
+  在一个事务里批量写入（同一个存档在一批中只写最后一次），点击选项时不需要等待磁盘；
+- 读取：save_games 是以存档ID为主键的 WITHOUT ROWID 表，恢复时只需要一次主键查找。
+  队列中还没写入的存档直接从内存中解压返回，调用方修改返回值不会影响将要写入的内容。
+
+写入使用后台线程自己的连接，读取每个线程使用各自的连接，都是 WAL 模式，读写互不阻塞。
+存档内容：
+    {'source': 事件树来源, 'start': 起始状态, 'state': 当前状态, 'choices': [[事件ID, 选项序号], ...]}
+状态为 engine.export_state 的结果；恢复时按 choices 重放得到完整的历史记录，
+事件树已经变化、无法重放时从存档的当前状态开始。
+"""
+import atexit
+import json
+import sqlite3
+import threading
+import time
+import traceback
+import zlib
+
+import game_engine as engine
+from event_store import default_db_path
+from game_history import GameHistory
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS save_games (
+    save_id TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    steps INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+SAVE_VERSION = 1
+
+def encode_save(snapshot):
+    """紧凑的 JSON 再用 zlib 压缩"""
+    payload = json.dumps(snapshot, ensure_ascii=False, separators=(',', ':'))
+    return zlib.compress(payload.encode('utf-8'))
+
+def decode_save(data):
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+def snapshot_game(history, source):
+    """由历史记录当前的路径生成存档内容，source 是事件树来源（{'file': 路径} 或 {'store': 事件树ID}）"""
+    path = history.path()
+    return {
+        'version': SAVE_VERSION,
+        'source': source,
+        'start': engine.export_state(history.nodes[path[0]]['state']),
+        'state': engine.export_state(history.state),
+        'choices': [list(history.nodes[index]['choice']) for index in path[1:]],
+    }
+
+def restore_history(snapshot, tree_id):
+    """按存档中的选择在事件树（注册表中的事件树ID）上重放，返回历史记录"""
+    state = engine.restore_state(snapshot['start'], tree_id)
+    history = GameHistory(state, "读取存档")
+    for event_id, index in snapshot['choices']:
+        event = engine.get_current_event(state)
+        choices = (event or {}).get('choices') or []
+        if state['current_event_id'] != event_id or not 0 <= index < len(choices):
+            break
+        choice = choices[index]
+        state = engine.process_choice(state, choice)
+        history.push(state, f"{event['title']}：{choice['text']}", choice=(event_id, index))
+    else:
+        if engine.export_state(state) == snapshot['state']:
+            return history
+    # 事件树已经变化，从存档的当前状态开始
+    return GameHistory(engine.restore_state(snapshot['state'], tree_id), "读取存档")
+
+class SaveStore:
+    """存档存储，写入在后台线程中批量进行，一个进程共用一个实例"""
+
+    def __init__(self, db_path=None, flush_interval=0.2, timeout=30.0):
+        self.db_path = db_path or default_db_path()
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self._pending = {}  # 存档ID -> (压缩后的存档, 步数)，None 表示删除
+        self._writing = {}  # 正在写入的一批存档，写完之前读取仍然使用这里的内容
+        self._closed = False
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._writer = None
+        self.stats = {'batches': 0, 'writes': 0, 'coalesced': 0, 'errors': 0, 'dropped': 0}
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        self._local.conn = conn
+        # 进程退出前写完队列中的存档
+        atexit.register(self.close)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self):
+        # 每个线程一个读连接
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # ---- 写入 ----
+
+    def save(self, save_id, snapshot):
+        """把存档压缩后放进待写队列，立即返回；存档无法序列化时直接抛出异常"""
+        entry = (encode_save(snapshot), len(snapshot.get('choices', []))) if snapshot is not None else None
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("存档存储已关闭")
+            if save_id in self._pending:
+                self.stats['coalesced'] += 1
+            self._pending[save_id] = entry
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name="save-writer", daemon=True)
+                self._writer.start()
+            self._cond.notify_all()
+
+    def delete(self, save_id):
+        self.save(save_id, None)
+
+    def flush(self, timeout=None):
+        """等待队列中的存档全部写入，超时返回False"""
+        with self._cond:
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._pending and not self._writing, timeout)
+
+    def close(self, timeout=10.0):
+        """写完队列中的存档后停止后台线程"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._writer is not None:
+            self._writer.join(timeout)
+
+    def _write_batch(self, conn, batch):
+        now = time.time()
+        rows = [
+            (save_id, entry[0], entry[1], now)
+            for save_id, entry in batch.items() if entry is not None
+        ]
+        deleted = [(save_id,) for save_id, entry in batch.items() if entry is None]
+        with conn:
+            conn.executemany(
+                "INSERT INTO save_games (save_id, data, steps, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(save_id) DO UPDATE SET data = excluded.data, steps = excluded.steps, "
+                "updated_at = excluded.updated_at",
+                rows
+            )
+            conn.executemany("DELETE FROM save_games WHERE save_id = ?", deleted)
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    break
+                # 等一小段时间，把这段时间内的多次保存合并成一批
+                self._cond.wait_for(lambda: self._closed, self.flush_interval)
+                batch, self._pending = self._pending, {}
+                self._writing = batch
+            failed = retry = False
+            try:
+                self._write_batch(conn, batch)
+            except sqlite3.OperationalError:
+                # 数据库暂时不可写（例如被锁住），稍后重试
+                failed = retry = True
+            except Exception:
+                # 其他错误重试也不会成功，丢弃这一批，不能让写入线程退出
+                traceback.print_exc()
+                failed = True
+            with self._cond:
+                if failed:
+                    self.stats['errors'] += 1
+                    if retry:
+                        # 放回队列，保留之后更新的版本
+                        for save_id, entry in batch.items():
+                            self._pending.setdefault(save_id, entry)
+                    else:
+                        self.stats['dropped'] += len(batch)
+                else:
+                    self.stats['batches'] += 1
+                    self.stats['writes'] += len(batch)
+                self._writing = {}
+                self._cond.notify_all()
+            if retry:
+                if self._closed:
+                    break
+                time.sleep(self.flush_interval)
+        conn.close()
+
+    # ---- 读取 ----
+
+    def load(self, save_id):
+        """读取存档内容，不存在时返回None"""
+        with self._cond:
+            for queued in (self._pending, self._writing):
+                if save_id in queued:
+                    entry = queued[save_id]
+                    return decode_save(entry[0]) if entry is not None else None
+        row = self._reader().execute(
+            "SELECT data FROM save_games WHERE save_id = ?", (save_id,)
+        ).fetchone()
+        return decode_save(row[0]) if row else None
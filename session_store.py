@@ -0,0 +1,138 @@
+"""玩家会话存储
+
+HTTP 接口（game_api.py）本身不保存任何状态，每个请求都从这里读取会话、处理后写回，
+同一个玩家的请求可以由任意一个工作进程处理。会话内容是一个可以 JSON 序列化的字典：
+    {'source': 事件树来源, 'state': engine.export_state 的结果, 'history': [[事件ID, 选项序号], ...]}
+
+每个会话带一个版本号，保存时按版本号做乐观并发控制：两个请求同时修改同一个会话时，
+后保存的一方抛出 SessionConflict，由调用方决定重试还是报告冲突。
+
+- SQLiteSessionStore：保存在 app.db 的 game_sessions 表中（WAL 模式），多个进程共享；
+- MemorySessionStore：保存在进程内存中，只适合单进程调试。
+"""
+import json
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+from event_store import default_db_path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS game_sessions (
+    session_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    updated_at TEXT
+);
+"""
+
+class SessionConflict(Exception):
+    """会话在读取之后已经被其他请求修改"""
+
+def _dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+class SQLiteSessionStore:
+    """基于 SQLite 的会话存储，一个进程共用一个连接"""
+
+    def __init__(self, db_path=None, timeout=30.0):
+        self.db_path = db_path or default_db_path()
+        # timeout：其他工作进程持有写锁时的最长等待时间
+        self._conn = sqlite3.connect(self.db_path, timeout=timeout, check_same_thread=False)
+        self._lock = threading.RLock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def create(self, data):
+        """创建会话，返回 (会话ID, 版本号)"""
+        session_id = uuid.uuid4().hex
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO game_sessions (session_id, version, data, updated_at) VALUES (?, 1, ?, ?)",
+                (session_id, _dumps(data), datetime.now().isoformat(timespec="seconds"))
+            )
+        return session_id, 1
+
+    def load(self, session_id):
+        """返回 (会话内容, 版本号)，会话不存在时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, version FROM game_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def save(self, session_id, data, version):
+        """只有会话仍是 version 版本时才写入，返回新的版本号；会话不存在时抛出 KeyError"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE game_sessions SET data = ?, version = version + 1, updated_at = ? "
+                "WHERE session_id = ? AND version = ?",
+                (_dumps(data), datetime.now().isoformat(timespec="seconds"), session_id, version)
+            )
+            if cursor.rowcount == 0:
+                exists = self._conn.execute(
+                    "SELECT 1 FROM game_sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                if exists is None:
+                    raise KeyError(session_id)
+                raise SessionConflict(session_id)
+        return version + 1
+
+    def delete(self, session_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM game_sessions WHERE session_id = ?", (session_id,))
+
+class MemorySessionStore:
+    """进程内的会话存储，接口与 SQLiteSessionStore 相同"""
+
+    def __init__(self):
+        # 会话ID -> (JSON 文本, 版本号)，保存文本避免调用方修改已保存的内容
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def close(self):
+        pass
+
+    def create(self, data):
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._sessions[session_id] = (_dumps(data), 1)
+        return session_id, 1
+
+    def load(self, session_id):
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        return json.loads(entry[0]), entry[1]
+
+    def save(self, session_id, data, version):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                raise KeyError(session_id)
+            if entry[1] != version:
+                raise SessionConflict(session_id)
+            self._sessions[session_id] = (_dumps(data), version + 1)
+        return version + 1
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+def create_session_store(url=None):
+    """根据地址创建会话存储："memory" 使用进程内存储，"sqlite:///路径" 使用 SQLite，默认使用 app.db"""
+    if url in ("memory", "memory://"):
+        return MemorySessionStore()
+    if not url:
+        return SQLiteSessionStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteSessionStore(url[len("sqlite:///"):])
+    raise ValueError(f"不支持的会话存储地址: {url}")
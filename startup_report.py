@@ -0,0 +1,110 @@
+"""启动耗时报告
+
+在全新的 Python 进程中测量：
+1. 各个重量级依赖单独导入的耗时；
+2. app.py 和 event_editor.py 第一次运行（绘制第一帧）的耗时，以及运行后实际加载了哪些重量级依赖，
+   分别在默认模式和延迟加载模式（DEFER_MAP=1 / DEFER_GRAPH=1）下测量。
+
+用法：
+    python startup_report.py [--repeat 3] [--output startup_report.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HEAVY_MODULES = ["streamlit", "numpy", "pandas", "geopandas", "pydeck", "graphviz", "openai", "pysnooper"]
+
+_IMPORT_SNIPPET = """
+import time, json
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start}}))
+"""
+
+_RUN_SNIPPET = """
+import sys, time, json
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({script!r}, default_timeout=120)
+ready = time.perf_counter()
+at.run()
+done = time.perf_counter()
+print(json.dumps({{
+    "testing_import_seconds": ready - start,
+    "first_run_seconds": done - ready,
+    "exception": [str(e.value) for e in at.exception],
+    "loaded": [m for m in {modules!r} if m in sys.modules],
+}}))
+"""
+
+def _run(code, env=None):
+    root = os.path.dirname(os.path.abspath(__file__))
+    process_env = dict(os.environ, PYTHONPATH=root)
+    process_env.update(env or {})
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=root, env=process_env,
+        capture_output=True, text=True, check=False
+    )
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1:] or ["unknown error"]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def measure_imports(repeat):
+    """每个依赖在独立进程中导入，取最短耗时"""
+    report = {}
+    for module in HEAVY_MODULES:
+        timings = [_run(_IMPORT_SNIPPET.format(module=module)) for _ in range(repeat)]
+        seconds = [t["seconds"] for t in timings if "seconds" in t]
+        report[module] = min(seconds) if seconds else None
+    return report
+
+def measure_first_run(script, env, repeat):
+    """测量脚本第一次运行的耗时和加载的依赖"""
+    runs = [_run(_RUN_SNIPPET.format(script=script, modules=HEAVY_MODULES), env) for _ in range(repeat)]
+    ok = [r for r in runs if "first_run_seconds" in r]
+    if not ok:
+        return runs[-1]
+    best = min(ok, key=lambda r: r["first_run_seconds"])
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="测量游戏和编辑器的启动耗时")
+    parser.add_argument("--repeat", type=int, default=3, help="每项测量的重复次数，取最快的一次")
+    parser.add_argument("--output", default=None, help="把结果写入JSON文件")
+    args = parser.parse_args()
+
+    # 编辑器第一次运行会写事件存储，使用临时数据库，避免修改 app.db
+    db_dir = tempfile.mkdtemp()
+    database_url = "sqlite:///" + os.path.join(db_dir, "startup_report.db")
+
+    report = {"imports": measure_imports(args.repeat), "first_run": {}}
+    modes = {
+        "default": {"DEFER_MAP": "0", "DEFER_GRAPH": "0"},
+        "deferred": {"DEFER_MAP": "1", "DEFER_GRAPH": "1"},
+    }
+    for script in ["app.py", "event_editor.py"]:
+        for mode, env in modes.items():
+            env = dict(env, DATABASE_URL=database_url)
+            report["first_run"][f"{script} ({mode})"] = measure_first_run(script, env, args.repeat)
+
+    print("依赖导入耗时（独立进程）:")
+    for module, seconds in report["imports"].items():
+        print(f"  {module:<12} {seconds * 1000:8.1f} ms" if seconds is not None else f"  {module:<12}     未安装")
+    print("第一帧耗时:")
+    for name, result in report["first_run"].items():
+        if "first_run_seconds" not in result:
+            print(f"  {name}: 运行失败 {result}")
+            continue
+        print(f"  {name:<28} {result['first_run_seconds'] * 1000:8.1f} ms  已加载: {', '.join(result['loaded'])}")
+        if result["exception"]:
+            print(f"    异常: {result['exception']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+
+if __name__ == "__main__":
+    main()
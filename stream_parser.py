@@ -0,0 +1,174 @@
+"""大模型流式输出的增量 JSON 解析
+
+大模型按块返回事件树 JSON，EventStreamParser 逐字符扫描新到达的内容，
+"events" 中每个事件对象一闭合就立即解析出来，不需要等整个响应结束。
+响应被截断或格式不完整时，已经闭合的事件仍然可以组成一棵可用的事件树。
+"""
+import json
+
+class _Frame:
+    """一层 JSON 容器（对象或数组）"""
+    __slots__ = ("kind", "key", "expect_key")
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.key = None
+        self.expect_key = kind == "{"
+
+class EventStreamParser:
+    """增量解析 {"name": ..., "events": {...}, "initial_event": ...} 结构的流式文本"""
+
+    def __init__(self):
+        self.name = None
+        self.initial_event = None
+        self.events = {}
+        self.extra = {}
+        self.finished = False
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_is_key = False
+        self._key_chars = []
+        self._in_scalar = False
+        # 当前正在截取的值：(所在深度, 类型, 键)
+        self._capture = None
+        self._capture_chars = []
+
+    def feed(self, chunk):
+        """输入新到达的文本，返回本次新完成的事件列表 [(事件ID, 事件)]"""
+        completed = []
+        for ch in chunk:
+            if self.finished:
+                break
+            self._consume(ch, completed)
+        return completed
+
+    # ---- 截取值 ----
+
+    def _value_start(self):
+        """在当前层开始一个新值，判断是否需要截取"""
+        depth = len(self._stack)
+        frame = self._stack[-1]
+        if depth == 1 and frame.kind == "{":
+            if frame.key == "events":
+                # events 中的事件逐个截取
+                return
+            self._capture = (depth, "top", frame.key)
+        elif depth == 2 and self._stack[0].key == "events":
+            # events 既可能是对象也可能是数组
+            self._capture = (depth, "event", frame.key if frame.kind == "{" else None)
+        else:
+            return
+        self._capture_chars = []
+
+    def _value_end(self, completed):
+        """当前层的值结束，如果正在截取则解析出来"""
+        if self._capture is None or self._capture[0] != len(self._stack):
+            return
+        _, kind, key = self._capture
+        raw = "".join(self._capture_chars).strip()
+        self._capture = None
+        self._capture_chars = []
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            return
+        if kind == "event":
+            if not isinstance(value, dict):
+                return
+            event_id = key or value.get("id") or f"event_{len(self.events) + 1}"
+            self.events[event_id] = value
+            completed.append((event_id, value))
+        elif key == "name":
+            self.name = value
+        elif key == "initial_event":
+            self.initial_event = value
+        elif key != "events":
+            self.extra[key] = value
+
+    def _end_scalar(self, completed):
+        if self._in_scalar:
+            self._in_scalar = False
+            self._value_end(completed)
+
+    # ---- 逐字符扫描 ----
+
+    def _consume(self, ch, completed):
+        if not self._stack:
+            # 跳过 ```json 之类的前缀，直到顶层对象开始
+            if ch == "{":
+                self._stack.append(_Frame("{"))
+            return
+
+        if self._in_string:
+            if self._capture is not None:
+                self._capture_chars.append(ch)
+            if self._string_is_key:
+                self._key_chars.append(ch)
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                if self._string_is_key:
+                    raw_key = '"' + "".join(self._key_chars)
+                    try:
+                        self._stack[-1].key = json.loads(raw_key)
+                    except json.JSONDecodeError:
+                        self._stack[-1].key = raw_key.strip('"')
+                    self._stack[-1].expect_key = False
+                else:
+                    self._value_end(completed)
+            return
+
+        frame = self._stack[-1]
+        if ch == '"':
+            self._in_string = True
+            self._string_is_key = frame.kind == "{" and frame.expect_key
+            if self._string_is_key:
+                self._key_chars = []
+            else:
+                self._value_start()
+            if self._capture is not None:
+                self._capture_chars.append(ch)
+        elif ch in "{[":
+            self._value_start()
+            if self._capture is not None:
+                self._capture_chars.append(ch)
+            self._stack.append(_Frame(ch))
+        elif ch in "}]":
+            self._end_scalar(completed)
+            self._stack.pop()
+            if self._capture is not None:
+                self._capture_chars.append(ch)
+            if not self._stack:
+                self.finished = True
+            else:
+                self._value_end(completed)
+        elif ch == ",":
+            self._end_scalar(completed)
+            if frame.kind == "{":
+                frame.expect_key = True
+            if self._capture is not None:
+                self._capture_chars.append(ch)
+        elif ch.isspace() or ch == ":":
+            if self._capture is not None:
+                self._capture_chars.append(ch)
+        else:
+            if not self._in_scalar:
+                self._in_scalar = True
+                self._value_start()
+            if self._capture is not None:
+                self._capture_chars.append(ch)
+
+    def result(self):
+        """返回目前已解析出的事件树（响应被截断时也可使用）"""
+        event_data = {"name": self.name or "未命名事件树"}
+        event_data.update(self.extra)
+        event_data["events"] = dict(self.events)
+        initial_event = self.initial_event
+        if initial_event not in self.events:
+            initial_event = next(iter(self.events), None)
+        event_data["initial_event"] = initial_event
+        return event_data
@@ -0,0 +1,90 @@
+"""合成事件树生成器
+
+生成符合 events/*.json 格式的事件树，规模从几个到上百万个事件，分支数可调，供性能测试使用。
+生成的事件树是有效的：选项只指向时间更晚的事件（无环），部分选项没有 next_event，
+走按时间查找后续事件的分支；最后一个事件没有选项，作为结局。
+
+用法：
+    python synthetic_events.py 10000 --branching 3 --output events/synthetic_10000.json
+"""
+import argparse
+import json
+import random
+
+FACTIONS = ['central_government', 'communist', 'japanese']
+PROVINCE_NAMES = ['江苏', '浙江', '安徽', '江西', '湖北', '湖南', '四川', '福建', '山东', '广东',
+                  '广西', '云南', '贵州', '山西', '陕西', '甘肃', '青海', '新疆', '台湾', '河北']
+LOCATIONS = ['jiangsu', 'zhejiang', 'anhui', 'jiangxi', 'hubei', 'hunan', 'sichuan', 'fujian',
+             'manchuria', 'shandong', 'guangdong', 'guangxi']
+
+def generate_event_tree(size, branching=2, lookahead=10, time_fallback=0.1, territory_rate=0.05,
+                        start_year=1927, seed=0):
+    """生成 size 个事件的事件树
+
+    branching：每个事件的选项数；lookahead：选项指向后面多少个事件以内；
+    time_fallback：没有 next_event 的选项比例；territory_rate：带领土变化的选项比例。
+    """
+    rng = random.Random(seed)
+    events = {}
+    # 大约每个月 max(1, size // 300) 个事件，保证时间单调不减
+    per_month = max(1, size // 300)
+    for index in range(size):
+        months = index // per_month
+        event_id = f"event_{index + 1}"
+        choices = []
+        if index < size - 1:
+            for choice_index in range(branching):
+                if rng.random() < time_fallback:
+                    next_event = None
+                else:
+                    target = min(size - 1, index + 1 + rng.randrange(lookahead))
+                    next_event = f"event_{target + 1}"
+                territories = {}
+                if rng.random() < territory_rate:
+                    territories[rng.choice(FACTIONS)] = [rng.choice(PROVINCE_NAMES)]
+                choices.append({
+                    "id": f"choice_{index + 1}_{choice_index + 1}",
+                    "text": f"选项{choice_index + 1}",
+                    "consequences": {
+                        "military_power": rng.randint(-10, 10),
+                        "political_power": rng.randint(-10, 10),
+                        "economic_power": rng.randint(-10, 10),
+                        "territories": territories
+                    },
+                    "next_event": next_event
+                })
+        events[event_id] = {
+            "id": event_id,
+            "title": f"事件{index + 1}",
+            "description": f"第{index + 1}个合成事件",
+            "year": start_year + months // 12,
+            "month": months % 12 + 1,
+            "location": [rng.choice(LOCATIONS)],
+            "choices": choices
+        }
+    return {
+        "name": f"合成事件树（{size}个事件）",
+        "events": events,
+        "initial_event": "event_1" if size else None
+    }
+
+def write_event_tree(event_data, path):
+    """写入JSON文件（不缩进，大事件树可以小很多）"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(event_data, f, ensure_ascii=False)
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成事件树")
+    parser.add_argument("size", type=int, help="事件数")
+    parser.add_argument("--branching", type=int, default=2, help="每个事件的选项数")
+    parser.add_argument("--lookahead", type=int, default=10, help="选项指向后面多少个事件以内")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--output", default=None, help="输出文件，默认 events/synthetic_<size>.json")
+    args = parser.parse_args()
+
+    output = args.output or f"events/synthetic_{args.size}.json"
+    write_event_tree(generate_event_tree(args.size, args.branching, args.lookahead, seed=args.seed), output)
+    print(f"已生成 {args.size} 个事件：{output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""时间线回放
+
+沿着一局游戏的路径（GameHistory 中从起点到当前节点的各个状态）记录：
+- 关键帧：每隔 keyframe_interval 步保存一次完整的属性和各势力的领土；
+- 差量：每一步相对上一步的属性变化和领土变化（各势力新增/失去的省份）。
+回放某个月份时，先二分找到该月份对应的步骤，再从最近的关键帧开始应用差量，
+得到的帧放入有上限的 LRU 缓存，逐月播放或来回拖动时大部分帧直接命中缓存。
+
+每一步的时间是该状态当前事件的时间；没有当前事件的状态沿用上一步的时间，
+时间倒退的步骤按上一步的时间处理，保证月份在整条路径上单调不减。
+"""
+import bisect
+from collections import OrderedDict
+
+from game_engine import STAT_KEYS, get_current_time
+
+DEFAULT_KEYFRAME_INTERVAL = 16
+DEFAULT_CACHE_SIZE = 128
+
+def month_key(year, month):
+    """与 game_engine.build_time_index 相同的月份键"""
+    return year * 12 + month
+
+def format_month(key):
+    """把月份键显示为 1937年7月 这样的文字"""
+    year, month = divmod(key - 1, 12)
+    return f"{year}年{month + 1}月"
+
+def _state_month(state):
+    year, month = get_current_time(state)
+    if isinstance(year, int) and isinstance(month, int):
+        return month_key(year, month)
+    return None
+
+class Timeline:
+    """一条游戏路径的关键帧和差量"""
+
+    def __init__(self, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, cache_size=DEFAULT_CACHE_SIZE):
+        self.keyframe_interval = keyframe_interval
+        self.cache_size = cache_size
+        # 每一步 {'node', 'label', 'event_id', 'stats_delta', 'territory_delta'}
+        self.steps = []
+        # 每一步的月份键，单调不减；路径开头还没有时间的步骤为None，遇到第一个有时间的步骤时补上
+        self.month_keys = []
+        # 步骤序号 -> {'stats': {属性: 值}, 'territories': {势力: frozenset(省份)}}
+        self.keyframes = {}
+        self._cache = OrderedDict()
+        self._last = None  # 最后一步的 (属性, 领土)，用于计算下一步的差量
+        self._history = None
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.steps)
+
+    # ---- 记录 ----
+
+    def append(self, state, label, node=None):
+        """在路径末尾记录一个新状态"""
+        index = len(self.steps)
+        stats = {key: state.get(key, 0) for key in STAT_KEYS}
+        territories = state['controlled_territories']
+
+        month = _state_month(state)
+        previous = self.month_keys[-1] if self.month_keys else None
+        if month is None or (previous is not None and month < previous):
+            month = previous
+        elif previous is None:
+            for i in range(index):
+                self.month_keys[i] = month
+        self.month_keys.append(month)
+
+        stats_delta, territory_delta = None, None
+        if self._last is not None:
+            last_stats, last_territories = self._last
+            stats_delta = {key: stats[key] - last_stats[key] for key in STAT_KEYS if stats[key] != last_stats[key]}
+            territory_delta = {}
+            for faction in list(territories) + [f for f in last_territories if f not in territories]:
+                new, old = territories.get(faction, ()), last_territories.get(faction, ())
+                # 状态之间共享未变化的元组，同一个对象就不用比较
+                if new is old:
+                    continue
+                added, removed = frozenset(new) - frozenset(old), frozenset(old) - frozenset(new)
+                if added or removed:
+                    territory_delta[faction] = (added, removed)
+
+        if index % self.keyframe_interval == 0:
+            self.keyframes[index] = {
+                'stats': dict(stats),
+                'territories': {faction: frozenset(provinces) for faction, provinces in territories.items()},
+            }
+        self.steps.append({
+            'node': node,
+            'label': label,
+            'event_id': state.get('current_event_id'),
+            'stats_delta': stats_delta,
+            'territory_delta': territory_delta,
+        })
+        self._last = (stats, territories)
+
+    def truncate(self, length):
+        """只保留前 length 步（回退到历史中的某一步后，路径从这里分叉）"""
+        if length >= len(self.steps):
+            return
+        del self.steps[length:]
+        del self.month_keys[length:]
+        self.keyframes = {index: frame for index, frame in self.keyframes.items() if index < length}
+        self._cache.clear()
+        if length == 0:
+            self._last = None
+        else:
+            stats, territories = self._materialize(length - 1)
+            self._last = (stats, {faction: tuple(provinces) for faction, provinces in territories.items()})
+
+    def sync(self, history):
+        """与 GameHistory 当前节点的路径对齐：保留相同的前缀，只记录新增的步骤"""
+        if self._history is not history:
+            # 换了一份历史记录（重新开始或加载了新的事件树），节点序号不再对应
+            self._history = history
+            self.truncate(0)
+        path = history.path()
+        common = 0
+        while common < min(len(path), len(self.steps)) and self.steps[common]['node'] == path[common]:
+            common += 1
+        self.truncate(common)
+        for index in path[common:]:
+            node = history.nodes[index]
+            self.append(node['state'], node['label'], node=index)
+        return self
+
+    # ---- 回放 ----
+
+    def _materialize(self, step):
+        """从最近的关键帧开始应用差量，返回 (属性, {势力: set(省份)})"""
+        base = step - step % self.keyframe_interval
+        keyframe = self.keyframes[base]
+        stats = dict(keyframe['stats'])
+        territories = {faction: set(provinces) for faction, provinces in keyframe['territories'].items()}
+        for index in range(base + 1, step + 1):
+            entry = self.steps[index]
+            for key, delta in entry['stats_delta'].items():
+                stats[key] += delta
+            for faction, (added, removed) in entry['territory_delta'].items():
+                provinces = territories.setdefault(faction, set())
+                provinces -= removed
+                provinces |= added
+        return stats, territories
+
+    def frame(self, step):
+        """第 step 步的帧：属性、领土（与 game_state['controlled_territories'] 结构相同）和说明"""
+        if step in self._cache:
+            self._cache.move_to_end(step)
+            self.hits += 1
+            return self._cache[step]
+        self.misses += 1
+        stats, territories = self._materialize(step)
+        entry = self.steps[step]
+        frame = {
+            'step': step,
+            'month': self.month_keys[step],
+            'label': entry['label'],
+            'event_id': entry['event_id'],
+            'stats': stats,
+            # 排序后的元组，同样的领土得到同样的 territories_hash，地图颜色可以命中缓存
+            'controlled_territories': {faction: tuple(sorted(provinces)) for faction, provinces in territories.items()},
+        }
+        self._cache[step] = frame
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return frame
+
+    def month_range(self):
+        """(最早月份键, 最晚月份键)，路径上没有带时间的步骤时返回None"""
+        if not self.month_keys or self.month_keys[-1] is None:
+            return None
+        return self.month_keys[0], self.month_keys[-1]
+
+    def step_at(self, key):
+        """某个月份显示的步骤：该月份及之前的最后一步"""
+        return max(0, bisect.bisect_right(self.month_keys, key) - 1)
+
+    def frame_at(self, key):
+        """某个月份的帧"""
+        return self.frame(self.step_at(key))
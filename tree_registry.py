@@ -0,0 +1,83 @@
+"""进程内共享的事件树注册表
+
+同一个事件树在一个进程里只加载一份，并冻结为只读结构，所有玩家会话共享；
+会话里只保存事件树ID。每个会话通过 TreeHandle 持有一个引用，会话结束（TreeHandle
+被回收）或切换事件树时释放引用，引用数归零后事件树从内存中移除。
+"""
+import threading
+import weakref
+from types import MappingProxyType
+
+def freeze(value):
+    """把字典和列表递归转换为只读的 MappingProxyType 和元组"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+class TreeRegistry:
+    """事件树ID -> [只读事件树, 引用数]"""
+
+    def __init__(self):
+        self._trees = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, tree_id, loader):
+        """增加一个引用；事件树还没有加载时调用 loader() 加载并冻结"""
+        with self._lock:
+            entry = self._trees.get(tree_id)
+            if entry is not None:
+                entry[1] += 1
+                return tree_id
+        # 加载可能很慢，不在锁内进行
+        event_data = loader()
+        if event_data is None:
+            return None
+        if isinstance(event_data.get('events'), dict):
+            event_data = freeze(event_data)
+        else:
+            # 编译后的事件树本身就是只读的惰性映射，只冻结顶层
+            event_data = MappingProxyType(dict(event_data))
+        with self._lock:
+            entry = self._trees.setdefault(tree_id, [event_data, 0])
+            entry[1] += 1
+        return tree_id
+
+    def release(self, tree_id):
+        """释放一个引用，引用数归零时移除事件树"""
+        with self._lock:
+            entry = self._trees.get(tree_id)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            del self._trees[tree_id]
+        # 编译后的事件树持有 mmap，需要关闭
+        events = entry[0].get('events')
+        if hasattr(events, 'close'):
+            events.close()
+
+    def get(self, tree_id):
+        """获取只读事件树，不存在时返回None"""
+        entry = self._trees.get(tree_id)
+        return entry[0] if entry is not None else None
+
+    def stats(self):
+        """返回 {事件树ID: 引用数}"""
+        with self._lock:
+            return {tree_id: entry[1] for tree_id, entry in self._trees.items()}
+
+# 整个进程共用的注册表
+registry = TreeRegistry()
+
+class TreeHandle:
+    """会话对事件树的引用，对象被回收时自动释放"""
+
+    def __init__(self, tree_id, registry=registry):
+        self.tree_id = tree_id
+        self._finalizer = weakref.finalize(self, registry.release, tree_id)
+
+    def release(self):
+        self._finalizer()